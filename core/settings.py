@@ -25,6 +25,20 @@ SECRET_KEY = config("DJANGO_SECRET_KEY")
 
 GEOAPIFY_API_KEY = config("GEOAPIFY_API_KEY")
 LOCATIONIQ_API_KEY = config("LOCATIONIQ_API_KEY")
+# Dias até um endereço não encontrado pelo provedor ser consultado de novo (imoveis.geocoding)
+GEOCODE_MISS_TTL_DIAS = config("GEOCODE_MISS_TTL_DIAS", default=30, cast=int)
+
+# Backend HTML do scraper da Caixa ("lxml" ou "html.parser"); vazio = lxml se instalado
+SCRAPER_HTML_PARSER = config("SCRAPER_HTML_PARSER", default="")
+# Endereço do site da Caixa usado pelo scraper; vazio = o site real. Aponte
+# para o simular_caixa (ex: http://127.0.0.1:8765) em testes de carga
+SCRAPER_BASE_URL = config("SCRAPER_BASE_URL", default="")
+# Onde o scraper guarda as páginas baixadas com --arquivar
+SCRAPER_ARCHIVE_DIR = config(
+    "SCRAPER_ARCHIVE_DIR", default=str(BASE_DIR / "scraper_archive"))
+# Onde o scraper grava os arquivos NDJSON com --staging, para o load_imoveis
+SCRAPER_STAGING_DIR = config(
+    "SCRAPER_STAGING_DIR", default=str(BASE_DIR / "scraper_staging"))
 
 # SECURITY WARNING: don't run with debug turned on in production!
 DEBUG = True
@@ -46,7 +46,20 @@ class ImovelFilter(django_filters.FilterSet):
     # Filtro especial para o mapa
     bbox = BoundingBoxFilter()
 
+    # Por padrão só imóveis ativos (ainda anunciados pela Caixa)
+    incluir_inativos = django_filters.BooleanFilter(method='filtrar_inativos')
+
     class Meta:
         model = Imovel
         fields = ['tipo_imovel', 'modalidade', 'min_amount', 'max_amount',
-                  'min_area_total', 'max_area_total', 'quartos', 'garagem', 'bbox', 'comarca']
+                  'min_area_total', 'max_area_total', 'quartos', 'garagem', 'bbox', 'comarca',
+                  'incluir_inativos']
+
+    def filter_queryset(self, queryset):
+        if not self.form.cleaned_data.get('incluir_inativos'):
+            queryset = queryset.filter(ativo=True)
+        return super().filter_queryset(queryset)
+
+    def filtrar_inativos(self, queryset, name, value):
+        # Tratado em filter_queryset, antes dos demais filtros
+        return queryset
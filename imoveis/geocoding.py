@@ -0,0 +1,396 @@
+'''
+Geocodificação dos endereços dos imóveis (geocode_imoveis).
+
+Os imóveis sem coordenadas são agrupados pelo endereço formatado
+(formatar_endereco_para_geocode): as unidades de um mesmo prédio ou
+condomínio têm o mesmo endereço, então cada endereço distinto é consultado
+uma vez só. Os resultados de cada provedor ficam no GeocodeCache; endereços
+que o provedor não encontrou também ficam (sem coordenadas) e só são
+consultados de novo depois de settings.GEOCODE_MISS_TTL_DIAS dias.
+
+O Geocoder faz as consultas em paralelo, cada provedor com o seu
+AdaptiveRateLimiter, na ordem dada (por padrão Geoapify e depois
+LocationIQ): quando um provedor não encontra o endereço, falha ou é
+desativado (chave inválida, cota esgotada, circuit breaker aberto), o
+próximo é consultado. As coordenadas são gravadas com bulk_update em lotes.
+'''
+import asyncio
+import re
+import time
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from functools import partial
+from urllib.parse import urlencode
+
+import requests
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from imoveis.models import GeocodeCache, Imovel
+from imoveis.scraping.http import build_session, is_retryable, make_request, retry_after
+from imoveis.scraping.ratelimit import AdaptiveRateLimiter, CircuitOpenError
+
+# Tamanho de GeocodeCache.endereco
+MAX_ENDERECO = 500
+
+
+def formatar_endereco_para_geocode(imovel):
+    """
+    Usa Regex para extrair as partes essenciais de um endereço bruto e
+    formatá-lo no padrão ideal para geocodificação:
+    LOGRADOURO - NÚMERO - CIDADE - ESTADO
+    """
+    endereco_bruto = imovel.address
+    titulo = imovel.title
+
+    if not endereco_bruto or not isinstance(endereco_bruto, str):
+        return ""
+
+    # Converte tudo para maiúsculas para padronizar
+    s = endereco_bruto.upper()
+
+    logradouro, numero, cidade, estado = None, None, None, None
+
+    # 1. Tenta extrair Cidade e Estado do final da string. É o padrão mais confiável.
+    # Ex: ", RIBEIRAO PRETO - SAO PAULO"
+    match_cidade_estado = re.search(r',\s*([^,]+?)\s*-\s*([A-Z\s]+)$', s)
+    if match_cidade_estado:
+        cidade = match_cidade_estado.group(1).strip()
+        estado = match_cidade_estado.group(2).strip()
+        # Remove a parte da cidade/estado da string principal para facilitar as próximas buscas
+        s = s[:match_cidade_estado.start()]
+
+    # 2. Tenta extrair o número, procurando por padrões como "N.", "Nº" ou apenas a vírgula.
+    # Ex: ",N. 4875", " Nº 123", ", 50"
+    match_numero = re.search(r'(?:,?\s*N[º°\.]?\s*|,\s*)(\d+)', s)
+    if match_numero:
+        numero = match_numero.group(1).strip()
+        # O logradouro é tudo que veio ANTES do padrão do número
+        logradouro = s[:match_numero.start()].strip(', ')
+    else:
+        # Se não achar um padrão claro de número, o logradouro é tudo até a primeira vírgula.
+        logradouro = s.split(',')[0].strip()
+
+    # 3. Fallback: Se não encontrou cidade/estado no endereço, tenta pegar do título.
+    # Ex: "ITABERABA - LOT JARDIM EUROPA" (onde Itaberaba é a cidade)
+    if not cidade and titulo:
+        partes_titulo = [p.strip() for p in titulo.upper().split('-')]
+        if len(partes_titulo) > 0:
+            cidade = partes_titulo[0]
+        if len(partes_titulo) > 1:
+            # Tenta usar a segunda parte como estado se não foi encontrado antes
+            if not estado:
+                estado = partes_titulo[1]
+
+    # 4. Monta o endereço final apenas com as partes que foram encontradas.
+    partes_finais = [
+        logradouro,
+        numero,
+        cidade,
+        estado
+    ]
+
+    # Filtra partes vazias e junta com o separador " - "
+    endereco_formatado = " - ".join(filter(None, partes_finais))
+
+    return endereco_formatado
+
+
+def chave_endereco(endereco):
+    '''Endereço formatado com os espaços normalizados, como é gravado no cache.'''
+    return ' '.join(endereco.upper().split())[:MAX_ENDERECO]
+
+
+def _miss_ttl(miss_ttl):
+    if miss_ttl is None:
+        return timedelta(days=getattr(settings, 'GEOCODE_MISS_TTL_DIAS', 30))
+    return miss_ttl
+
+
+def cache_lookup_many(enderecos, provider, miss_ttl=None, chunk_size=500):
+    '''
+    Entradas válidas do cache do provedor para os endereços (já passados por
+    chave_endereco), por endereço. Uma entrada sem coordenadas é um endereço
+    não encontrado; ela vale por `miss_ttl` (padrão:
+    settings.GEOCODE_MISS_TTL_DIAS) e depois é ignorada.
+    '''
+    limite = timezone.now() - _miss_ttl(miss_ttl)
+    enderecos = list(enderecos)
+    entradas = {}
+    for i in range(0, len(enderecos), chunk_size):
+        rows = GeocodeCache.objects.filter(provider=provider, endereco__in=enderecos[i:i + chunk_size])
+        for entrada in rows:
+            if entrada.latitude is not None or entrada.updated_at >= limite:
+                entradas[entrada.endereco] = entrada
+    return entradas
+
+
+def cache_lookup(endereco, provider, miss_ttl=None):
+    '''Entrada válida do cache para um endereço, ou None quando o provedor precisa ser consultado.'''
+    chave = chave_endereco(endereco)
+    return cache_lookup_many([chave], provider, miss_ttl).get(chave)
+
+
+def pending_addresses():
+    '''
+    Pks dos imóveis sem coordenadas agrupados pelo endereço formatado, e a
+    quantidade de imóveis sem dados de endereço suficientes. A busca usa o
+    índice parcial imovel_sem_coords_idx.
+    '''
+    grupos, sem_endereco = defaultdict(list), 0
+    rows = Imovel.objects.filter(latitude__isnull=True).only('pk', 'address', 'title')
+    for imovel in rows.iterator(chunk_size=2000):
+        endereco = formatar_endereco_para_geocode(imovel)
+        if endereco:
+            grupos[chave_endereco(endereco)].append(imovel.pk)
+        else:
+            sem_endereco += 1
+    return grupos, sem_endereco
+
+
+class Provider:
+    '''Um serviço de geocodificação: monta a URL e lê a resposta.'''
+    nome = None
+    setting = None
+    # Requisições por segundo permitidas no plano gratuito
+    taxa = 1.0
+
+    def url(self, endereco, api_key):
+        raise NotImplementedError
+
+    def parse(self, data):
+        '''(latitude, longitude, confiança) do melhor resultado, ou None.'''
+        raise NotImplementedError
+
+
+class Geoapify(Provider):
+    nome = 'geoapify'
+    setting = 'GEOAPIFY_API_KEY'
+    taxa = 5.0
+
+    def url(self, endereco, api_key):
+        return 'https://api.geoapify.com/v1/geocode/search?' + urlencode({'text': endereco, 'apiKey': api_key})
+
+    def parse(self, data):
+        # A resposta da Geoapify tem os dados dentro de uma lista "features"
+        if not data or not data.get('features'):
+            return None
+        propriedades = data['features'][0]['properties']
+        return (float(propriedades['lat']), float(propriedades['lon']),
+                propriedades.get('rank', {}).get('confidence'))
+
+
+class LocationIQ(Provider):
+    nome = 'locationiq'
+    setting = 'LOCATIONIQ_API_KEY'
+    taxa = 2.0
+
+    def url(self, endereco, api_key):
+        return 'https://us1.locationiq.com/v1/search?' + urlencode({'key': api_key, 'q': endereco, 'format': 'json'})
+
+    def parse(self, data):
+        if not data or not isinstance(data, list):
+            return None
+        # "importance" (0 a 1) é o mais próximo de uma confiança na LocationIQ
+        importance = data[0].get('importance')
+        return float(data[0]['lat']), float(data[0]['lon']), float(importance) if importance is not None else None
+
+
+PROVIDERS = {provider.nome: provider for provider in (Geoapify(), LocationIQ())}
+
+
+class Geocoder:
+    '''
+    Geocodifica os imóveis sem coordenadas com os provedores de `provedores`
+    (nome -> chave da API), na ordem dada. `concorrencia` requisições ficam
+    em andamento ao mesmo tempo, cada provedor limitado à sua taxa.
+    `counts` acumula enderecos, cache, consultas.<provedor>, encontrados,
+    nao_encontrados, erros, atualizados e sem_endereco.
+    '''
+
+    def __init__(self, provedores, concorrencia=8, batch_size=500, miss_ttl=None,
+                 max_tentativas=3, timeout=10, stdout=None, style=None):
+        self.provedores = [(PROVIDERS[nome], api_key) for nome, api_key in provedores.items()]
+        self.concorrencia = concorrencia
+        self.batch_size = batch_size
+        self.miss_ttl = miss_ttl
+        self.max_tentativas = max_tentativas
+        self.timeout = timeout
+        self.stdout = stdout
+        self.style = style
+        self.limiters = {provider.nome: AdaptiveRateLimiter(rate=provider.taxa, max_rate=provider.taxa)
+                         for provider, _ in self.provedores}
+        self.desativados = set()
+        self.counts = Counter()
+        self.cache = {}
+        self.coordenadas = []
+        self.resultados = []
+
+    def log(self, message, style_name=None):
+        if self.stdout is None:
+            return
+        if style_name and self.style:
+            message = getattr(self.style, style_name)(message)
+        self.stdout.write(message)
+
+    def run(self):
+        '''Ponto de entrada síncrono; retorna `counts`.'''
+        grupos, self.counts['sem_endereco'] = pending_addresses()
+        self.counts['enderecos'] = len(grupos)
+        for provider, _ in self.provedores:
+            self.cache[provider.nome] = cache_lookup_many(grupos, provider.nome, self.miss_ttl)
+        consultar = []
+        for endereco, pks in grupos.items():
+            inicio = self.from_cache(endereco, pks)
+            if inicio is not None:
+                consultar.append((endereco, pks, inicio))
+        self.flush()
+        if consultar:
+            asyncio.run(self._run(consultar))
+        return self.counts
+
+    def from_cache(self, endereco, pks):
+        '''
+        Aplica o resultado do cache ao endereço. Retorna o índice do primeiro
+        provedor que precisa ser consultado, ou None quando o cache resolveu.
+        '''
+        for indice, (provider, _) in enumerate(self.provedores):
+            entrada = self.cache[provider.nome].get(endereco)
+            if entrada is None:
+                return indice
+            if entrada.latitude is not None:
+                self.counts['cache'] += 1
+                self.coordenadas.append((pks, entrada.latitude, entrada.longitude))
+                return None
+        # Nenhum provedor encontrou o endereço da última vez
+        self.counts['cache'] += 1
+        self.counts['nao_encontrados'] += 1
+        return None
+
+    async def _run(self, consultar):
+        self.session = build_session(self.concorrencia)
+        self.semaphore = asyncio.Semaphore(self.concorrencia)
+        self._write = sync_to_async(self.write, thread_sensitive=True)
+        fila = asyncio.Queue()
+        for item in consultar:
+            fila.put_nowait(item)
+        with ThreadPoolExecutor(max_workers=self.concorrencia) as self.executor:
+            try:
+                await asyncio.gather(*(self.worker(fila) for _ in range(self.concorrencia)))
+            finally:
+                await self._write(*self.take())
+
+    async def worker(self, fila):
+        while not fila.empty():
+            endereco, pks, inicio = fila.get_nowait()
+            await self.geocode(endereco, pks, inicio)
+            if len(self.coordenadas) + len(self.resultados) >= self.batch_size:
+                # As listas são trocadas aqui, no loop, e não na thread que grava
+                await self._write(*self.take())
+
+    async def geocode(self, endereco, pks, inicio):
+        '''
+        Consulta os provedores a partir de `inicio` até um deles encontrar o
+        endereço. Sem nenhum provedor que tenha respondido "não encontrado"
+        (só erros ou provedores desativados), o endereço conta como erro.
+        '''
+        # Os provedores antes de `inicio` já responderam "não encontrado" (cache)
+        respondeu = inicio > 0
+        for provider, api_key in self.provedores[inicio:]:
+            entrada = self.cache[provider.nome].get(endereco)
+            if entrada is not None:
+                if entrada.latitude is None:
+                    respondeu = True
+                    continue
+                self.counts['cache'] += 1
+                self.coordenadas.append((pks, entrada.latitude, entrada.longitude))
+                return
+            if provider.nome in self.desativados:
+                continue
+            try:
+                resultado = await self.consultar(provider, api_key, endereco)
+            except requests.exceptions.RequestException as e:
+                self.log(f"  -> {provider.nome}: erro ao geocodificar '{endereco}': {e}", 'ERROR')
+                continue
+            # Encontrado ou não, o resultado vai para o cache; erros não
+            self.resultados.append(GeocodeCache(endereco=endereco, provider=provider.nome,
+                                                **dict(zip(('latitude', 'longitude', 'confianca'),
+                                                           resultado or (None, None, None)))))
+            if resultado is not None:
+                self.counts['encontrados'] += 1
+                self.coordenadas.append((pks, resultado[0], resultado[1]))
+                return
+            respondeu = True
+        self.counts['nao_encontrados' if respondeu else 'erros'] += 1
+
+    async def consultar(self, provider, api_key, endereco):
+        '''
+        Uma consulta ao provedor, repetida com backoff em falhas transitórias.
+        Chave recusada, cota esgotada ou circuit breaker aberto desativam o
+        provedor até o fim da execução.
+        '''
+        limiter = self.limiters[provider.nome]
+        url = provider.url(endereco, api_key)
+        loop = asyncio.get_running_loop()
+        for tentativa in range(1, self.max_tentativas + 1):
+            try:
+                await limiter.acquire()
+            except CircuitOpenError:
+                self.desativar(provider, 'circuit breaker aberto')
+                raise
+            self.counts[f'consultas.{provider.nome}'] += 1
+            async with self.semaphore:
+                inicio = time.monotonic()
+                try:
+                    response = await loop.run_in_executor(self.executor, partial(
+                        make_request, self.session, url, method='get',
+                        headers={'Accept': 'application/json'}, timeout=self.timeout))
+                except requests.exceptions.RequestException as e:
+                    status = getattr(e.response, 'status_code', None)
+                    if status == 404:
+                        # A LocationIQ responde 404 quando não encontra o endereço
+                        return None
+                    if status in (401, 403):
+                        self.desativar(provider, f'HTTP {status}')
+                        raise
+                    if not is_retryable(e) or tentativa == self.max_tentativas:
+                        raise
+                    limiter.record_failure(retry_after(e))
+                else:
+                    limiter.record_success(time.monotonic() - inicio)
+                    try:
+                        return provider.parse(response.json())
+                    except (ValueError, KeyError, IndexError, TypeError) as e:
+                        raise requests.exceptions.RequestException(f'Resposta inválida: {e}')
+            await asyncio.sleep(min(30, 2 ** tentativa))
+
+    def desativar(self, provider, motivo):
+        if provider.nome not in self.desativados:
+            self.desativados.add(provider.nome)
+            self.log(f'{provider.nome} desativado ({motivo}); usando os próximos provedores.', 'WARNING')
+
+    def take(self):
+        '''Coordenadas e resultados pendentes, esvaziando as listas.'''
+        coordenadas, self.coordenadas = self.coordenadas, []
+        resultados, self.resultados = self.resultados, []
+        return coordenadas, resultados
+
+    def flush(self):
+        self.write(*self.take())
+
+    def write(self, coordenadas, resultados):
+        '''Grava as coordenadas (bulk_update em lotes) e os resultados no cache.'''
+        imoveis = [Imovel(pk=pk, latitude=latitude, longitude=longitude)
+                   for pks, latitude, longitude in coordenadas for pk in pks]
+        with transaction.atomic():
+            GeocodeCache.objects.bulk_create(
+                resultados, batch_size=self.batch_size, update_conflicts=True,
+                unique_fields=['endereco', 'provider'],
+                update_fields=['latitude', 'longitude', 'confianca', 'updated_at'])
+            Imovel.objects.bulk_update(imoveis, ['latitude', 'longitude'], batch_size=self.batch_size)
+        self.counts['atualizados'] += len(imoveis)
+        if imoveis:
+            self.log(f'  {self.counts["atualizados"]} imóveis geocodificados até agora.')
@@ -0,0 +1,92 @@
+from pathlib import Path
+from django.core.management.base import BaseCommand, CommandError
+from imoveis.scraping.benchmark import (CORPUS_DIR, PARSE_FUNCTIONS, Pagina,
+                                        diff_fields, load_corpus, measure,
+                                        record_expected, to_json)
+from imoveis.scraping.parsers import HTML_PARSERS
+
+
+class Command(BaseCommand):
+    '''Mede o custo de parse por página para cada backend HTML.'''
+    help = ('Mede o tempo e a memória do parse de páginas salvas da Caixa em cada backend HTML e confere '
+            'o resultado campo a campo com o esperado do corpus (ou entre os backends, para arquivos avulsos).')
+
+    def add_arguments(self, parser):
+        parser.add_argument('arquivos', nargs='*',
+                            help='Páginas HTML salvas (padrão: todas as páginas do corpus).')
+        parser.add_argument('--tipo', choices=PARSE_FUNCTIONS, default=None,
+                            help='Tipo de página (padrão: detalhe para arquivos avulsos; todos no corpus).')
+        parser.add_argument('--corpus', default=str(CORPUS_DIR),
+                            help='Diretório do corpus, com as pastas pesquisa, lista e detalhe.')
+        parser.add_argument('--parsers', default=','.join(HTML_PARSERS),
+                            help='Backends a comparar, separados por vírgula.')
+        parser.add_argument('--repeticoes', type=int, default=20,
+                            help='Quantas vezes cada página é processada (padrão: 20).')
+        parser.add_argument('--gravar', action='store_true',
+                            help='Grava o resultado do primeiro backend como o esperado de cada página do corpus.')
+
+    def handle(self, *args, **options):
+        backends = [p.strip() for p in options['parsers'].split(',') if p.strip()]
+        if invalidos := [p for p in backends if p not in HTML_PARSERS]:
+            raise CommandError(f'Backends inválidos: {invalidos}')
+        if options['repeticoes'] < 1:
+            raise CommandError('--repeticoes deve ser maior que zero.')
+
+        if options['arquivos']:
+            if options['gravar']:
+                raise CommandError('--gravar só vale para o corpus.')
+            tipo = options['tipo'] or 'detalhe'
+            paginas = []
+            for arquivo in options['arquivos']:
+                try:
+                    paginas.append(Pagina(tipo, Path(arquivo), Path(arquivo).read_bytes(), None, False))
+                except OSError as e:
+                    raise CommandError(f'Não foi possível ler {arquivo}: {e}')
+        else:
+            paginas = load_corpus(options['corpus'], [options['tipo']] if options['tipo'] else PARSE_FUNCTIONS)
+            if not paginas:
+                raise CommandError(f'Nenhuma página encontrada em {options["corpus"]}.')
+
+        divergencias = 0
+        for tipo in PARSE_FUNCTIONS:
+            do_tipo = [p for p in paginas if p.tipo == tipo]
+            if not do_tipo:
+                continue
+            parse = PARSE_FUNCTIONS[tipo]
+            self.stdout.write(self.style.MIGRATE_HEADING(f'{tipo} ({len(do_tipo)} página(s))'))
+            resultados = {}
+            for backend in backends:
+                medida = measure(parse, [p.conteudo for p in do_tipo], backend, options['repeticoes'])
+                self.stdout.write(
+                    f'  {backend:12} {medida["ms_por_pagina"]:8.3f} ms/página  '
+                    f'{medida["paginas_por_segundo"]:8.1f} páginas/s  '
+                    f'pico {medida["pico_kib"]:8.1f} KiB  retido {medida["retido_kib"]:6.1f} KiB')
+                resultados[backend] = [to_json(parse(p.conteudo, backend)) for p in do_tipo]
+            divergencias += self.conferir(do_tipo, backends, resultados, options['gravar'])
+
+        if divergencias:
+            raise CommandError(f'{divergencias} resultado(s) diferente(s) do esperado.')
+
+    def conferir(self, paginas, backends, resultados, gravar):
+        '''Compara cada página com o esperado (ou com o primeiro backend); retorna quantas divergem.'''
+        referencia = backends[0]
+        divergencias = 0
+        for index, pagina in enumerate(paginas):
+            if gravar:
+                record_expected(pagina, resultados[referencia][index])
+                continue
+            esperado, fonte = pagina.esperado, 'do esperado'
+            if not pagina.gravado:
+                esperado, fonte = resultados[referencia][index], f'de {referencia}'
+            for backend in backends:
+                if diferencas := diff_fields(esperado, resultados[backend][index]):
+                    divergencias += 1
+                    self.stdout.write(self.style.WARNING(
+                        f'  {pagina.path.name}: resultado de {backend} difere {fonte}:'))
+                    for linha in diferencas:
+                        self.stdout.write(f'    {linha}')
+        if gravar:
+            self.stdout.write(self.style.SUCCESS(f'  Esperado gravado para {len(paginas)} página(s) com {referencia}.'))
+        elif not divergencias:
+            self.stdout.write(self.style.SUCCESS('  Resultados idênticos ao esperado.'))
+        return divergencias
@@ -0,0 +1,54 @@
+import time
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from imoveis.geocoding import PROVIDERS, Geocoder
+
+
+def parse_lista(value):
+    '''Converte "geoapify,locationiq" em ['geoapify', 'locationiq'].'''
+    return [v.strip().lower() for v in value.split(',') if v.strip()]
+
+
+class Command(BaseCommand):
+    '''Geocodifica os imóveis sem coordenadas.'''
+    help = ('Geocodifica os imóveis sem coordenadas, uma consulta por endereço distinto, em paralelo e '
+            'respeitando a taxa de cada provedor. Quando um provedor não encontra o endereço ou falha, '
+            'o próximo é consultado. Os resultados ficam no GeocodeCache.')
+    provedores_padrao = 'geoapify,locationiq'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--provedores', type=parse_lista, default=parse_lista(self.provedores_padrao),
+                            help=f'Provedores, na ordem de consulta (padrão: {self.provedores_padrao}).')
+        parser.add_argument('--concorrencia', type=int, default=8,
+                            help='Consultas em andamento ao mesmo tempo (padrão: 8).')
+        parser.add_argument('--batch-size', type=int, default=500,
+                            help='Quantidade de imóveis gravados por bulk_update (padrão: 500).')
+
+    def handle(self, *args, **options):
+        if invalidos := [p for p in options['provedores'] if p not in PROVIDERS]:
+            raise CommandError(f'Provedores inválidos: {invalidos}. Opções: {", ".join(PROVIDERS)}.')
+        if options['concorrencia'] < 1 or options['batch_size'] < 1:
+            raise CommandError('--concorrencia e --batch-size devem ser maiores que zero.')
+        provedores = {}
+        for nome in options['provedores']:
+            setting = PROVIDERS[nome].setting
+            api_key = getattr(settings, setting, None)
+            if not api_key:
+                self.stdout.write(self.style.WARNING(f'{setting} não definida em settings.py; {nome} ignorado.'))
+                continue
+            provedores[nome] = api_key
+        if not provedores:
+            raise CommandError('Nenhum provedor com chave de API configurada.')
+
+        inicio = time.monotonic()
+        self.stdout.write(f'Geocodificando com {", ".join(provedores)}...')
+        geocoder = Geocoder(provedores, concorrencia=options['concorrencia'], batch_size=options['batch_size'],
+                            stdout=self.stdout, style=self.style)
+        counts = geocoder.run()
+        consultas = ', '.join(f'{nome}: {counts[f"consultas.{nome}"]}' for nome in provedores)
+        self.stdout.write(self.style.SUCCESS(
+            f'Geocodificação concluída em {time.monotonic() - inicio:.1f}s! '
+            f'Endereços distintos: {counts["enderecos"]}. Do cache: {counts["cache"]}. '
+            f'Consultas ({consultas}). Encontrados: {counts["encontrados"]}. '
+            f'Não encontrados: {counts["nao_encontrados"]}. Erros: {counts["erros"]}. '
+            f'Imóveis atualizados: {counts["atualizados"]}. Sem endereço: {counts["sem_endereco"]}.'))
@@ -0,0 +1,69 @@
+import time
+import requests
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from imoveis.scraping.caixa_csv import CSV_ENCODING, CSV_PATH, CsvImporter, CsvInvalido
+from imoveis.scraping.constants import BASE_URL, ESTADOS_BRASIL
+from imoveis.scraping.http import build_session, make_request
+
+
+def parse_lista(value):
+    '''Converte "SP,RJ" em ['SP', 'RJ'].'''
+    return [v.strip().upper() for v in value.split(',') if v.strip()]
+
+
+class Command(BaseCommand):
+    '''Importa as listas de imóveis em CSV que a Caixa publica por estado.'''
+    help = ('Lê as listas Lista_imoveis_<UF>.csv da Caixa (arquivos locais ou baixados com --estados) e grava '
+            'número, endereço, preço, avaliação e modalidade em lote, sem uma requisição por imóvel. '
+            'Os demais campos ficam para o scrape_caixa.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('arquivos', nargs='*',
+                            help='Arquivos CSV já baixados.')
+        parser.add_argument('--estados', type=parse_lista, default=[],
+                            help='Baixa e importa a lista destes estados, separados por vírgula (ex: SP,RJ).')
+        parser.add_argument('--base-url', default=None,
+                            help='Endereço do site da Caixa (padrão: settings.SCRAPER_BASE_URL ou o site real).')
+        parser.add_argument('--encoding', default=CSV_ENCODING,
+                            help=f'Codificação dos arquivos (padrão: {CSV_ENCODING}).')
+        parser.add_argument('--batch-size', type=int, default=2000,
+                            help='Quantidade de imóveis gravados por transação (padrão: 2000).')
+
+    def handle(self, *args, **options):
+        if not options['arquivos'] and not options['estados']:
+            raise CommandError('Informe arquivos CSV ou --estados.')
+        if invalidos := [e for e in options['estados'] if e not in ESTADOS_BRASIL]:
+            raise CommandError(f'Estados inválidos: {invalidos}')
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size deve ser maior que zero.')
+
+        inicio = time.monotonic()
+        importer = CsvImporter(batch_size=options['batch_size'])
+        for arquivo in options['arquivos']:
+            try:
+                importer.import_file(arquivo, options['encoding'])
+            except (OSError, UnicodeDecodeError, CsvInvalido) as e:
+                raise CommandError(f'Não foi possível importar {arquivo}: {e}')
+            self.stdout.write(f'  {arquivo}: {importer.counts["created"] + importer.counts["updated"]} imóveis até agora.')
+
+        if options['estados']:
+            base_url = (options['base_url'] or getattr(settings, 'SCRAPER_BASE_URL', '') or BASE_URL).rstrip('/')
+            session = build_session(1)
+            for uf in options['estados']:
+                url = f'{base_url}{CSV_PATH.format(uf=uf)}'
+                try:
+                    with make_request(session, url, method='get', verify=False, stream=True,
+                                      timeout=120) as response:
+                        response.raw.decode_content = True
+                        importer.import_bytes(response.raw, options['encoding'])
+                except (requests.exceptions.RequestException, UnicodeDecodeError, CsvInvalido) as e:
+                    self.stdout.write(self.style.ERROR(f'  {uf}: erro ao importar {url}: {e}'))
+                    continue
+                self.stdout.write(f'  {uf}: {importer.counts["created"] + importer.counts["updated"]} imóveis até agora.')
+
+        counts = importer.counts
+        self.stdout.write(self.style.SUCCESS(
+            f'Importação concluída em {time.monotonic() - inicio:.1f}s! Criados: {counts["created"]}. '
+            f'Atualizados: {counts["updated"]}. Repetidos: {counts["repeated"]}. '
+            f'Ignorados (modalidade não buscada ou sem número): {counts["ignored"]}.'))
@@ -0,0 +1,77 @@
+import time
+from datetime import timedelta
+from pathlib import Path
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from imoveis.scraping.staging import PASTA_CARREGADOS, StagingLoader, adopt_orphans, pending_files
+
+
+class Command(BaseCommand):
+    '''Carrega no banco os arquivos de staging gravados pelo scrape_caixa --staging.'''
+    help = ('Valida os arquivos NDJSON de staging e os incorpora ao Imovel em transações grandes. '
+            'Sem arquivos, carrega os pendentes do diretório de staging e os move para carregados/. '
+            'Carregar de novo um arquivo é seguro: dados mais antigos que os do banco são ignorados. '
+            'Arquivos .parcial de scrapers que morreram sem fechá-los são publicados e carregados.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('arquivos', nargs='*',
+                            help='Arquivos .ndjson ou .ndjson.gz (padrão: os pendentes no diretório de staging).')
+        parser.add_argument('--diretorio', default=None,
+                            help='Diretório de staging (padrão: settings.SCRAPER_STAGING_DIR).')
+        parser.add_argument('--batch-size', type=int, default=5000,
+                            help='Quantidade de operações gravadas por transação (padrão: 5000).')
+        parser.add_argument('--validar', action='store_true',
+                            help='Só valida os arquivos, sem gravar nada.')
+        parser.add_argument('--manter', action='store_true',
+                            help='Não move os arquivos carregados para carregados/.')
+        parser.add_argument('--orfaos-apos', type=int, default=60,
+                            help='Minutos sem alteração para um .parcial de outro host ser considerado '
+                                 'abandonado (padrão: 60).')
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size deve ser maior que zero.')
+        root = Path(options['diretorio'] or settings.SCRAPER_STAGING_DIR)
+        if options['arquivos']:
+            arquivos = [Path(a) for a in options['arquivos']]
+            if faltando := [str(a) for a in arquivos if not a.is_file()]:
+                raise CommandError(f'Arquivos não encontrados: {faltando}')
+            mover = False
+        else:
+            if not options['validar']:
+                for arquivo in adopt_orphans(root, timedelta(minutes=options['orfaos_apos'])):
+                    self.stdout.write(self.style.WARNING(f'  {arquivo.name}: .parcial abandonado, publicado.'))
+            arquivos = pending_files(root)
+            mover = not options['manter'] and not options['validar']
+        if not arquivos:
+            self.stdout.write(self.style.WARNING('Nenhum arquivo de staging para carregar.'))
+            return
+
+        inicio = time.monotonic()
+        loader = StagingLoader(batch_size=options['batch_size'], validar=options['validar'])
+        for arquivo in arquivos:
+            linhas, invalidas = loader.linhas, loader.counts['invalid']
+            loader.load(arquivo)
+            invalidas = loader.counts['invalid'] - invalidas
+            self.stdout.write(f'  {arquivo.name}: {loader.linhas - linhas} linhas, {invalidas} inválidas.')
+            # Um arquivo com linhas inválidas fica no lugar para ser examinado
+            if mover and not invalidas:
+                destino = root / PASTA_CARREGADOS / arquivo.name
+                destino.parent.mkdir(parents=True, exist_ok=True)
+                arquivo.replace(destino)
+
+        counts = loader.counts
+        for erro in loader.erros:
+            self.stdout.write(self.style.WARNING(f'  {erro}'))
+        if options['validar']:
+            self.stdout.write(self.style.SUCCESS(
+                f'Validação concluída: {counts["upsert"]} upserts, {counts["touch"]} sem mudanças, '
+                f'{counts["desativar"]} desativações, {counts["invalid"]} linhas inválidas.'))
+        else:
+            self.stdout.write(self.style.SUCCESS(
+                f'Carga concluída em {time.monotonic() - inicio:.1f}s! Criados: {counts["created"]}. '
+                f'Atualizados: {counts["updated"]}. Sem mudanças: {counts["unchanged"]}. '
+                f'Desativados: {counts["deactivated"]}. Mais antigos que o banco: {counts["stale"]}. '
+                f'Sem imóvel: {counts["missing"]}. Linhas inválidas: {counts["invalid"]}.'))
+        if counts['invalid']:
+            raise CommandError(f'{counts["invalid"]} linha(s) inválida(s).')
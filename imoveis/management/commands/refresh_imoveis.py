@@ -0,0 +1,120 @@
+import time
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from imoveis.scraping.archive import HtmlArchive
+from imoveis.scraping.engine import CaixaScraper
+from imoveis.scraping.parsers import HTML_PARSERS
+from imoveis.scraping.pipeline import format_summary
+from imoveis.scraping.scheduler import build_refresh_queue
+from imoveis.scraping.telemetry import format_report, profile_to, write_report
+
+
+class Command(BaseCommand):
+    '''Atualiza os imóveis já cadastrados, dos mais urgentes para os menos urgentes.'''
+    help = ('Baixa de novo a página de detalhe dos imóveis conhecidos, priorizando leilões próximos, '
+            'editais recentes, imóveis favoritados e dados antigos, até gastar o orçamento de requisições.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--orcamento', type=int, default=1000,
+            help='Máximo de requisições à Caixa nesta execução, incluindo novas tentativas (padrão: 1000).')
+        parser.add_argument(
+            '--todos', action='store_true',
+            help='Gasta o orçamento mesmo com imóveis que ainda estão dentro do intervalo de atualização.')
+        parser.add_argument(
+            '--listar', action='store_true',
+            help='Só mostra a fila, sem acessar a Caixa.')
+        parser.add_argument(
+            '--concurrency', type=int, default=8,
+            help='Número máximo de requisições simultâneas à Caixa (padrão: 8).')
+        parser.add_argument(
+            '--rate', type=float, default=2.0,
+            help='Requisições por segundo no início; a taxa se ajusta às respostas da Caixa (padrão: 2).')
+        parser.add_argument(
+            '--max-rate', type=float, default=20.0,
+            help='Teto da taxa adaptativa, em requisições por segundo (padrão: 20).')
+        parser.add_argument(
+            '--parse-workers', type=int, default=2,
+            help='Threads (ou processos, com --parse-processos) do estágio de parse das páginas de detalhe (padrão: 2).')
+        parser.add_argument(
+            '--parse-processos', action='store_true',
+            help='Faz o parse das páginas de detalhe em processos separados, usando vários núcleos.')
+        parser.add_argument(
+            '--fila', type=int, default=100,
+            help='Tamanho máximo da fila de cada estágio do pipeline (padrão: 100).')
+        parser.add_argument(
+            '--batch-size', type=int, default=200,
+            help='Quantidade de imóveis gravados por transação (padrão: 200).')
+        parser.add_argument(
+            '--parser', choices=HTML_PARSERS, default=None,
+            help='Backend HTML do BeautifulSoup (padrão: settings.SCRAPER_HTML_PARSER ou lxml, se instalado).')
+        parser.add_argument(
+            '--forcar', action='store_true',
+            help='Analisa e regrava todas as páginas de detalhe, mesmo as que não mudaram desde a última execução.')
+        parser.add_argument(
+            '--arquivar', action='store_true',
+            help='Guarda as páginas baixadas, comprimidas, em settings.SCRAPER_ARCHIVE_DIR (para o reparse_imoveis).')
+        parser.add_argument(
+            '--base-url', default=None,
+            help='Endereço do site da Caixa (padrão: settings.SCRAPER_BASE_URL ou o site real); ex: o do simular_caixa.')
+        parser.add_argument(
+            '--telemetria', metavar='ARQUIVO',
+            help='Grava o relatório da execução (latências, bytes, status HTTP, falhas de parse) em JSON.')
+        parser.add_argument(
+            '--perfil', metavar='ARQUIVO',
+            help='Roda sob cProfile e grava as estatísticas (pstats) em ARQUIVO, para snakeviz ou flameprof. '
+                 'Mede só a thread principal: use com --parse-workers 1 --concurrency 1 para ver o custo do parse.')
+
+    def handle(self, *args, **options):
+        if options['orcamento'] < 1:
+            raise CommandError('--orcamento deve ser maior que zero.')
+        if options['concurrency'] < 1:
+            raise CommandError('--concurrency deve ser maior que zero.')
+        if options['rate'] <= 0 or options['max_rate'] <= 0:
+            raise CommandError('--rate e --max-rate devem ser maiores que zero.')
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size deve ser maior que zero.')
+        if options['parse_workers'] < 1 or options['fila'] < 1:
+            raise CommandError('--parse-workers e --fila devem ser maiores que zero.')
+
+        fila = build_refresh_queue(
+            options['orcamento'], apenas_atrasados=not options['todos'])
+        if not fila:
+            self.stdout.write(self.style.SUCCESS(
+                'Nenhum imóvel precisa de atualização.'))
+            return
+        if options['listar']:
+            for item in fila:
+                self.stdout.write(
+                    f'{item.listing["numero_imovel"]}\tprioridade {item.prioridade:.2f}')
+            return
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Atualizando até {len(fila)} imóvel(is) com orçamento de {options["orcamento"]} requisições...'))
+
+        inicio = time.monotonic()
+        scraper = CaixaScraper(
+            [], [], concurrency=options['concurrency'],
+            batch_size=options['batch_size'], parser=options['parser'],
+            rate=options['rate'], max_rate=options['max_rate'],
+            archive=HtmlArchive(
+                settings.SCRAPER_ARCHIVE_DIR) if options['arquivar'] else None,
+            force=options['forcar'],
+            parse_workers=options['parse_workers'], parse_processes=options['parse_processos'],
+            queue_size=options['fila'], base_url=options['base_url'],
+            stdout=self.stdout, style=self.style)
+        with profile_to(options['perfil']):
+            stats = scraper.refresh(fila, options['orcamento'])
+
+        self.stdout.write(self.style.SUCCESS(
+            f'\nAtualização concluída em {time.monotonic() - inicio:.1f}s! '
+            f'Atualizados: {stats["updated"]}. Sem mudanças: {stats["unchanged"]}. '
+            f'Erros: {stats["errors"]}. Requisições: {stats["requests"]}. Sem orçamento: {stats["pending"]}.'))
+        for linha in format_summary(scraper.pipeline_stats):
+            self.stdout.write(f'  {linha}')
+        report = scraper.report()
+        for linha in format_report(report):
+            self.stdout.write(f'  {linha}')
+        if options['telemetria']:
+            write_report(options['telemetria'], report)
+            self.stdout.write(f'Relatório gravado em {options["telemetria"]}.')
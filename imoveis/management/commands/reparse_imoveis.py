@@ -0,0 +1,94 @@
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date
+from functools import partial
+
+import django
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_datetime
+from imoveis.models import Imovel
+from imoveis.scraping.archive import HtmlArchive, reparse_entry
+from imoveis.scraping.parsers import HTML_PARSERS
+from imoveis.scraping.writer import BulkImovelWriter
+
+
+def parse_dia(value):
+    try:
+        return date.fromisoformat(value)
+    except ValueError:
+        raise CommandError(f'Data inválida: {value}. Use AAAA-MM-DD.')
+
+
+def stored_scraped_at(keys, chunk_size=500):
+    '''scraped_at gravado de cada numero_imovel de `keys` que já está no banco.'''
+    gravados = {}
+    for i in range(0, len(keys), chunk_size):
+        rows = Imovel.objects.filter(numero_imovel__in=keys[i:i + chunk_size]).exclude(scraped_at=None)
+        gravados.update(rows.values_list('numero_imovel', 'scraped_at'))
+    return gravados
+
+
+class Command(BaseCommand):
+    '''Reconstrói os imóveis a partir das páginas arquivadas pelo scrape_caixa --arquivar.'''
+    help = 'Reprocessa as páginas de detalhe arquivadas localmente e regrava os imóveis, sem acessar a rede.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--arquivo', default=None,
+                            help='Diretório do arquivo (padrão: settings.SCRAPER_ARCHIVE_DIR).')
+        parser.add_argument('--desde', type=parse_dia, default=None,
+                            help='Primeiro dia considerado (AAAA-MM-DD).')
+        parser.add_argument('--ate', type=parse_dia, default=None,
+                            help='Último dia considerado (AAAA-MM-DD).')
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                            help='Processos usados no parse (padrão: número de CPUs).')
+        parser.add_argument('--batch-size', type=int, default=500,
+                            help='Quantidade de imóveis gravados por transação (padrão: 500).')
+        parser.add_argument('--parser', choices=HTML_PARSERS, default=None,
+                            help='Backend HTML do BeautifulSoup.')
+        parser.add_argument('--forcar', action='store_true',
+                            help='Reprocessa também as páginas mais antigas que o scraped_at gravado.')
+
+    def handle(self, *args, **options):
+        root = options['arquivo'] or settings.SCRAPER_ARCHIVE_DIR
+        if not os.path.isdir(root):
+            raise CommandError(f'Arquivo não encontrado: {root}')
+        if options['workers'] < 1:
+            raise CommandError('--workers deve ser maior que zero.')
+
+        # Só a versão mais recente de cada imóvel no período é reprocessada
+        entries = list(HtmlArchive(root).latest(
+            'detalhe', options['desde'], options['ate']).values())
+        antigas = 0
+        if not options['forcar']:
+            # Uma página mais antiga que o scraped_at gravado desfaria dados mais novos
+            gravados = stored_scraped_at([entry['key'] for entry in entries])
+            recentes = [entry for entry in entries if entry['key'] not in gravados
+                        or parse_datetime(entry['fetched_at']) >= gravados[entry['key']]]
+            antigas = len(entries) - len(recentes)
+            entries = recentes
+        if not entries:
+            self.stdout.write(self.style.WARNING(
+                f'Nenhuma página de detalhe no período (mais antigas que o banco: {antigas}).'))
+            return
+        self.stdout.write(
+            f'Reprocessando {len(entries)} imóveis com {options["workers"]} processo(s)...')
+
+        inicio = time.monotonic()
+        writer = BulkImovelWriter(batch_size=options['batch_size'])
+        sem_dados = 0
+        worker = partial(reparse_entry, root, parser=options['parser'])
+        with ProcessPoolExecutor(max_workers=options['workers'], initializer=django.setup) as executor:
+            for defaults in executor.map(worker, entries, chunksize=32):
+                if defaults is None:
+                    sem_dados += 1
+                    continue
+                # Reprocessar não diz nada sobre o imóvel ainda estar na Caixa
+                writer.add(defaults, reativar=False)
+        writer.flush()
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Reprocessamento concluído em {time.monotonic() - inicio:.1f}s! '
+            f'Criados: {writer.totals["created"]}. Atualizados: {writer.totals["updated"]}. '
+            f'Sem dadosImovel: {sem_dados}. Mais antigas que o banco: {antigas}.'))
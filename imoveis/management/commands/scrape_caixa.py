@@ -0,0 +1,186 @@
+import time
+from datetime import timedelta
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from imoveis.scraping.archive import HtmlArchive
+from imoveis.scraping.checkpoint import last_unfinished_run, start_run
+from imoveis.scraping.constants import ESTADOS_BRASIL, MODALIDADES
+from imoveis.scraping.engine import CaixaScraper
+from imoveis.scraping.parsers import HTML_PARSERS
+from imoveis.scraping.pipeline import format_summary
+from imoveis.scraping.telemetry import format_report, profile_to, write_report
+from imoveis.scraping.workqueue import enqueue_run
+
+
+def parse_lista(value):
+    '''Converte "SP,RJ" em ['SP', 'RJ'].'''
+    return [v.strip() for v in value.split(',') if v.strip()]
+
+
+class Command(BaseCommand):
+    '''Script to get imoveis from Caixa.'''
+    help = 'Executa o processo completo de scraping (lista e detalhes) dos imóveis da Caixa, com requisições concorrentes.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--modalidades', type=parse_lista, default=[str(m) for m in MODALIDADES],
+            help=f'Valores de hdn_tp_venda separados por vírgula (padrão: {",".join(map(str, MODALIDADES))}).')
+        parser.add_argument(
+            '--estados', type=parse_lista, default=ESTADOS_BRASIL,
+            help='Siglas dos estados separadas por vírgula (padrão: todos).')
+        parser.add_argument(
+            '--concurrency', type=int, default=8,
+            help='Número máximo de requisições simultâneas à Caixa (padrão: 8).')
+        parser.add_argument(
+            '--rate', type=float, default=2.0,
+            help='Requisições por segundo no início; a taxa se ajusta às respostas da Caixa (padrão: 2).')
+        parser.add_argument(
+            '--max-rate', type=float, default=20.0,
+            help='Teto da taxa adaptativa, em requisições por segundo (padrão: 20).')
+        parser.add_argument(
+            '--incremental', action='store_true',
+            help='Baixa apenas imóveis novos ou com scraped_at mais antigo que --ttl-horas.')
+        parser.add_argument(
+            '--ttl-horas', type=float, default=24,
+            help='Idade máxima, em horas, de um imóvel no modo incremental (padrão: 24).')
+        parser.add_argument(
+            '--parse-workers', type=int, default=2,
+            help='Threads (ou processos, com --parse-processos) do estágio de parse das páginas de detalhe (padrão: 2).')
+        parser.add_argument(
+            '--parse-processos', action='store_true',
+            help='Faz o parse das páginas de detalhe em processos separados, usando vários núcleos.')
+        parser.add_argument(
+            '--fila', type=int, default=100,
+            help='Tamanho máximo da fila de cada estágio do pipeline (padrão: 100).')
+        parser.add_argument(
+            '--batch-size', type=int, default=200,
+            help='Quantidade de imóveis gravados por transação (padrão: 200).')
+        parser.add_argument(
+            '--parser', choices=HTML_PARSERS, default=None,
+            help='Backend HTML do BeautifulSoup (padrão: settings.SCRAPER_HTML_PARSER ou lxml, se instalado).')
+        parser.add_argument(
+            '--forcar', action='store_true',
+            help='Analisa e regrava todas as páginas de detalhe, mesmo as que não mudaram desde a última execução.')
+        parser.add_argument(
+            '--varredura', action='store_true',
+            help='Relê só a Etapa 1 e os lotes de carregaListaImoveis.asp e baixa o detalhe apenas dos imóveis '
+                 'novos ou com preço, descrição ou foto diferentes do gravado (cerca de um décimo das requisições).')
+        parser.add_argument(
+            '--arquivar', action='store_true',
+            help='Guarda as páginas baixadas, comprimidas, em settings.SCRAPER_ARCHIVE_DIR (para o reparse_imoveis).')
+        parser.add_argument(
+            '--staging', nargs='?', const='', default=None, metavar='DIRETORIO',
+            help='Grava os imóveis em um arquivo NDJSON (padrão: settings.SCRAPER_STAGING_DIR) em vez do banco; '
+                 'a carga fica para o load_imoveis.')
+        parser.add_argument(
+            '--comprimir', action='store_true',
+            help='Com --staging, grava o arquivo comprimido (.ndjson.gz).')
+        parser.add_argument(
+            '--base-url', default=None,
+            help='Endereço do site da Caixa (padrão: settings.SCRAPER_BASE_URL ou o site real); ex: o do simular_caixa.')
+        parser.add_argument(
+            '--telemetria', metavar='ARQUIVO',
+            help='Grava o relatório da execução (latências, bytes, status HTTP, falhas de parse) em JSON.')
+        parser.add_argument(
+            '--perfil', metavar='ARQUIVO',
+            help='Roda sob cProfile e grava as estatísticas (pstats) em ARQUIVO, para snakeviz ou flameprof. '
+                 'Mede só a thread principal: use com --parse-workers 1 --concurrency 1 para ver o custo do parse.')
+        parser.add_argument(
+            '--resume', action='store_true',
+            help='Continua a última execução interrompida, com as mesmas modalidades e estados, pulando o que já foi gravado.')
+        parser.add_argument(
+            '--enfileirar', action='store_true',
+            help='Não baixa nada: cria a execução na fila de tarefas, para ser processada por um ou mais scrape_worker.')
+
+    def handle(self, *args, **options):
+        if options['resume']:
+            run = last_unfinished_run()
+            if run is None:
+                raise CommandError('Nenhuma execução interrompida para retomar.')
+            options['modalidades'] = [str(m) for m in run.modalidades]
+            options['estados'] = run.estados
+            self.stdout.write(
+                f'Retomando a execução #{run.pk} iniciada em {run.started_at:%d/%m/%Y %H:%M}.')
+
+        try:
+            modalidades = [int(m) for m in options['modalidades']]
+        except ValueError as e:
+            raise CommandError(f'Modalidade inválida: {e}')
+        if invalidas := [m for m in modalidades if m not in MODALIDADES]:
+            raise CommandError(
+                f'Modalidades não suportadas: {invalidas}. Use: {list(MODALIDADES)}')
+
+        estados = [e.upper() for e in options['estados']]
+        if invalidos := [e for e in estados if e not in ESTADOS_BRASIL]:
+            raise CommandError(f'Estados inválidos: {invalidos}')
+
+        if options['concurrency'] < 1:
+            raise CommandError('--concurrency deve ser maior que zero.')
+        if options['rate'] <= 0 or options['max_rate'] <= 0:
+            raise CommandError('--rate e --max-rate devem ser maiores que zero.')
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size deve ser maior que zero.')
+        if options['parse_workers'] < 1 or options['fila'] < 1:
+            raise CommandError('--parse-workers e --fila devem ser maiores que zero.')
+
+        if options['comprimir'] and options['staging'] is None:
+            raise CommandError('--comprimir só vale com --staging.')
+        staging = options['staging']
+        if staging == '':
+            staging = settings.SCRAPER_STAGING_DIR
+
+        if options['varredura'] and options['forcar']:
+            raise CommandError('--varredura não pode ser usada com --forcar.')
+
+        if options['enfileirar']:
+            if options['resume']:
+                raise CommandError('--enfileirar não pode ser usado com --resume.')
+            run = enqueue_run(modalidades, estados)
+            self.stdout.write(self.style.SUCCESS(
+                f'Execução #{run.pk} enfileirada com {len(estados)} tarefa(s) de busca. '
+                f'Rode scrape_worker (em quantas máquinas quiser) para processá-la.'))
+            return
+
+        if not options['resume']:
+            run = start_run(modalidades, estados)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Iniciando scraping de {len(estados)} estado(s) em {len(modalidades)} modalidade(s) '
+            f'com concorrência {options["concurrency"]}...'))
+
+        inicio = time.monotonic()
+        scraper = CaixaScraper(
+            modalidades, estados, concurrency=options['concurrency'],
+            incremental=options['incremental'], ttl=timedelta(hours=options['ttl_horas']),
+            batch_size=options['batch_size'], parser=options['parser'],
+            rate=options['rate'], max_rate=options['max_rate'],
+            archive=HtmlArchive(
+                settings.SCRAPER_ARCHIVE_DIR) if options['arquivar'] else None,
+            run=run, force=options['forcar'],
+            parse_workers=options['parse_workers'], parse_processes=options['parse_processos'],
+            queue_size=options['fila'], base_url=options['base_url'], sweep=options['varredura'],
+            staging=staging, staging_gzip=options['comprimir'],
+            stdout=self.stdout, style=self.style)
+        with profile_to(options['perfil']):
+            stats = scraper.run()
+
+        self.stdout.write(self.style.SUCCESS(
+            f'\nProcesso de scraping concluído em {time.monotonic() - inicio:.1f}s! '
+            f'Criados: {stats["created"]}. Atualizados: {stats["updated"]}. '
+            f'Sem mudanças: {stats["unchanged"]}. Repetidos entre modalidades: {stats["duplicates"]}. '
+            f'Ignorados: {stats["skipped"]}. Desativados: {stats["deactivated"]}. Erros: {stats["errors"]}. '
+            f'Novas tentativas: {stats["retries"]}.'))
+        if staging is not None:
+            self.stdout.write(
+                f'{stats["staged"]} imóveis gravados em {scraper.writer.path}; rode load_imoveis para carregá-los.')
+        if options['varredura']:
+            self.stdout.write(
+                f'Varredura: {stats["swept"]} imóveis sem mudanças no lote não tiveram o detalhe baixado.')
+        for linha in format_summary(scraper.pipeline_stats):
+            self.stdout.write(f'  {linha}')
+        report = scraper.report()
+        for linha in format_report(report):
+            self.stdout.write(f'  {linha}')
+        if options['telemetria']:
+            write_report(options['telemetria'], report)
+            self.stdout.write(f'Relatório gravado em {options["telemetria"]} (execução #{run.pk}).')
@@ -0,0 +1,48 @@
+import json
+from django.core.management.base import BaseCommand, CommandError
+from imoveis.models import ScrapeRun
+from imoveis.scraping.pipeline import format_summary
+from imoveis.scraping.telemetry import format_report, write_report
+
+
+class Command(BaseCommand):
+    '''Mostra ou exporta o relatório de telemetria de uma execução do scrape_caixa.'''
+    help = 'Mostra o relatório de telemetria gravado em um ScrapeRun (o mais recente, por padrão) ou o exporta em JSON.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('run', nargs='?', type=int,
+                            help='ID da execução (padrão: a mais recente com relatório).')
+        parser.add_argument('--json', action='store_true',
+                            help='Imprime o relatório completo em JSON.')
+        parser.add_argument('--saida', metavar='ARQUIVO',
+                            help='Grava o relatório completo em JSON em ARQUIVO.')
+
+    def handle(self, *args, **options):
+        runs = ScrapeRun.objects.exclude(telemetria=None)
+        if options['run'] is not None:
+            run = runs.filter(pk=options['run']).first()
+        else:
+            run = runs.order_by('-started_at').first()
+        if run is None:
+            raise CommandError('Nenhuma execução com relatório de telemetria encontrada.')
+
+        report = {'run': run.pk, 'status': run.status,
+                  'started_at': run.started_at, 'finished_at': run.finished_at,
+                  'modalidades': run.modalidades, 'estados': run.estados, **run.telemetria}
+        if options['saida']:
+            write_report(options['saida'], report)
+            self.stdout.write(self.style.SUCCESS(f'Relatório da execução #{run.pk} gravado em {options["saida"]}.'))
+            return
+        if options['json']:
+            self.stdout.write(json.dumps(report, ensure_ascii=False, indent=2, default=str))
+            return
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Execução #{run.pk} ({run.get_status_display()}), {run.telemetria["duracao_segundos"]:g}s'))
+        for estado, por_modalidade in run.telemetria['resultados'].items():
+            for modalidade, counts in por_modalidade.items():
+                self.stdout.write(
+                    f'  {estado} / {modalidade}: {counts.get("created", 0)} criados, '
+                    f'{counts.get("updated", 0)} atualizados, {counts.get("unchanged", 0)} sem mudanças')
+        for linha in format_summary(run.telemetria.get('pipeline', {})) + format_report(run.telemetria):
+            self.stdout.write(f'  {linha}')
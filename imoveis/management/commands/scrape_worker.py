@@ -0,0 +1,145 @@
+import time
+from datetime import timedelta
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from imoveis.models import ScrapeRun
+from imoveis.scraping.archive import HtmlArchive
+from imoveis.scraping.engine import CaixaScraper
+from imoveis.scraping.parsers import HTML_PARSERS
+from imoveis.scraping.pipeline import format_summary
+from imoveis.scraping.telemetry import format_report, write_report
+from imoveis.scraping.workqueue import QueueWorker, queue_summary
+
+
+class Command(BaseCommand):
+    '''Processa a fila de tarefas criada por scrape_caixa --enfileirar.'''
+    help = ('Pega tarefas de busca e de lote da fila no banco e as executa. Vários workers, em processos '
+            'ou máquinas diferentes, podem processar a mesma execução ao mesmo tempo.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--nome', default=None,
+            help='Nome do worker na fila (padrão: host-pid).')
+        parser.add_argument(
+            '--run', type=int, default=None,
+            help='Só processa as tarefas desta execução (padrão: todas).')
+        parser.add_argument(
+            '--tarefas', type=int, default=2,
+            help='Tarefas executadas ao mesmo tempo por este worker (padrão: 2).')
+        parser.add_argument(
+            '--lease', type=float, default=300,
+            help='Segundos sem heartbeat até uma tarefa voltar para a fila (padrão: 300).')
+        parser.add_argument(
+            '--max-tentativas', type=int, default=3,
+            help='Tentativas de cada tarefa antes de ela ser marcada como falha (padrão: 3).')
+        parser.add_argument(
+            '--ids-por-tarefa', type=int, default=100,
+            help='IDs por tarefa de lote criada a partir de uma busca (padrão: 100).')
+        parser.add_argument(
+            '--taxa-total', type=float, default=None,
+            help='Requisições por segundo somando todos os workers; cada um usa uma fatia igual (padrão: sem limite global).')
+        parser.add_argument(
+            '--continuo', action='store_true',
+            help='Continua esperando novas tarefas quando a fila esvazia.')
+        parser.add_argument(
+            '--espera', type=float, default=5.0,
+            help='Segundos entre consultas à fila quando não há tarefa livre (padrão: 5).')
+        parser.add_argument(
+            '--concurrency', type=int, default=8,
+            help='Número máximo de requisições simultâneas à Caixa (padrão: 8).')
+        parser.add_argument(
+            '--rate', type=float, default=2.0,
+            help='Requisições por segundo no início; a taxa se ajusta às respostas da Caixa (padrão: 2).')
+        parser.add_argument(
+            '--max-rate', type=float, default=20.0,
+            help='Teto da taxa adaptativa, em requisições por segundo (padrão: 20).')
+        parser.add_argument(
+            '--parse-workers', type=int, default=2,
+            help='Threads (ou processos, com --parse-processos) do estágio de parse das páginas de detalhe (padrão: 2).')
+        parser.add_argument(
+            '--parse-processos', action='store_true',
+            help='Faz o parse das páginas de detalhe em processos separados, usando vários núcleos.')
+        parser.add_argument(
+            '--fila', type=int, default=100,
+            help='Tamanho máximo da fila de cada estágio do pipeline (padrão: 100).')
+        parser.add_argument(
+            '--batch-size', type=int, default=200,
+            help='Quantidade de imóveis gravados por transação (padrão: 200).')
+        parser.add_argument(
+            '--parser', choices=HTML_PARSERS, default=None,
+            help='Backend HTML do BeautifulSoup (padrão: settings.SCRAPER_HTML_PARSER ou lxml, se instalado).')
+        parser.add_argument(
+            '--forcar', action='store_true',
+            help='Analisa e regrava todas as páginas de detalhe, mesmo as que não mudaram desde a última execução.')
+        parser.add_argument(
+            '--arquivar', action='store_true',
+            help='Guarda as páginas baixadas, comprimidas, em settings.SCRAPER_ARCHIVE_DIR (para o reparse_imoveis).')
+        parser.add_argument(
+            '--base-url', default=None,
+            help='Endereço do site da Caixa (padrão: settings.SCRAPER_BASE_URL ou o site real); ex: o do simular_caixa.')
+        parser.add_argument(
+            '--telemetria', metavar='ARQUIVO',
+            help='Grava o relatório deste worker (latências, bytes, status HTTP, falhas de parse) em JSON.')
+
+    def handle(self, *args, **options):
+        run = None
+        if options['run'] is not None:
+            try:
+                run = ScrapeRun.objects.get(pk=options['run'])
+            except ScrapeRun.DoesNotExist:
+                raise CommandError(f'Execução #{options["run"]} não encontrada.')
+
+        for opcao in ('tarefas', 'max_tentativas', 'ids_por_tarefa', 'concurrency',
+                      'batch_size', 'parse_workers', 'fila'):
+            if options[opcao] < 1:
+                raise CommandError(f'--{opcao.replace("_", "-")} deve ser maior que zero.')
+        if options['lease'] <= 0 or options['espera'] <= 0:
+            raise CommandError('--lease e --espera devem ser maiores que zero.')
+        if options['rate'] <= 0 or options['max_rate'] <= 0:
+            raise CommandError('--rate e --max-rate devem ser maiores que zero.')
+        if options['taxa_total'] is not None and options['taxa_total'] <= 0:
+            raise CommandError('--taxa-total deve ser maior que zero.')
+
+        worker = QueueWorker(
+            nome=options['nome'], lease=timedelta(seconds=options['lease']), slots=options['tarefas'],
+            run=run, continuo=options['continuo'], espera=options['espera'],
+            max_tentativas=options['max_tentativas'], ids_por_tarefa=options['ids_por_tarefa'],
+            taxa_total=options['taxa_total'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Worker {worker.nome} processando a fila'
+            f'{f" da execução #{run.pk}" if run else ""} com {worker.slots} tarefa(s) simultânea(s)...'))
+
+        inicio = time.monotonic()
+        scraper = CaixaScraper(
+            [], [], concurrency=options['concurrency'],
+            batch_size=options['batch_size'], parser=options['parser'],
+            rate=options['rate'], max_rate=options['max_rate'],
+            archive=HtmlArchive(
+                settings.SCRAPER_ARCHIVE_DIR) if options['arquivar'] else None,
+            force=options['forcar'],
+            parse_workers=options['parse_workers'], parse_processes=options['parse_processos'],
+            queue_size=options['fila'], base_url=options['base_url'],
+            stdout=self.stdout, style=self.style)
+        try:
+            stats = scraper.work(worker)
+        except KeyboardInterrupt:
+            self.stdout.write(self.style.WARNING('\nInterrompido; as tarefas em andamento voltaram para a fila.'))
+            stats = scraper.stats
+
+        self.stdout.write(self.style.SUCCESS(
+            f'\nWorker {worker.nome} encerrado em {time.monotonic() - inicio:.1f}s! '
+            f'Criados: {stats["created"]}. Atualizados: {stats["updated"]}. '
+            f'Sem mudanças: {stats["unchanged"]}. Desativados: {stats["deactivated"]}. '
+            f'Erros: {stats["errors"]}. Novas tentativas: {stats["retries"]}.'))
+        for linha in format_summary(scraper.pipeline_stats):
+            self.stdout.write(f'  {linha}')
+        report = scraper.report()
+        for linha in format_report(report):
+            self.stdout.write(f'  {linha}')
+        if options['telemetria']:
+            write_report(options['telemetria'], report)
+            self.stdout.write(f'Relatório gravado em {options["telemetria"]}.')
+
+        self.stdout.write(self.style.MIGRATE_HEADING('Fila:'))
+        for (tipo, status), n in queue_summary(run).items():
+            self.stdout.write(f'  {tipo:6} {status:8} {n}')
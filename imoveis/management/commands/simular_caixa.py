@@ -0,0 +1,73 @@
+from django.core.management.base import BaseCommand, CommandError
+from imoveis.scraping.benchmark import load_corpus
+from imoveis.scraping.simulador import Catalogo, Falhas, SimuladorCaixa
+
+
+class Command(BaseCommand):
+    '''Sobe um servidor local que imita os endpoints da Caixa.'''
+    help = ('Serve carregaPesquisaImoveis.asp, carregaListaImoveis.asp e detalhe-imovel.asp com um catálogo '
+            'sintético, para testes de carga do scrape_caixa sem acessar a Caixa. '
+            'Use com SCRAPER_BASE_URL ou --base-url apontando para o endereço mostrado.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--host', default='127.0.0.1',
+                            help='Endereço de escuta (padrão: 127.0.0.1).')
+        parser.add_argument('--porta', type=int, default=8765,
+                            help='Porta de escuta (padrão: 8765).')
+        parser.add_argument('--imoveis', type=int, default=10000,
+                            help='Tamanho do catálogo, distribuído entre os estados (padrão: 10000).')
+        parser.add_argument('--semente', type=int, default=1,
+                            help='Semente do catálogo e das falhas; a mesma semente gera os mesmos imóveis (padrão: 1).')
+        parser.add_argument('--latencia', type=float, default=0.0,
+                            help='Latência média de cada resposta, em segundos (padrão: 0).')
+        parser.add_argument('--taxa-erro', type=float, default=0.0,
+                            help='Probabilidade de responder 500/503 (padrão: 0).')
+        parser.add_argument('--taxa-429', type=float, default=0.0,
+                            help='Probabilidade de responder 429 aleatoriamente (padrão: 0).')
+        parser.add_argument('--limite-rps', type=float, default=None,
+                            help='Requisições por segundo acima das quais o servidor responde 429 (padrão: sem limite).')
+        parser.add_argument('--retry-after', type=int, default=1,
+                            help='Valor do cabeçalho Retry-After dos 429, em segundos (padrão: 1).')
+        parser.add_argument('--lote-max', type=int, default=None,
+                            help='Máximo de imóveis devolvidos por carregaListaImoveis.asp (padrão: todos os pedidos).')
+        parser.add_argument('--corpus', action='store_true',
+                            help='Serve as páginas de detalhe do corpus gravado (tests/fixtures) em vez das sintéticas.')
+        parser.add_argument('--verbose-http', action='store_true',
+                            help='Mostra cada requisição recebida.')
+
+    def handle(self, *args, **options):
+        if options['imoveis'] < 1:
+            raise CommandError('--imoveis deve ser maior que zero.')
+        for opcao in ('taxa_erro', 'taxa_429'):
+            if not 0 <= options[opcao] <= 1:
+                raise CommandError(f'--{opcao.replace("_", "-")} deve estar entre 0 e 1.')
+
+        paginas = None
+        if options['corpus']:
+            paginas = [p.conteudo for p in load_corpus(tipos=['detalhe']) if p.esperado is not None]
+
+        catalogo = Catalogo(options['imoveis'], semente=options['semente'])
+        falhas = Falhas(
+            latencia=options['latencia'], taxa_erro=options['taxa_erro'], taxa_429=options['taxa_429'],
+            limite_rps=options['limite_rps'], retry_after=options['retry_after'],
+            lote_max=options['lote_max'], semente=options['semente'])
+        try:
+            servidor = SimuladorCaixa((options['host'], options['porta']), catalogo, falhas,
+                                      paginas_detalhe=paginas, verbose=options['verbose_http'])
+        except OSError as e:
+            raise CommandError(f'Não foi possível abrir {options["host"]}:{options["porta"]}: {e}')
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Simulador da Caixa em {servidor.url} com {catalogo.tamanho} imóveis. '
+            f'Rode o scraper com SCRAPER_BASE_URL={servidor.url}. Ctrl+C para parar.'))
+        try:
+            servidor.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            servidor.server_close()
+            resumo = servidor.resumo()
+            self.stdout.write(f'\n{sum(resumo["requisicoes"].values())} requisições, '
+                              f'{resumo["bytes"] / 1_000_000:.1f} MB servidos.')
+            for chave, n in sorted(resumo['requisicoes'].items()):
+                self.stdout.write(f'  {chave}: {n}')
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-17 02:07
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('imoveis', '0013_imovel_estado'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='imovel',
+            name='scraped_at',
+            field=models.DateTimeField(blank=True, db_index=True, null=True),
+        ),
+    ]
@@ -0,0 +1,61 @@
+from django.db import migrations
+from django.db.models import Count, F
+from django.utils.text import slugify
+
+CAMPOS_PRESERVADOS = ('latitude', 'longitude', 'estado')
+
+
+def merge_duplicates(apps, schema_editor):
+    '''
+    Junta os imóveis com o mesmo numero_imovel (criados pelo antigo slug em
+    md5, que mudava junto com o preço). Fica a linha raspada mais
+    recentemente; os favoritos das demais passam para ela.
+    '''
+    Imovel = apps.get_model('imoveis', 'Imovel')
+    Favorito = apps.get_model('imoveis', 'Favorito')
+
+    duplicados = (Imovel.objects.values('numero_imovel')
+                  .annotate(total=Count('id')).filter(total__gt=1))
+    for row in duplicados.iterator():
+        keeper, *others = Imovel.objects.filter(numero_imovel=row['numero_imovel']).order_by(
+            F('scraped_at').desc(nulls_last=True), '-id')
+
+        # Coordenadas e estado são preenchidos por outros comandos; não perdê-los
+        for field in CAMPOS_PRESERVADOS:
+            if getattr(keeper, field) is None:
+                for other in others:
+                    if getattr(other, field) is not None:
+                        setattr(keeper, field, getattr(other, field))
+                        break
+        keeper.save(update_fields=list(CAMPOS_PRESERVADOS))
+
+        other_ids = [other.id for other in others]
+        usuarios = set(Favorito.objects.filter(
+            imovel=keeper).values_list('usuario_id', flat=True))
+        for favorito in Favorito.objects.filter(imovel_id__in=other_ids).order_by('criado_em'):
+            if favorito.usuario_id in usuarios:
+                favorito.delete()
+            else:
+                favorito.imovel_id = keeper.id
+                favorito.save(update_fields=['imovel'])
+                usuarios.add(favorito.usuario_id)
+
+        Imovel.objects.filter(id__in=other_ids).delete()
+
+    # Troca o slug em md5 pelo slug derivado do numero_imovel
+    imoveis = []
+    for imovel in Imovel.objects.only('id', 'numero_imovel').iterator():
+        imovel.slug = slugify(imovel.numero_imovel)[:255]
+        imoveis.append(imovel)
+    Imovel.objects.bulk_update(imoveis, ['slug'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('imoveis', '0014_imovel_scraped_at'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicates, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-17 02:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('imoveis', '0015_merge_duplicate_imoveis'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='imovel',
+            name='numero_imovel',
+            field=models.CharField(max_length=50, unique=True),
+        ),
+    ]
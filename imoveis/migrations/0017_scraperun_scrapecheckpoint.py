@@ -0,0 +1,41 @@
+# Generated by Django 5.2.18 on 2026-10-17 02:16
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('imoveis', '0016_imovel_numero_imovel_unique'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ScrapeRun',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('started_at', models.DateTimeField(auto_now_add=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('status', models.CharField(choices=[('running', 'Em andamento'), ('finished', 'Concluída'), ('failed', 'Interrompida')], db_index=True, default='running', max_length=20)),
+                ('modalidades', models.JSONField()),
+                ('estados', models.JSONField()),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ScrapeCheckpoint',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tp_venda', models.IntegerField()),
+                ('estado', models.CharField(max_length=2)),
+                ('processed_ids', models.JSONField(default=list)),
+                ('lotes_concluidos', models.IntegerField(default=0)),
+                ('concluido', models.BooleanField(default=False)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('run', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='checkpoints', to='imoveis.scraperun')),
+            ],
+            options={
+                'unique_together': {('run', 'tp_venda', 'estado')},
+            },
+        ),
+    ]
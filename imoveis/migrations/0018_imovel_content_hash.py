@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-17 02:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('imoveis', '0017_scraperun_scrapecheckpoint'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='imovel',
+            name='content_hash',
+            field=models.CharField(blank=True, max_length=64, null=True),
+        ),
+    ]
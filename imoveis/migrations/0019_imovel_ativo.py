@@ -0,0 +1,27 @@
+# Generated by Django 5.2.18 on 2026-10-17 02:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('imoveis', '0018_imovel_content_hash'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='imovel',
+            name='ativo',
+            field=models.BooleanField(db_index=True, default=True),
+        ),
+        migrations.AddField(
+            model_name='imovel',
+            name='desativado_em',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='imovel',
+            index=models.Index(condition=models.Q(('ativo', True)), fields=['longitude', 'latitude'], name='imovel_ativo_coords_idx'),
+        ),
+    ]
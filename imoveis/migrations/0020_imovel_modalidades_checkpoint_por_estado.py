@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-17 02:22
+
+from django.db import migrations, models
+
+
+def apagar_checkpoints(apps, schema_editor):
+    # Os checkpoints por modalidade/estado não servem para retomar execuções
+    # por estado; as execuções antigas recomeçam do zero com --resume
+    apps.get_model('imoveis', 'ScrapeCheckpoint').objects.all().delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('imoveis', '0019_imovel_ativo'),
+    ]
+
+    operations = [
+        migrations.RunPython(apagar_checkpoints, migrations.RunPython.noop),
+        migrations.AlterUniqueTogether(
+            name='scrapecheckpoint',
+            unique_together={('run', 'estado')},
+        ),
+        migrations.AddField(
+            model_name='imovel',
+            name='modalidades',
+            field=models.JSONField(blank=True, null=True),
+        ),
+        migrations.RemoveField(
+            model_name='scrapecheckpoint',
+            name='tp_venda',
+        ),
+    ]
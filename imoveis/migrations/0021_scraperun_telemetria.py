@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-17 02:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('imoveis', '0020_imovel_modalidades_checkpoint_por_estado'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='scraperun',
+            name='telemetria',
+            field=models.JSONField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,47 @@
+# Generated by Django 5.2.18 on 2026-10-17 02:38
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('imoveis', '0021_scraperun_telemetria'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ScrapeWorker',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('nome', models.CharField(max_length=100, unique=True)),
+                ('host', models.CharField(max_length=255)),
+                ('pid', models.IntegerField()),
+                ('started_at', models.DateTimeField(auto_now_add=True)),
+                ('heartbeat_at', models.DateTimeField(db_index=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ScrapeTask',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tipo', models.CharField(choices=[('busca', 'Etapa 1 de um estado'), ('lote', 'Lote de IDs')], max_length=10)),
+                ('estado', models.CharField(max_length=2)),
+                ('modalidades', models.JSONField()),
+                ('ids', models.JSONField(default=dict)),
+                ('status', models.CharField(choices=[('pending', 'Na fila'), ('leased', 'Em execução'), ('done', 'Concluída'), ('failed', 'Falhou')], default='pending', max_length=20)),
+                ('tentativas', models.IntegerField(default=0)),
+                ('worker', models.CharField(blank=True, max_length=100)),
+                ('lease_expires_at', models.DateTimeField(blank=True, null=True)),
+                ('resultado', models.JSONField(blank=True, null=True)),
+                ('erro', models.TextField(blank=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('run', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='tasks', to='imoveis.scraperun')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['status', 'lease_expires_at'], name='imoveis_scr_status_5affc2_idx')],
+            },
+        ),
+    ]
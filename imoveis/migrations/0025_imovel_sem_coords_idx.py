@@ -0,0 +1,17 @@
+# Generated by Django 5.2.18 on 2026-10-17 03:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('imoveis', '0024_geocodecache'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='imovel',
+            index=models.Index(condition=models.Q(('latitude__isnull', True)), fields=['id'], name='imovel_sem_coords_idx'),
+        ),
+    ]
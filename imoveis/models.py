@@ -1,14 +1,17 @@
 ''' Imovel model '''
-import hashlib
-import random
 from django.db import models
+from django.db.models import Q
 from django.conf import settings
+from django.utils.text import slugify
 
 
 class Imovel(models.Model):
-    numero_imovel = models.CharField(max_length=50)
+    # Número do imóvel na Caixa (ex: "1444419-7"): chave natural dos upserts
+    numero_imovel = models.CharField(max_length=50, unique=True)
     title = models.CharField(max_length=255)
     modalidade = models.CharField(max_length=100, null=True)
+    # Todas as modalidades em que o imóvel aparece na busca; `modalidade` é a primeira
+    modalidades = models.JSONField(null=True, blank=True)
     valor_avaliacao = models.FloatField(null=True)
     valor_venda_leilao_1 = models.FloatField(null=True)
     valor_venda_leilao_2 = models.FloatField(null=True)
@@ -51,11 +54,20 @@ class Imovel(models.Model):
     slug = models.SlugField(max_length=255, unique=True)
     latitude = models.FloatField(null=True, blank=True)
     longitude = models.FloatField(null=True, blank=True)
+    # Última vez que a página de detalhe foi baixada pelo scraper
+    scraped_at = models.DateTimeField(null=True, blank=True, db_index=True)
+    # Impressão digital da página de detalhe (parsers.fingerprint_detail)
+    content_hash = models.CharField(max_length=64, null=True, blank=True)
+    # Impressão digital do imóvel no lote de carregaListaImoveis.asp (parsers.fingerprint_listing)
+    list_hash = models.CharField(max_length=64, null=True, blank=True)
+    # False quando o imóvel some da busca da Caixa (Etapa 1) do seu estado
+    ativo = models.BooleanField(default=True, db_index=True)
+    desativado_em = models.DateTimeField(null=True, blank=True)
 
     @staticmethod
-    def create_slug(title, description, amount):
-        slug_base = f"{title}-{description}-{amount}" if title and description and amount else f"imovel-{random.randint(1, 10000)}"
-        return hashlib.md5(slug_base.encode()).hexdigest()[:255]
+    def create_slug(numero_imovel):
+        '''Slug estável: não muda quando o preço ou a descrição mudam.'''
+        return slugify(numero_imovel)[:255]
 
     def get_city(self):
         '''get city from address'''
@@ -65,6 +77,14 @@ class Imovel(models.Model):
     class Meta:
         verbose_name = "Imóvel"
         verbose_name_plural = "Imóveis"
+        indexes = [
+            # Mapa e lista só consultam imóveis ativos
+            models.Index(fields=['longitude', 'latitude'], condition=Q(ativo=True),
+                         name='imovel_ativo_coords_idx'),
+            # geocode_imoveis só busca os imóveis ainda sem coordenadas
+            models.Index(fields=['id'], condition=Q(latitude__isnull=True),
+                         name='imovel_sem_coords_idx'),
+        ]
 
 
 class Favorito(models.Model):
@@ -94,3 +114,108 @@ class BuscaSalva(models.Model):
 
     def __str__(self):
         return f"Busca '{self.nome_da_busca}' de {self.usuario.username}"
+
+
+class ScrapeRun(models.Model):
+    ''' Execução do scrape_caixa; permite retomar uma execução interrompida '''
+    STATUS_CHOICES = [
+        ('running', 'Em andamento'),
+        ('finished', 'Concluída'),
+        ('failed', 'Interrompida'),
+    ]
+    started_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    status = models.CharField(
+        max_length=20, choices=STATUS_CHOICES, default='running', db_index=True)
+    modalidades = models.JSONField()
+    estados = models.JSONField()
+    # Relatório da Telemetry (latências, bytes, status HTTP, resultados), gravado ao final
+    telemetria = models.JSONField(null=True, blank=True)
+
+    def __str__(self):
+        return f"Execução {self.pk} ({self.get_status_display()})"
+
+
+class ScrapeCheckpoint(models.Model):
+    ''' Progresso de uma execução em um estado (todas as modalidades) '''
+    run = models.ForeignKey(
+        ScrapeRun, on_delete=models.CASCADE, related_name='checkpoints')
+    estado = models.CharField(max_length=2)
+    # IDs (normalizados) já gravados no banco nesta execução
+    processed_ids = models.JSONField(default=list)
+    lotes_concluidos = models.IntegerField(default=0)
+    concluido = models.BooleanField(default=False)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ('run', 'estado')
+
+    def __str__(self):
+        return f"{self.estado} da execução {self.run_id}"
+
+
+class ScrapeTask(models.Model):
+    ''' Tarefa da fila distribuída do scraper (ver scraping/workqueue.py) '''
+    TIPO_CHOICES = [
+        ('busca', 'Etapa 1 de um estado'),
+        ('lote', 'Lote de IDs'),
+    ]
+    STATUS_CHOICES = [
+        ('pending', 'Na fila'),
+        ('leased', 'Em execução'),
+        ('done', 'Concluída'),
+        ('failed', 'Falhou'),
+    ]
+    run = models.ForeignKey(
+        ScrapeRun, on_delete=models.CASCADE, related_name='tasks')
+    tipo = models.CharField(max_length=10, choices=TIPO_CHOICES)
+    estado = models.CharField(max_length=2)
+    # hdn_tp_venda buscados na Etapa 1
+    modalidades = models.JSONField()
+    # Tarefas 'lote': ID -> hdn_tp_venda em que ele apareceu na Etapa 1
+    ids = models.JSONField(default=dict)
+    status = models.CharField(
+        max_length=20, choices=STATUS_CHOICES, default='pending')
+    tentativas = models.IntegerField(default=0)
+    worker = models.CharField(max_length=100, blank=True)
+    lease_expires_at = models.DateTimeField(null=True, blank=True)
+    resultado = models.JSONField(null=True, blank=True)
+    erro = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['status', 'lease_expires_at'])]
+
+    def __str__(self):
+        return f"{self.get_tipo_display()} {self.estado} da execução {self.run_id}"
+
+
+class ScrapeWorker(models.Model):
+    ''' Um scrape_worker vivo; o heartbeat divide a taxa total entre os ativos '''
+    nome = models.CharField(max_length=100, unique=True)
+    host = models.CharField(max_length=255)
+    pid = models.IntegerField()
+    started_at = models.DateTimeField(auto_now_add=True)
+    heartbeat_at = models.DateTimeField(db_index=True)
+
+    def __str__(self):
+        return self.nome
+
+
+class GeocodeCache(models.Model):
+    ''' Resultado de um provedor de geocodificação para um endereço (imoveis.geocoding) '''
+    # Saída de formatar_endereco_para_geocode: os imóveis do mesmo prédio têm o mesmo endereço
+    endereco = models.CharField(max_length=500)
+    provider = models.CharField(max_length=20)
+    # Nulos quando o provedor não encontrou o endereço (cache negativo)
+    latitude = models.FloatField(null=True, blank=True)
+    longitude = models.FloatField(null=True, blank=True)
+    confianca = models.FloatField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ('endereco', 'provider')
+
+    def __str__(self):
+        return f"{self.provider}: {self.endereco}"
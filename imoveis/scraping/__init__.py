@@ -0,0 +1,7 @@
+"""
+Motor de scraping dos imóveis da Caixa (venda-imoveis.caixa.gov.br).
+
+Concentra em um só lugar o que antes estava copiado nos comandos
+get_imovel_*: as constantes do site, a extração dos campos das páginas e o
+motor concorrente usado pelo comando `scrape_caixa`.
+"""
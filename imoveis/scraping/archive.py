@@ -0,0 +1,106 @@
+'''
+Arquivo local das respostas HTML baixadas pelo scraper.
+
+Layout em disco:
+
+    <raiz>/objects/ab/abcdef....html.gz    conteúdo (gzip), endereçado pelo sha256
+    <raiz>/AAAA-MM-DD/manifest.ndjson      uma linha JSON por resposta baixada no dia
+
+Cada linha do manifesto traz o tipo da página ('pesquisa', 'lista' ou
+'detalhe'), a chave (numero_imovel, no caso do detalhe), o sha256 do
+conteúdo e o contexto necessário para reconstruir o Imovel sem rede
+(modalidades, estado e dados do lote).
+'''
+import gzip
+import hashlib
+import json
+import threading
+from pathlib import Path
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .constants import nomes_modalidades
+from .parsers import detail_defaults
+
+
+class HtmlArchive:
+    ''' Arquivo de páginas comprimidas com índice diário '''
+
+    def __init__(self, root):
+        self.root = Path(root)
+        self._lock = threading.Lock()
+
+    def object_path(self, digest):
+        return self.root / 'objects' / digest[:2] / f'{digest}.html.gz'
+
+    def manifest_path(self, day):
+        return self.root / day.isoformat() / 'manifest.ndjson'
+
+    def store(self, kind, key, content, fetched_at=None, **context):
+        '''
+        Grava `content` (bytes) e registra a entrada no manifesto do dia.
+        `fetched_at` (padrão: agora) deve ser o scraped_at gravado no Imovel.
+        '''
+        digest = hashlib.sha256(content).hexdigest()
+        now = fetched_at or timezone.now()
+        entry = {'kind': kind, 'key': key, 'sha256': digest,
+                 'fetched_at': now.isoformat(), **context}
+        path = self.object_path(digest)
+        with self._lock:
+            # Conteúdo repetido (páginas que não mudaram) é gravado uma vez só
+            if not path.exists():
+                path.parent.mkdir(parents=True, exist_ok=True)
+                tmp = path.with_suffix('.tmp')
+                tmp.write_bytes(gzip.compress(content, compresslevel=6))
+                tmp.replace(path)
+            manifest = self.manifest_path(now.date())
+            manifest.parent.mkdir(parents=True, exist_ok=True)
+            with manifest.open('a', encoding='utf-8') as f:
+                f.write(json.dumps(entry, ensure_ascii=False) + '\n')
+        return digest
+
+    def load(self, digest):
+        return gzip.decompress(self.object_path(digest).read_bytes())
+
+    def days(self, desde=None, ate=None):
+        '''Dias com manifesto, em ordem cronológica.'''
+        days = sorted(p.parent.name for p in self.root.glob('*/manifest.ndjson'))
+        return [d for d in days
+                if (desde is None or d >= desde.isoformat())
+                and (ate is None or d <= ate.isoformat())]
+
+    def entries(self, kind=None, desde=None, ate=None):
+        '''Entradas dos manifestos, da mais antiga para a mais recente.'''
+        for day in self.days(desde, ate):
+            with (self.root / day / 'manifest.ndjson').open(encoding='utf-8') as f:
+                for line in f:
+                    if not line.strip():
+                        continue
+                    entry = json.loads(line)
+                    if kind is None or entry['kind'] == kind:
+                        yield entry
+
+    def latest(self, kind, desde=None, ate=None):
+        '''Última entrada de cada chave.'''
+        latest = {}
+        for entry in self.entries(kind, desde, ate):
+            latest[entry['key']] = entry
+        return latest
+
+
+def reparse_entry(root, entry, parser=None):
+    '''
+    Reconstrói os defaults de um Imovel a partir de uma entrada 'detalhe' do
+    arquivo. Roda em processos separados no comando reparse_imoveis.
+    '''
+    content = HtmlArchive(root).load(entry['sha256'])
+    # Manifestos anteriores à busca única por estado trazem só 'tp_venda'
+    tp_vendas = entry.get('tp_vendas') or [entry['tp_venda']]
+    defaults = detail_defaults(content, entry['listing'], nomes_modalidades(tp_vendas), parser)
+    if defaults is None:
+        return None
+    defaults['scraped_at'] = parse_datetime(entry['fetched_at'])
+    # Manifestos antigos não trazem o estado
+    if entry.get('estado'):
+        defaults['estado'] = entry['estado']
+    return defaults
@@ -0,0 +1,112 @@
+'''
+Corpus de páginas gravadas da Caixa e medição do custo de parse.
+
+O corpus é um diretório com uma pasta por tipo de página (pesquisa, lista,
+detalhe). Cada página `nome.html` tem ao lado um `nome.json` com o resultado
+esperado do parse, no formato de to_json(). Os testes comparam o parse de
+cada página com esse resultado, campo a campo, e o benchmark_parser usa o
+mesmo corpus para medir velocidade e memória de cada backend.
+'''
+import gc
+import json
+import time
+import tracemalloc
+from collections import namedtuple
+from pathlib import Path
+
+from django.core.serializers.json import DjangoJSONEncoder
+
+from .parsers import extract_ids, parse_detail, parse_list_items
+
+CORPUS_DIR = Path(__file__).resolve().parent.parent / 'tests' / 'fixtures' / 'caixa'
+
+PARSE_FUNCTIONS = {
+    'detalhe': parse_detail,
+    'lista': parse_list_items,
+    'pesquisa': extract_ids,
+}
+
+# `gravado` distingue o esperado null (ex: detalhe sem dadosImovel) de um .json ausente
+Pagina = namedtuple('Pagina', ['tipo', 'path', 'conteudo', 'esperado', 'gravado'])
+
+
+def to_json(value):
+    '''Resultado do parse no formato gravado nos .json (datas em ISO 8601).'''
+    return json.loads(json.dumps(value, cls=DjangoJSONEncoder))
+
+
+def load_corpus(diretorio=CORPUS_DIR, tipos=PARSE_FUNCTIONS):
+    '''Páginas do corpus, em ordem.'''
+    paginas = []
+    for tipo in tipos:
+        for path in sorted(Path(diretorio, tipo).glob('*.html')):
+            esperado_path = path.with_suffix('.json')
+            gravado = esperado_path.exists()
+            esperado = json.loads(esperado_path.read_text(encoding='utf-8')) if gravado else None
+            paginas.append(Pagina(tipo, path, path.read_bytes(), esperado, gravado))
+    return paginas
+
+
+def record_expected(pagina, resultado):
+    '''Grava `resultado` como o esperado de `pagina`.'''
+    pagina.path.with_suffix('.json').write_text(
+        json.dumps(to_json(resultado), ensure_ascii=False, indent=2, sort_keys=True) + '\n',
+        encoding='utf-8')
+
+
+def diff_fields(esperado, obtido):
+    '''
+    Diferenças entre dois resultados já em to_json(): para dicts (detalhe),
+    uma linha por campo; para o resto, uma linha só.
+    '''
+    if isinstance(esperado, dict) and isinstance(obtido, dict):
+        return [f'{campo}: esperado {esperado.get(campo)!r}, obtido {obtido.get(campo)!r}'
+                for campo in sorted(set(esperado) | set(obtido))
+                if esperado.get(campo, ...) != obtido.get(campo, ...)]
+    if esperado != obtido:
+        return [f'esperado {esperado!r}, obtido {obtido!r}']
+    return []
+
+
+def measure(parse, paginas, backend, repeticoes=20):
+    '''
+    Tempo e memória de `parse` sobre `paginas` (bytes) com `backend`.
+
+    O tempo é medido sem tracemalloc, que deixa a alocação bem mais lenta.
+    A memória vem de uma passada à parte sob tracemalloc: o pico alocado
+    durante o parse de cada página e o que continua alocado depois dele (o
+    resultado e o que vazar da árvore). O CPython não conta o total de
+    alocações sem um build de debug, então o pico é o número a acompanhar.
+    '''
+    inicio = time.perf_counter()
+    for _ in range(repeticoes):
+        for pagina in paginas:
+            parse(pagina, backend)
+    decorrido = time.perf_counter() - inicio
+    total = repeticoes * len(paginas)
+
+    picos = []
+    retidos = []
+    gc.collect()
+    tracemalloc.start()
+    try:
+        for pagina in paginas:
+            base = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+            resultado = parse(pagina, backend)
+            pico = tracemalloc.get_traced_memory()[1]
+            # Lixo com ciclos ainda não coletado não conta como retido
+            gc.collect()
+            picos.append(pico - base)
+            retidos.append(tracemalloc.get_traced_memory()[0] - base)
+            del resultado
+    finally:
+        tracemalloc.stop()
+
+    return {
+        'paginas': total,
+        'ms_por_pagina': decorrido / total * 1000 if total else 0.0,
+        'paginas_por_segundo': total / decorrido if decorrido else 0.0,
+        'pico_kib': max(picos, default=0) / 1024,
+        'retido_kib': max(retidos, default=0) / 1024,
+    }
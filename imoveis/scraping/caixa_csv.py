@@ -0,0 +1,233 @@
+'''
+Importação das listas de imóveis em CSV que a Caixa publica por estado
+(/listaweb/Lista_imoveis_<UF>.csv).
+
+O arquivo vem em latin-1, separado por ';', com algumas linhas de título
+antes do cabeçalho:
+
+    N° do imóvel;UF;Cidade;Bairro;Endereço;Preço;Valor de avaliação;Desconto;Descrição;Modalidade de venda;Link de acesso
+
+Cada linha traz o essencial do imóvel sem nenhuma requisição por imóvel. A
+importação atualiza preço e avaliação dos imóveis já conhecidos, preenche os
+campos que ainda estão vazios e cria os novos; o scraper HTML depois
+completa o resto (fotos, leilões, edital, matrícula).
+
+Os imóveis criados aqui têm numero_imovel só com dígitos, sem zeros à
+esquerda (parsers.normalize_id). Quando o scraper grava o mesmo imóvel com o
+número no formato da página, o BulkImovelWriter adota a linha existente.
+'''
+import csv
+import io
+import re
+import unicodedata
+from collections import Counter
+
+from django.db import transaction
+from django.db.models import F, Value
+from django.db.models.functions import Coalesce
+
+from imoveis.models import Imovel
+from .fields import parse_numero
+from .parsers import normalize_id
+
+CSV_ENCODING = 'latin-1'
+CSV_PATH = '/listaweb/Lista_imoveis_{uf}.csv'
+
+# Cabeçalho normalizado (sem acentos, minúsculo) -> chave usada aqui
+COLUNAS = {
+    'n do imovel': 'numero',
+    'uf': 'uf',
+    'cidade': 'cidade',
+    'bairro': 'bairro',
+    'endereco': 'endereco',
+    'preco': 'preco',
+    'valor de avaliacao': 'avaliacao',
+    'desconto': 'desconto',
+    'descricao': 'descricao',
+    'modalidade de venda': 'modalidade',
+    'link de acesso': 'link',
+}
+OBRIGATORIAS = {'numero', 'uf', 'preco', 'modalidade'}
+
+# Modalidade do CSV (normalizada) -> nome gravado em Imovel.modalidade (ver constants.MODALIDADES)
+MODALIDADES_CSV = {
+    'concorrencia publica': 'Leilão SFI - Edital Único',
+    '1o leilao sfi': 'Leilão SFI - Edital Único',
+    '2o leilao sfi': 'Leilão SFI - Edital Único',
+    'leilao sfi - edital unico': 'Leilão SFI - Edital Único',
+    'licitacao aberta': 'Licitação Aberta',
+    'venda direta online': 'Venda Direta',
+}
+
+_AREA = {
+    'area_total': re.compile(r'([\d.,]+) de área total', re.I),
+    'area_privativa': re.compile(r'([\d.,]+) de área privativa', re.I),
+    'area_terreno': re.compile(r'([\d.,]+) de área do terreno', re.I),
+}
+_QUARTOS = re.compile(r'(\d+) qto', re.I)
+_GARAGEM = re.compile(r'(\d+) vaga', re.I)
+
+# Campos que a importação só preenche quando estão vazios no banco
+CAMPOS_VAZIOS = ('title', 'address', 'description', 'tipo_imovel', 'quartos', 'garagem',
+                 'area_total', 'area_privativa', 'area_terreno', 'source_url')
+# Campos que o CSV sempre atualiza
+CAMPOS_CSV = ('amount', 'valor_avaliacao', 'estado')
+
+
+class CsvInvalido(ValueError):
+    ''' O arquivo não tem o cabeçalho esperado '''
+
+
+def _chave(texto):
+    sem_acento = unicodedata.normalize('NFKD', texto).encode('ascii', 'ignore').decode()
+    return ' '.join(sem_acento.lower().replace('°', '').replace('º', 'o').split())
+
+
+def _numero_coluna(texto):
+    # "N° do imóvel" / "Nº do imóvel": o símbolo some na normalização
+    chave = _chave(texto)
+    return 'n do imovel' if chave in ('n do imovel', 'no do imovel') else chave
+
+
+def read_rows(stream):
+    '''
+    Linhas do CSV como dicts com as chaves de COLUNAS, a partir de um stream
+    de texto. As linhas antes do cabeçalho são ignoradas.
+    '''
+    reader = csv.reader(stream, delimiter=';')
+    colunas = None
+    for campos in reader:
+        if colunas is None:
+            nomes = [COLUNAS.get(_numero_coluna(campo)) for campo in campos]
+            if OBRIGATORIAS.issubset(nomes):
+                colunas = nomes
+            continue
+        if not any(campo.strip() for campo in campos):
+            continue
+        yield {nome: valor.strip() for nome, valor in zip(colunas, campos) if nome}
+    if colunas is None:
+        raise CsvInvalido('Cabeçalho da lista de imóveis não encontrado.')
+
+
+def _area(regex, texto):
+    match = regex.search(texto)
+    valor = parse_numero(match.group(1)) if match else None
+    return valor or None
+
+
+def _inteiro(regex, texto):
+    match = regex.search(texto)
+    return int(match.group(1)) if match else None
+
+
+def row_defaults(row):
+    '''
+    Campos do Imovel a partir de uma linha do CSV, ou None quando a linha não
+    tem número ou a modalidade não é uma das buscadas pelo scraper.
+    '''
+    numero = normalize_id(row.get('numero'))
+    modalidade = MODALIDADES_CSV.get(_chave(row.get('modalidade', '')))
+    if not numero or modalidade is None:
+        return None
+    descricao = row.get('descricao', '')
+    tipo = descricao.split(',', 1)[0].strip() or None
+    cidade, bairro, uf = row.get('cidade', ''), row.get('bairro', ''), row.get('uf', '').upper()
+    endereco = ', '.join(parte for parte in (row.get('endereco'), bairro) if parte)
+    defaults = {
+        'numero_imovel': numero,
+        'estado': uf or None,
+        'modalidade': modalidade,
+        'amount': parse_numero(row.get('preco')),
+        'valor_avaliacao': parse_numero(row.get('avaliacao')),
+        'title': ' - '.join(parte for parte in (tipo, bairro, cidade) if parte) or numero,
+        'address': f'{endereco}, {cidade} - {uf}' if endereco and cidade else None,
+        'description': descricao or None,
+        'tipo_imovel': tipo,
+        'quartos': _inteiro(_QUARTOS, descricao),
+        'garagem': _inteiro(_GARAGEM, descricao),
+        'source_url': row.get('link') or None,
+        **{campo: _area(regex, descricao) for campo, regex in _AREA.items()},
+    }
+    return defaults
+
+
+class CsvImporter:
+    '''
+    Aplica as linhas do CSV ao banco em lotes de `batch_size`: bulk_create
+    para os imóveis novos e bulk_update para os conhecidos, que são
+    encontrados pelo número normalizado (numero_imovel ou hdn_imovel_id).
+    `counts` acumula created, updated, ignored (modalidade não buscada ou
+    linha sem número) e repeated (mesmo imóvel em mais de uma linha).
+    '''
+
+    def __init__(self, batch_size=2000):
+        self.batch_size = batch_size
+        self.counts = Counter()
+        self.conhecidos = None
+        self.vistos = set()
+        self.pendentes = []
+
+    def load_known(self):
+        '''Número normalizado -> pk de todos os imóveis do banco.'''
+        self.conhecidos = {}
+        rows = Imovel.objects.values_list('pk', 'numero_imovel', 'hdn_imovel_id')
+        for pk, numero_imovel, hdn_imovel_id in rows.iterator():
+            self.conhecidos[normalize_id(numero_imovel)] = pk
+            if hdn_imovel_id:
+                self.conhecidos.setdefault(normalize_id(hdn_imovel_id), pk)
+
+    def import_stream(self, stream):
+        if self.conhecidos is None:
+            self.load_known()
+        for row in read_rows(stream):
+            defaults = row_defaults(row)
+            if defaults is None:
+                self.counts['ignored'] += 1
+                continue
+            if defaults['numero_imovel'] in self.vistos:
+                # Imóvel em mais de uma modalidade: o CSV repete a linha
+                self.counts['repeated'] += 1
+                continue
+            self.vistos.add(defaults['numero_imovel'])
+            self.pendentes.append(defaults)
+            if len(self.pendentes) >= self.batch_size:
+                self.flush()
+        self.flush()
+
+    def import_file(self, path, encoding=CSV_ENCODING):
+        with open(path, encoding=encoding, newline='') as f:
+            self.import_stream(f)
+
+    def import_bytes(self, raw, encoding=CSV_ENCODING):
+        '''Importa de um stream binário (ex: resposta HTTP), sem carregar tudo na memória.'''
+        self.import_stream(io.TextIOWrapper(raw, encoding=encoding, newline=''))
+
+    def flush(self):
+        if not self.pendentes:
+            return
+        pendentes, self.pendentes = self.pendentes, []
+        novos, existentes = [], []
+        for defaults in pendentes:
+            pk = self.conhecidos.get(defaults['numero_imovel'])
+            if pk is None:
+                novos.append(Imovel(
+                    **defaults, modalidades=[defaults['modalidade']],
+                    slug=Imovel.create_slug(defaults['numero_imovel'])))
+                continue
+            imovel = Imovel(pk=pk, ativo=True, desativado_em=None)
+            for campo in CAMPOS_CSV:
+                valor = defaults[campo]
+                setattr(imovel, campo, F(campo) if valor is None else valor)
+            for campo in CAMPOS_VAZIOS:
+                valor = defaults[campo]
+                setattr(imovel, campo, F(campo) if valor is None else Coalesce(
+                    F(campo), Value(valor, output_field=Imovel._meta.get_field(campo))))
+            existentes.append(imovel)
+
+        with transaction.atomic():
+            Imovel.objects.bulk_create(novos)
+            if existentes:
+                Imovel.objects.bulk_update(
+                    existentes, ['ativo', 'desativado_em', *CAMPOS_CSV, *CAMPOS_VAZIOS])
+        self.counts['created'] += len(novos)
+        self.counts['updated'] += len(existentes)
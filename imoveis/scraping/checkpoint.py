@@ -0,0 +1,32 @@
+''' Persistência do progresso do scrape_caixa (ScrapeRun / ScrapeCheckpoint) '''
+from django.utils import timezone
+
+from imoveis.models import ScrapeCheckpoint, ScrapeRun
+
+
+def start_run(modalidades, estados):
+    return ScrapeRun.objects.create(modalidades=modalidades, estados=estados)
+
+
+def last_unfinished_run():
+    '''Execução mais recente que não chegou ao fim, ou None.'''
+    # As execuções da fila (com ScrapeTask) são retomadas pelos workers
+    runs = ScrapeRun.objects.exclude(status='finished').filter(tasks__isnull=True)
+    return runs.order_by('-started_at').first()
+
+
+def finish_run(run, status='finished', telemetria=None):
+    run.status = status
+    run.finished_at = timezone.now()
+    run.telemetria = telemetria
+    run.save(update_fields=['status', 'finished_at', 'telemetria'])
+
+
+def get_checkpoint(run, estado):
+    checkpoint, _ = ScrapeCheckpoint.objects.get_or_create(run=run, estado=estado)
+    return checkpoint
+
+
+def finish_checkpoint(checkpoint):
+    checkpoint.concluido = True
+    checkpoint.save(update_fields=['concluido', 'lotes_concluidos', 'updated_at'])
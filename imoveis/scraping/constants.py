@@ -0,0 +1,40 @@
+''' Constantes do site da Caixa usadas pelo scraper '''
+
+BASE_URL = "https://venda-imoveis.caixa.gov.br"
+SEARCH_PATH = "/sistema/carregaPesquisaImoveis.asp"
+LIST_PATH = "/sistema/carregaListaImoveis.asp"
+DETAIL_PATH = "/sistema/detalhe-imovel.asp"
+SEARCH_URL = f"{BASE_URL}{SEARCH_PATH}"
+LIST_URL = f"{BASE_URL}{LIST_PATH}"
+DETAIL_URL = f"{BASE_URL}{DETAIL_PATH}"
+
+# As páginas são servidas em UTF-8, mas o Content-Type não informa o charset
+CAIXA_ENCODING = 'utf-8'
+
+USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/125.0.0.0 Safari/537.36'
+
+ESTADOS_BRASIL = ['AC', 'AL', 'AP', 'AM', 'BA', 'CE', 'DF', 'ES', 'GO', 'MA', 'MT', 'MS',
+                  'MG', 'PA', 'PB', 'PR', 'PE', 'PI', 'RJ', 'RN', 'RS', 'RO', 'RR', 'SC', 'SP', 'SE', 'TO']
+
+# Valores de `hdn_tp_venda` aceitos pelo formulário de busca da Caixa:
+# <option value='4'  >1º Leilão SFI </option><option value='5'  >2º Leilão SFI </option><option value='2'  >Concorrência Pública</option><option value='14'  >Leilão SFI - Edital Único</option><option value='21'  >Licitação Aberta</option><option value='9'  >Venda Direta FAR</option><option value='34'  >Venda Direta Online</option><option value='33'  >Venda Online </option><option value='30'  >Exercício de Direito de Preferência</option>
+#
+# O valor gravado em `Imovel.modalidade` é o mesmo que os antigos comandos
+# get_imovel_* gravavam, para não quebrar os filtros do mapa.
+MODALIDADES = {
+    2: 'Leilão SFI - Edital Único',
+    4: 'Leilão SFI - Edital Único',
+    5: 'Leilão SFI - Edital Único',
+    14: 'Leilão SFI - Edital Único',
+    21: 'Licitação Aberta',
+    34: 'Venda Direta',
+}
+
+
+def nomes_modalidades(tp_vendas):
+    '''Nomes gravados para uma lista de hdn_tp_venda, sem repetição e na mesma ordem.'''
+    return list(dict.fromkeys(MODALIDADES[tp] for tp in tp_vendas))
+
+
+# Quantidade de IDs enviados por requisição a carregaListaImoveis.asp
+LIST_CHUNK_SIZE = 10
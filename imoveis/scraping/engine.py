@@ -0,0 +1,696 @@
+''' Motor concorrente de scraping da Caixa '''
+import asyncio
+import time
+from collections import Counter, deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import timedelta
+from functools import partial
+
+import django
+import requests
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.utils import timezone
+
+from imoveis.models import Imovel
+from .constants import (BASE_URL, DETAIL_PATH, LIST_CHUNK_SIZE, LIST_PATH,
+                        MODALIDADES, SEARCH_PATH, nomes_modalidades)
+from .parsers import (detail_defaults, extract_ids, fingerprint_detail,
+                      fingerprint_listing, imovel_id_numeric, normalize_id,
+                      parse_list_items)
+from .checkpoint import finish_checkpoint, finish_run, get_checkpoint
+from .http import build_session, is_retryable, make_request, retry_after, status_label
+from .pipeline import Pipeline, Stage, Tracker
+from .ratelimit import AdaptiveChunkSize, HostRateLimiters
+from .telemetry import Telemetry
+from .staging import StagingWriter
+from .workqueue import TarefaIncompleta
+from .writer import BulkImovelWriter
+
+# Caminho -> tipo de página, para a telemetria
+ENDPOINTS = {SEARCH_PATH: 'pesquisa', LIST_PATH: 'lista', DETAIL_PATH: 'detalhe'}
+
+
+def load_fresh_ids(ttl):
+    '''
+    IDs (normalizados) dos imóveis cuja página de detalhe foi baixada há
+    menos de `ttl`. Esses imóveis são pulados no modo incremental.
+    '''
+    cutoff = timezone.now() - ttl
+    fresh = set()
+    rows = Imovel.objects.filter(scraped_at__gte=cutoff).values_list(
+        'numero_imovel', 'hdn_imovel_id')
+    for numero_imovel, hdn_imovel_id in rows.iterator():
+        fresh.add(normalize_id(numero_imovel))
+        if hdn_imovel_id:
+            fresh.add(normalize_id(hdn_imovel_id))
+    fresh.discard('')
+    return fresh
+
+
+def load_fingerprints():
+    '''numero_imovel -> content_hash de todos os imóveis que já têm um.'''
+    rows = Imovel.objects.exclude(content_hash=None).values_list(
+        'numero_imovel', 'content_hash')
+    return dict(rows.iterator())
+
+
+def load_list_hashes():
+    '''numero_imovel -> list_hash de todos os imóveis que já têm um.'''
+    rows = Imovel.objects.exclude(list_hash=None).values_list(
+        'numero_imovel', 'list_hash')
+    return dict(rows.iterator())
+
+
+class OrcamentoEsgotado(Exception):
+    ''' O orçamento de requisições do refresh acabou '''
+
+
+class EstadoJob:
+    '''Estado de um estado (todas as modalidades) durante a execução.'''
+
+    def __init__(self, estado, checkpoint=None, label=None):
+        self.estado = estado
+        self.label = label or estado
+        self.checkpoint = checkpoint
+        # ID normalizado -> hdn_tp_venda em que ele apareceu na Etapa 1
+        self.tp_vendas = {}
+        self.counts = Counter()
+        self.pending = deque()
+        self.requeued = set()
+        # Imóveis do estado que ainda estão no pipeline de detalhe
+        self.tracker = Tracker()
+
+
+class DetalheItem:
+    '''Um imóvel passando pelos estágios do pipeline de detalhe.'''
+    __slots__ = ('job', 'listing', 'tp_vendas', 'modalidades', 'content',
+                 'fingerprint', 'list_hash', 'defaults', 'fetched_at')
+
+    def __init__(self, job, listing, tp_vendas):
+        self.job = job
+        self.listing = listing
+        self.tp_vendas = tp_vendas
+        self.modalidades = nomes_modalidades(tp_vendas)
+        self.content = None
+        self.fingerprint = None
+        # Só para imóveis vindos de um lote da Caixa (no refresh o listing vem do banco)
+        self.list_hash = None
+        self.defaults = None
+        # Momento do download do detalhe: vira o scraped_at e o fetched_at do arquivo
+        self.fetched_at = None
+
+    @property
+    def numero_imovel(self):
+        return self.listing['numero_imovel']
+
+
+class CaixaScraper:
+    '''
+    Executa a busca de IDs (Etapa 1), os lotes de carregaListaImoveis.asp e
+    as páginas detalhe-imovel.asp de vários estados ao mesmo tempo.
+    `concurrency` limita o número de requisições em andamento.
+
+    Em cada estado, a Etapa 1 de todas as modalidades é juntada em um único
+    conjunto de IDs: um imóvel listado em mais de uma modalidade tem a lista
+    e o detalhe baixados uma vez só, e grava todas as modalidades.
+
+    Com `incremental=True` só são baixados os imóveis novos ou cujo
+    `scraped_at` é mais antigo que `ttl` (um timedelta).
+
+    Além do limite de concorrência, cada host tem um AdaptiveRateLimiter que
+    parte de `rate` req/s e se ajusta até `max_rate` conforme as respostas.
+
+    Com um ScrapeRun em `run`, o progresso de cada estado é
+    gravado junto com os imóveis; rodar de novo com o mesmo `run` continua
+    de onde parou.
+
+    Páginas de detalhe com a mesma impressão digital da última vez, de
+    imóveis cujo preço, descrição e foto no lote também não mudaram, não são
+    analisadas nem regravadas (contam como 'unchanged'); `force=True`
+    desliga essa verificação.
+
+    Com `sweep=True` (varredura), a própria página de detalhe só é baixada
+    para imóveis novos ou cujo lote mudou; os demais contam como 'swept'.
+    Uma varredura diária custa a Etapa 1 mais um lote a cada 10 imóveis.
+
+    Os imóveis de um estado que não aparecem mais na Etapa 1 são desativados,
+    desde que todas as suas modalidades tenham sido buscadas sem erro.
+
+    refresh() atualiza só as páginas de detalhe de imóveis já conhecidos, em
+    ordem de prioridade (ver scheduler.py), até gastar o orçamento de
+    requisições.
+
+    As páginas de detalhe passam por um Pipeline de quatro estágios (fetch,
+    parse, normalize e write) ligados por filas de até `queue_size` itens;
+    o fetch usa `concurrency` workers e o parse roda em `parse_workers`
+    threads, fora do event loop, ou em processos com `parse_processes=True`
+    (o parse é CPU-bound e, em threads, disputa o GIL). Os contadores de cada estágio ficam em
+    `pipeline_stats` ao final.
+
+    work() roda o motor como um worker da fila distribuída de workqueue.py:
+    as tarefas de busca e de lote vêm do banco e podem ser divididas entre
+    vários processos ou máquinas.
+
+    Com `staging` (um diretório), os imóveis vão para um arquivo NDJSON
+    (gzip com `staging_gzip=True`) em vez do banco; o load_imoveis faz a
+    carga depois (ver staging.py). As desativações também ficam para a carga.
+
+    `base_url` troca o site da Caixa por outro servidor com os mesmos
+    endpoints (ex: o simular_caixa); o padrão vem de settings.SCRAPER_BASE_URL.
+
+    Latências, bytes, status HTTP, campos não extraídos e resultados por
+    estado e modalidade vão para `telemetry`; report() monta o relatório,
+    que é gravado no ScrapeRun ao final.
+    '''
+    max_attempts = 4
+    backoff_base = 1.0
+    backoff_max = 30.0
+
+    def __init__(self, modalidades, estados, concurrency=8, incremental=False,
+                 ttl=timedelta(hours=24), batch_size=200, parser=None, archive=None,
+                 rate=2.0, max_rate=20.0, run=None, force=False, parse_workers=2,
+                 parse_processes=False, queue_size=100, base_url=None, sweep=False,
+                 staging=None, staging_gzip=False, stdout=None, style=None):
+        self.modalidades = modalidades
+        self.estados = estados
+        self.concurrency = concurrency
+        self.incremental = incremental
+        self.ttl = ttl
+        self.parser = parser
+        self.archive = archive
+        self.scrape_run = run
+        self.force = force
+        self.sweep = sweep
+        self.parse_workers = parse_workers
+        self.parse_processes = parse_processes
+        self.queue_size = queue_size
+        base_url = (base_url or getattr(settings, 'SCRAPER_BASE_URL', '') or BASE_URL).rstrip('/')
+        self.search_url = f'{base_url}{SEARCH_PATH}'
+        self.list_url = f'{base_url}{LIST_PATH}'
+        self.detail_url = f'{base_url}{DETAIL_PATH}'
+        self.endpoints = {f'{base_url}{path}': tipo for path, tipo in ENDPOINTS.items()}
+        self.orcamento = None
+        self.fresh_ids = set()
+        self.fingerprints = {}
+        self.list_hashes = {}
+        # (tp_venda, estado) -> IDs normalizados devolvidos pela Etapa 1
+        self.etapa1 = {}
+        # Estados que terminaram com erros: a execução fica 'failed' para o --resume
+        self.pendentes = []
+        self.stdout = stdout
+        self.style = style
+        self.session = build_session(concurrency)
+        self.semaphore = None
+        self.executor = None
+        self.parse_executor = None
+        self.pipeline = None
+        self.pipeline_stats = {}
+        self.limiters = HostRateLimiters(rate=rate, max_rate=max(rate, max_rate))
+        self.chunk_size = AdaptiveChunkSize(size=LIST_CHUNK_SIZE)
+        self.stats = Counter()
+        self.telemetry = Telemetry()
+        if staging:
+            self.writer = StagingWriter(staging, batch_size=batch_size, comprimir=staging_gzip,
+                                        telemetry=self.telemetry)
+        else:
+            self.writer = BulkImovelWriter(batch_size=batch_size, telemetry=self.telemetry)
+        self._write = sync_to_async(self.writer.add, thread_sensitive=True)
+        self._touch = sync_to_async(self.writer.touch, thread_sensitive=True)
+        self._flush = sync_to_async(self.writer.flush, thread_sensitive=True)
+
+    def log(self, message, style_name=None):
+        if self.stdout is None:
+            return
+        if style_name and self.style:
+            message = getattr(self.style, style_name)(message)
+        self.stdout.write(message)
+
+    async def request(self, url, **kwargs):
+        '''
+        Faz a requisição respeitando o rate limiter do host. Falhas transitórias
+        são repetidas com backoff exponencial sem bloquear as demais tarefas.
+        '''
+        limiter = self.limiters.for_url(url)
+        tipo = self.endpoints.get(url, url)
+        loop = asyncio.get_running_loop()
+        for attempt in range(1, self.max_attempts + 1):
+            await limiter.acquire()
+            # Verificação e reserva sem await no meio: as tarefas concorrentes
+            # (e as novas tentativas) não passam juntas do orçamento
+            if self.orcamento is not None and self.stats['requests'] >= self.orcamento:
+                raise OrcamentoEsgotado(f'Orçamento de {self.orcamento} requisições esgotado.')
+            self.stats['requests'] += 1
+            async with self.semaphore:
+                inicio = time.monotonic()
+                try:
+                    response = await loop.run_in_executor(
+                        self.executor, partial(make_request, self.session, url, verify=False, **kwargs))
+                except requests.exceptions.RequestException as e:
+                    self.telemetry.record(f'http.{tipo}', time.monotonic() - inicio)
+                    self.telemetry.record_response(tipo, status_label(e))
+                    if not is_retryable(e):
+                        raise
+                    limiter.record_failure(retry_after(e))
+                    if attempt == self.max_attempts:
+                        raise
+                else:
+                    duracao = time.monotonic() - inicio
+                    limiter.record_success(duracao)
+                    self.telemetry.record(f'http.{tipo}', duracao)
+                    self.telemetry.record_response(tipo, response.status_code, len(response.content))
+                    return response
+            self.stats['retries'] += 1
+            self.telemetry.retries[tipo] += 1
+            await asyncio.sleep(min(self.backoff_max, self.backoff_base * 2 ** (attempt - 1)))
+
+    async def archive_page(self, kind, key, content, **context):
+        '''Guarda a resposta no HtmlArchive, quando configurado.'''
+        if self.archive is not None:
+            await asyncio.to_thread(self.archive.store, kind, key, content, **context)
+
+    def run(self):
+        '''Ponto de entrada síncrono; retorna o Counter com os totais.'''
+        return self._execute(self._run())
+
+    def refresh(self, fila, orcamento):
+        '''
+        Baixa de novo o detalhe de cada Atualizacao de `fila`, na ordem dada,
+        parando quando `orcamento` requisições (incluindo novas tentativas)
+        tiverem sido feitas. Retorna o Counter com os totais.
+        '''
+        return self._execute(self._refresh(fila, orcamento))
+
+    def work(self, worker):
+        '''
+        Consome a fila de tarefas com um QueueWorker (ver workqueue.py) até
+        ela esvaziar, ou indefinidamente com worker.continuo. Retorna o
+        Counter com os totais deste worker.
+        '''
+        return self._execute(self._work(worker))
+
+    def report(self):
+        '''Relatório da execução (ver telemetry.py), serializável em JSON.'''
+        return self.telemetry.as_dict(totais=dict(self.stats), pipeline=self.pipeline_stats)
+
+    def _execute(self, coro):
+        try:
+            try:
+                asyncio.run(coro)
+            finally:
+                if isinstance(self.writer, StagingWriter):
+                    self.writer.close()
+        except BaseException:
+            if self.scrape_run is not None:
+                finish_run(self.scrape_run, 'failed', self.report())
+            raise
+        if self.scrape_run is not None:
+            finish_run(self.scrape_run, 'failed' if self.pendentes else 'finished', self.report())
+        return self.stats
+
+    async def _prepare(self):
+        self.semaphore = asyncio.Semaphore(self.concurrency)
+        if not self.force:
+            self.fingerprints = await sync_to_async(load_fingerprints, thread_sensitive=True)()
+            self.list_hashes = await sync_to_async(load_list_hashes, thread_sensitive=True)()
+
+    def build_pipeline(self):
+        return Pipeline([
+            Stage('fetch', self.fetch_detail, workers=self.concurrency, maxsize=self.queue_size),
+            Stage('parse', self.parse_page, workers=self.parse_workers, maxsize=self.queue_size),
+            Stage('normalize', self.normalize, maxsize=self.queue_size),
+            # O BulkImovelWriter não é thread-safe: um único worker de escrita
+            Stage('write', self.write, maxsize=self.queue_size),
+        ], on_error=self.stage_error)
+
+    def build_parse_executor(self):
+        if self.parse_processes:
+            # Os processos precisam das settings (parser padrão, fuso horário)
+            return ProcessPoolExecutor(max_workers=self.parse_workers, initializer=django.setup)
+        return ThreadPoolExecutor(max_workers=self.parse_workers)
+
+    async def _with_pipeline(self, coro):
+        '''Executa `coro` com os pools de execução e o pipeline de detalhe ativos.'''
+        # requests é bloqueante: cada requisição roda em uma thread do pool
+        with ThreadPoolExecutor(max_workers=self.concurrency) as self.executor, \
+                self.build_parse_executor() as self.parse_executor:
+            self.pipeline = self.build_pipeline()
+            self.pipeline.start()
+            try:
+                await coro
+            finally:
+                await self.pipeline.close()
+                self.pipeline_stats = self.pipeline.summary()
+
+    async def _run(self):
+        await self._prepare()
+        if self.incremental:
+            self.fresh_ids = await sync_to_async(load_fresh_ids, thread_sensitive=True)(self.ttl)
+            self.log(
+                f'Modo incremental: {len(self.fresh_ids)} IDs baixados nas últimas '
+                f'{self.ttl.total_seconds() / 3600:g} horas serão ignorados.')
+        await self._with_pipeline(
+            asyncio.gather(*(self.scrape_estado(estado) for estado in self.estados)))
+        await self._flush()
+        await sync_to_async(self.deactivate_delisted, thread_sensitive=True)()
+
+    def deactivate_delisted(self, estados=None):
+        '''Desativa os imóveis que sumiram da Etapa 1 nesta execução.'''
+        for estado in estados or self.estados:
+            buscadas = {tp for tp in MODALIDADES if (tp, estado) in self.etapa1}
+            # Vários hdn_tp_venda gravam o mesmo nome: o nome só conta como
+            # coberto quando todos eles foram buscados
+            cobertas = {nome for nome in set(MODALIDADES.values())
+                        if all(tp in buscadas for tp, n in MODALIDADES.items() if n == nome)}
+            ids = set().union(*(self.etapa1[(tp, estado)] for tp in buscadas))
+            # Uma busca vazia é mais provavelmente falha da Caixa que um
+            # estado sem nenhum imóvel: nada é desativado
+            if not cobertas or not ids:
+                continue
+            if desativados := self.writer.deactivate(estado, ids, cobertas):
+                self.stats['deactivated'] += desativados
+                self.log(f'{estado}: {desativados} imóveis desativados.', 'WARNING')
+
+    async def _refresh(self, fila, orcamento):
+        await self._prepare()
+        job = EstadoJob(None, label='atualização por prioridade')
+        # O fetch descarta o que sobrar quando o orçamento acabar
+        self.orcamento = orcamento
+
+        async def submit_all():
+            # A fila do fetch é FIFO: os mais urgentes são baixados primeiro
+            for item in fila:
+                await self.pipeline.submit(DetalheItem(job, item.listing, item.tp_vendas), job.tracker)
+
+        await self._with_pipeline(submit_all())
+        await self._flush()
+        self.stats.update(job.counts)
+
+    async def _work(self, worker):
+        await self._prepare()
+        await sync_to_async(worker.register, thread_sensitive=True)()
+        # asyncio.Task -> ScrapeTask em execução neste worker
+        running = {}
+        heartbeat = asyncio.create_task(self.heartbeat(worker, running))
+        try:
+            await self._with_pipeline(self.consume(worker, running))
+        finally:
+            heartbeat.cancel()
+            await asyncio.gather(heartbeat, return_exceptions=True)
+            await sync_to_async(worker.unregister, thread_sensitive=True)()
+
+    async def consume(self, worker, running):
+        '''Pega tarefas da fila, até worker.slots ao mesmo tempo.'''
+        claim = sync_to_async(worker.claim, thread_sensitive=True)
+        idle = sync_to_async(worker.idle, thread_sensitive=True)
+        while True:
+            while len(running) < worker.slots and (task := await claim()) is not None:
+                running[asyncio.create_task(self.run_task(worker, task))] = task
+            if running:
+                done, _ = await asyncio.wait(
+                    running, timeout=worker.espera, return_when=asyncio.FIRST_COMPLETED)
+                for finished in done:
+                    del running[finished]
+                    finished.result()
+            elif worker.continuo or not await idle():
+                # Buscas em outros workers ainda podem gerar lotes
+                await asyncio.sleep(worker.espera)
+            else:
+                return
+
+    async def heartbeat(self, worker, running):
+        '''Renova os leases e divide worker.taxa_total entre os workers ativos.'''
+        while True:
+            try:
+                ativos = await sync_to_async(worker.heartbeat, thread_sensitive=True)(
+                    [task.pk for task in running.values()])
+            except Exception as e:
+                # Banco ocupado ou conexão perdida: sem renovar, os leases vencem
+                # e outro worker refaz as tarefas. Tenta de novo no próximo ciclo.
+                self.log(f'Erro ao renovar os leases do worker {worker.nome}: {e}', 'ERROR')
+            else:
+                if worker.taxa_total:
+                    self.limiters.set_max_rate(worker.taxa_total / ativos)
+            await asyncio.sleep(worker.heartbeat_interval)
+
+    async def run_task(self, worker, task):
+        '''Executa uma ScrapeTask e registra o resultado na fila.'''
+        job = EstadoJob(task.estado, label=f'{task.estado} (tarefa {task.pk})')
+        lotes = None
+        try:
+            if task.tipo == 'busca':
+                lotes = await self.run_busca(worker, task, job)
+            else:
+                job.tp_vendas = {normalize_id(i): tp_vendas for i, tp_vendas in task.ids.items()}
+                await self.scrape_ids(job, list(task.ids))
+                if job.counts['errors']:
+                    # Lote ou detalhes que falharam: a tarefa volta para a fila inteira
+                    raise TarefaIncompleta(f'{job.counts["errors"]} lote(s) ou imóvel(is) com erro.')
+        except Exception as e:
+            status = await sync_to_async(worker.fail, thread_sensitive=True)(task, str(e) or repr(e))
+            destino = 'marcada como falha' if status == 'failed' else 'devolvida à fila'
+            self.log(f'Tarefa {task.pk} ({task.tipo} {task.estado}) {destino}: {e}', 'ERROR')
+        else:
+            if not await sync_to_async(worker.complete, thread_sensitive=True)(task, dict(job.counts), lotes):
+                self.log(f'Tarefa {task.pk}: lease perdido; o resultado ficou com outro worker.', 'WARNING')
+        self.stats.update(job.counts)
+
+    async def run_busca(self, worker, task, job):
+        '''
+        Etapa 1 de uma tarefa 'busca'. Retorna {id: hdn_tp_venda} dos IDs
+        encontrados, que viram tarefas 'lote'.
+        '''
+        estado = task.estado
+        for tp_venda in MODALIDADES:
+            self.etapa1.pop((tp_venda, estado), None)
+        all_ids = await self.search_estado(job, task.modalidades)
+        faltando = [tp for tp in task.modalidades if (tp, estado) not in self.etapa1]
+        # Na última tentativa, segue com as modalidades que responderam
+        if faltando and (task.tentativas < worker.max_tentativas or len(faltando) == len(task.modalidades)):
+            raise TarefaIncompleta(f'Etapa 1 falhou para as modalidades {faltando}.')
+        await sync_to_async(self.deactivate_delisted, thread_sensitive=True)([estado])
+        return {imovel_id: job.tp_vendas[normalize_id(imovel_id)] for imovel_id in all_ids}
+
+    async def scrape_estado(self, estado):
+        checkpoint = None
+        if self.scrape_run is not None:
+            checkpoint = await sync_to_async(get_checkpoint, thread_sensitive=True)(
+                self.scrape_run, estado)
+        job = EstadoJob(estado, checkpoint)
+        if checkpoint is not None and checkpoint.concluido:
+            self.log(f'{job.label} já concluído nesta execução; pulando.')
+            return
+
+        all_ids = await self.search_estado(job, self.modalidades)
+        faltando = [tp for tp in self.modalidades if (tp, estado) not in self.etapa1]
+        if not all_ids:
+            if faltando:
+                self.pendentes.append(estado)
+            return
+
+        if checkpoint is not None and checkpoint.processed_ids:
+            processed = set(checkpoint.processed_ids)
+            pending = [i for i in all_ids if normalize_id(i) not in processed]
+            job.counts['resumed'] = len(all_ids) - len(pending)
+            all_ids = pending
+            self.log(
+                f'{job.label}: retomando do checkpoint, {job.counts["resumed"]} imóveis já gravados.')
+
+        if self.fresh_ids:
+            pending = [i for i in all_ids if normalize_id(i) not in self.fresh_ids]
+            job.counts['skipped'] = len(all_ids) - len(pending)
+            all_ids = pending
+            self.log(
+                f'{job.label}: {job.counts["skipped"]} imóveis recentes ignorados, {len(all_ids)} a baixar.')
+
+        await self.scrape_ids(job, all_ids)
+        if checkpoint is not None:
+            # Com lotes ou detalhes que falharam (ou uma modalidade sem Etapa 1),
+            # o estado fica em aberto e o --resume baixa o que faltou
+            if job.counts['errors'] or job.counts['pending'] or faltando:
+                self.pendentes.append(estado)
+                self.log(f'{job.label}: {job.counts["errors"]} erro(s); o estado fica pendente '
+                         f'para o --resume.', 'WARNING')
+            else:
+                await sync_to_async(finish_checkpoint, thread_sensitive=True)(checkpoint)
+        self.stats.update(job.counts)
+        self.log(
+            f'Scraping para {job.label} concluído! Criados: {job.counts["created"]}. '
+            f'Atualizados: {job.counts["updated"]}. Sem mudanças: {job.counts["unchanged"]}. '
+            f'Ignorados: {job.counts["skipped"]}.'
+            + (f' Sem mudanças no lote: {job.counts["swept"]}.' if self.sweep else ''), 'SUCCESS')
+
+    async def search_estado(self, job, modalidades):
+        '''
+        Etapa 1 de `modalidades` no estado do job: preenche job.tp_vendas e
+        self.etapa1 e retorna os IDs únicos, ordenados. Uma modalidade que
+        falha por erro de rede fica de fora de self.etapa1.
+        '''
+        estado = job.estado
+        resultados = await asyncio.gather(
+            *(self.fetch_ids(tp_venda, estado) for tp_venda in modalidades),
+            return_exceptions=True)
+        ids_por_chave = {}
+        for tp_venda, resultado in zip(modalidades, resultados):
+            if isinstance(resultado, requests.exceptions.RequestException):
+                self.stats['errors'] += 1
+                self.log(f'Erro fatal de rede ao processar {estado}/{tp_venda}: {resultado}', 'ERROR')
+                continue
+            if isinstance(resultado, BaseException):
+                raise resultado
+            self.etapa1[(tp_venda, estado)] = {normalize_id(i) for i in resultado}
+            for imovel_id in resultado:
+                key = normalize_id(imovel_id)
+                ids_por_chave.setdefault(key, imovel_id)
+                job.tp_vendas.setdefault(key, []).append(tp_venda)
+
+        all_ids = sorted(ids_por_chave.values())
+        if not all_ids:
+            self.log(
+                f'Nenhum ID de imóvel encontrado para {job.label}.', 'WARNING')
+            return all_ids
+        total = sum(len(tps) for tps in job.tp_vendas.values())
+        job.counts['duplicates'] = total - len(all_ids)
+        self.log(
+            f'Etapa 1 concluída para {job.label}. {len(all_ids)} IDs únicos encontrados '
+            f'({job.counts["duplicates"]} repetidos entre modalidades).', 'SUCCESS')
+        return all_ids
+
+    async def scrape_ids(self, job, ids):
+        '''Baixa os lotes e os detalhes de `ids` (já presentes em job.tp_vendas).'''
+        # Os lotes saem de uma fila compartilhada para que cada um use o
+        # tamanho de lote vigente no momento em que é montado.
+        job.pending.extend(ids)
+        workers = min(self.concurrency, -(-len(ids) // self.chunk_size.size))
+        await asyncio.gather(*(self.list_worker(job) for _ in range(workers)))
+        await job.tracker.wait()
+        # Grava o que ficou no buffer para que os totais do estado fiquem completos
+        await self._flush()
+
+    async def fetch_ids(self, tp_venda, estado):
+        params = {'hdn_estado': estado, 'hdn_cidade': '',
+                  'hdn_quartos': '', 'hdn_tp_venda': tp_venda}
+        response = await self.request(self.search_url, data=params, timeout=60)
+        await self.archive_page('pesquisa', f'{estado}-{tp_venda}', response.content,
+                                tp_venda=tp_venda, estado=estado)
+        with self.telemetry.medir('parse.pesquisa'):
+            return extract_ids(response.content, self.parser)
+
+    async def list_worker(self, job):
+        while job.pending:
+            size = self.chunk_size.size
+            chunk = [job.pending.popleft() for _ in range(min(size, len(job.pending)))]
+            await self.scrape_chunk(job, chunk)
+
+    async def scrape_chunk(self, job, chunk):
+        inicio = time.monotonic()
+        try:
+            list_response = await self.request(
+                self.list_url, data={'hdnImov': '||'.join(chunk)},
+                headers={'Referer': self.search_url}, timeout=60)
+        except requests.exceptions.RequestException as e:
+            self.chunk_size.record_failure()
+            job.counts['errors'] += 1
+            self.log(f'Erro ao carregar lote de {job.label}: {e}', 'ERROR')
+            return
+        await self.archive_page('lista', f'{job.estado}-{chunk[0]}', list_response.content,
+                                estado=job.estado, ids=chunk)
+        with self.telemetry.medir('parse.lista'):
+            listings = parse_list_items(list_response.content, self.parser)
+        self.chunk_size.record(len(chunk), len(listings), time.monotonic() - inicio)
+        if len(listings) < len(chunk):
+            # IDs que não vieram no lote voltam uma vez para a fila
+            returned = {normalize_id(listing['numero_imovel']) for listing in listings}
+            for imovel_id in chunk:
+                if normalize_id(imovel_id) not in returned and imovel_id not in job.requeued:
+                    job.requeued.add(imovel_id)
+                    job.pending.append(imovel_id)
+        for listing in listings:
+            tp_vendas = job.tp_vendas.get(normalize_id(listing['numero_imovel']))
+            if tp_vendas is None:
+                self.log(f"Imóvel {listing['numero_imovel']} não foi pedido neste lote; ignorado.", 'WARNING')
+                continue
+            item = DetalheItem(job, listing, tp_vendas)
+            item.list_hash = fingerprint_listing(listing, item.modalidades)
+            if self.sweep and self.list_hashes.get(item.numero_imovel) == item.list_hash:
+                job.counts['swept'] += 1
+                continue
+            # Espera quando o pipeline está cheio (backpressure)
+            await self.pipeline.submit(item, job.tracker)
+        if job.checkpoint is not None:
+            job.checkpoint.lotes_concluidos += 1
+
+    async def fetch_detail(self, item):
+        '''Estágio fetch: baixa e arquiva a página; descarta as que não mudaram.'''
+        job = item.job
+        if self.orcamento is not None and self.stats['requests'] >= self.orcamento:
+            job.counts['pending'] += 1
+            return None
+        numero_imovel = item.numero_imovel
+        try:
+            detail_response = await self.request(
+                self.detail_url, data={'hdnImovel': imovel_id_numeric(numero_imovel)}, timeout=30)
+        except OrcamentoEsgotado:
+            job.counts['pending'] += 1
+            return None
+        item.fetched_at = timezone.now()
+        await self.archive_page('detalhe', numero_imovel, detail_response.content,
+                                fetched_at=item.fetched_at, tp_vendas=item.tp_vendas,
+                                listing=item.listing, estado=job.estado)
+        item.content = detail_response.content
+        # O valor do lote fica de fora: no refresh ele vem do banco, onde
+        # pode ter sido substituído pelo valor da página de detalhe
+        item.fingerprint = fingerprint_detail(
+            item.content, '|'.join(item.modalidades),
+            item.listing.get('description'), item.listing.get('image_url'))
+        if (item.fingerprint is not None and self.fingerprints.get(numero_imovel) == item.fingerprint
+                and item.list_hash in (None, self.list_hashes.get(numero_imovel))):
+            await self._touch(numero_imovel, self.result_counters(item), job.checkpoint,
+                              scraped_at=item.fetched_at)
+            self.log(f"Imóvel {numero_imovel} sem mudanças.")
+            return None
+        return item
+
+    async def parse_page(self, item):
+        '''
+        Estágio parse: bytes da página -> defaults do Imovel, fora do event loop
+        (em thread ou processo).
+        '''
+        loop = asyncio.get_running_loop()
+        item.defaults = await loop.run_in_executor(
+            self.parse_executor, partial(
+                detail_defaults, item.content, item.listing, item.modalidades, self.parser))
+        item.content = None
+        if item.defaults is None:
+            self.telemetry.falhas_parse['dadosImovel'] += 1
+            self.log(
+                f"Div 'dadosImovel' não encontrada para o ID {item.numero_imovel}.", 'WARNING')
+            return None
+        return item
+
+    async def normalize(self, item):
+        '''Estágio normalize: completa os defaults com o que só o motor sabe.'''
+        self.telemetry.record_campos(item.defaults)
+        item.defaults['content_hash'] = item.fingerprint
+        item.defaults['scraped_at'] = item.fetched_at
+        if item.list_hash is not None:
+            item.defaults['list_hash'] = item.list_hash
+        if item.job.estado:
+            item.defaults['estado'] = item.job.estado
+        return item
+
+    async def write(self, item):
+        '''Estágio write: entrega ao BulkImovelWriter, que grava em lotes.'''
+        await self._write(item.defaults, self.result_counters(item), item.job.checkpoint)
+        self.log(f"Imóvel {item.numero_imovel} processado.")
+        return item
+
+    def result_counters(self, item):
+        '''Counters que recebem o resultado da gravação: o do estado e um por modalidade.'''
+        return (item.job.counts, *(self.telemetry.resultado(item.job.estado, modalidade)
+                                   for modalidade in item.modalidades))
+
+    def stage_error(self, stage, item, error):
+        item.job.counts['errors'] += 1
+        self.log(
+            f'Erro ao processar o imóvel ID {item.numero_imovel} ({stage.name}): {error}', 'ERROR')
@@ -0,0 +1,157 @@
+'''
+Tabela declarativa dos campos do Imovel extraídos da página de detalhe.
+
+Cada campo aponta para um trecho de texto da página (a "fonte"), um ou mais
+padrões já compilados e um conversor. parse_detail monta o texto de cada
+fonte uma única vez e aplica a tabela inteira sobre ele.
+'''
+import re
+from collections import namedtuple
+from datetime import datetime
+from django.utils import timezone
+
+FLAGS = re.I | re.DOTALL
+
+_NAO_NUMERICO = re.compile(r'[^\d,.]')
+_NUMERO = re.compile(r'(\d+\.?\d*)')
+
+
+def parse_numero(text):
+    '''Parse number from text.'''
+    if not text:
+        return None
+    # Clean the text to keep only digits, comma, and period
+    cleaned_text = _NAO_NUMERICO.sub('', text)
+    # Handle Brazilian format (e.g., 1.234,56) by removing periods and replacing comma
+    if ',' in cleaned_text and '.' in cleaned_text:
+        cleaned_text = cleaned_text.replace('.', '')
+    cleaned_text = cleaned_text.replace(',', '.')
+    match = _NUMERO.search(cleaned_text)
+    return float(match.group(1)) if match else None
+
+
+# Um único regex cobre os formatos '%d/%m/%Y %H:%M:%S', '%d/%m/%Y %H:%M' e
+# '%d/%m/%Y - %Hh%M', sem tentar strptime formato a formato.
+_DATA_LEILAO = re.compile(
+    r'(\d{1,2})/(\d{1,2})/(\d{4})'
+    r'(?: (\d{1,2}):(\d{1,2})(?::(\d{1,2}))?| - (\d{1,2})h(\d{1,2}))')
+
+
+def parse_data_leilao(text):
+    '''Parse date from text, trying multiple formats.'''
+    if not text:
+        return None
+    if match := _DATA_LEILAO.fullmatch(text):
+        dia, mes, ano, hora, minuto, segundo, hora_h, minuto_h = match.groups()
+        try:
+            naive_dt = datetime(int(ano), int(mes), int(dia),
+                                int(hora or hora_h), int(minuto or minuto_h), int(segundo or 0))
+        except ValueError:
+            naive_dt = None
+        if naive_dt:
+            # Make the datetime timezone-aware
+            return timezone.make_aware(naive_dt)
+    # Data fora do formato: o campo fica vazio e aparece em 'falhas_parse' na telemetria
+    return None
+
+
+def parse_inteiro(text):
+    '''"2" -> 2; qualquer outra coisa -> None.'''
+    return int(text) if text.isdigit() else None
+
+
+def texto(value):
+    return value
+
+
+Campo = namedtuple('Campo', ['field', 'fonte', 'patterns', 'converter'])
+
+
+def campo(field, fonte, *patterns, converter=texto):
+    return Campo(field, fonte, tuple(re.compile(p, FLAGS) for p in patterns), converter)
+
+
+# Fontes:
+#   precos          <p style="font-size:14pt"> com os valores
+#   content         div.content, texto separado por espaço
+#   related_linhas  div.related-box, uma linha por elemento
+#   related         div.related-box, texto separado por espaço
+CAMPOS_DETALHE = (
+    campo('valor_avaliacao', 'precos',
+          r"Valor de avaliação: R\$ ([\d,.]+)", converter=parse_numero),
+    campo('valor_venda_leilao_1', 'precos',
+          r"Valor mínimo de venda 1º Leilão: R\$ ([\d,.]+)", converter=parse_numero),
+    campo('valor_venda_leilao_2', 'precos',
+          r"Valor mínimo de venda 2º Leilão: R\$ ([\d,.]+)", converter=parse_numero),
+    # Venda Direta e Licitação Aberta só informam o valor mínimo de venda
+    campo('valor_venda', 'precos',
+          r"Valor mínimo de venda: R\$ ([\d,.]+)", converter=parse_numero),
+    campo('area_total', 'content',
+          r'Área total\s*=\s*([\d,.]+)m2', converter=parse_numero),
+    campo('area_privativa', 'content',
+          r'Área privativa\s*=\s*([\d,.]+)m2', converter=parse_numero),
+    campo('area_terreno', 'content',
+          r'Área do terreno\s*=\s*([\d,.]+)m2', converter=parse_numero),
+    campo('edital', 'related_linhas', r"Edital: (.*?)\n"),
+    campo('numero_item', 'related_linhas', r"Número do item: (\d+)"),
+    campo('leiloeiro', 'related_linhas', r"Leiloeiro\(a\): (.*?)\n"),
+    campo('data_leilao_1', 'related_linhas',
+          r"(?:Data do 1º Leilão|Data da Licitação Aberta) - (.*?)\n", converter=parse_data_leilao),
+    campo('data_leilao_2', 'related_linhas',
+          r"Data do 2º Leilão - (.*?)\n", converter=parse_data_leilao),
+    # Os padrões são tentados em ordem; vale o primeiro que casar
+    campo('data_publicacao_edital', 'related_linhas',
+          r"Edital publicado em: (\d{2}/\d{2}/\d{4} \d{2}:\d{2}:\d{2})",
+          r"Edital publicado em: (\d{2}/\d{2}/\d{4} \d{2}:\d{2})",
+          r"Publicado em: (\d{2}/\d{2}/\d{4} \d{2}:\d{2}:\d{2})",
+          r"Data de publicação: (\d{2}/\d{2}/\d{4} \d{2}:\d{2}:\d{2})",
+          converter=parse_data_leilao),
+    campo('formas_pagamento', 'related',
+          r"FORMAS DE PAGAMENTO ACEITAS: (.*?)(?:REGRAS PARA PAGAMENTO|$)"),
+    campo('regras_despesas', 'related',
+          r"REGRAS PARA PAGAMENTO DAS DESPESAS.*?:\s(.*?)(?:FORMAS DE PAGAMENTO|$)"),
+)
+
+# Spans de div.content no formato "Rótulo: <strong>valor</strong>"
+CAMPOS_SPAN = (
+    ('Tipo de imóvel', 'tipo_imovel', texto),
+    ('Quartos', 'quartos', parse_inteiro),
+    ('Garagem', 'garagem', parse_inteiro),
+    ('Matrícula(s)', 'matricula', texto),
+    ('Comarca', 'comarca', texto),
+    ('Ofício', 'oficio', texto),
+    ('Inscrição imobiliária', 'inscricao_imobiliaria', texto),
+    ('Averbação dos leilões negativos', 'averbacao_leiloes_negativos', texto),
+)
+
+
+def match_campo(campo, text):
+    '''Primeiro grupo do primeiro padrão que casar, sem espaços nas bordas.'''
+    for pattern in campo.patterns:
+        if match := pattern.search(text):
+            return match.group(1).strip()
+    return None
+
+
+def extract_campos(textos, campos=CAMPOS_DETALHE):
+    '''
+    Aplica `campos` sobre os textos de cada fonte. Campos cuja fonte não existe
+    na página ficam de fora do resultado; os demais recebem o valor
+    convertido, ou None quando o padrão não casa.
+    '''
+    valores = {}
+    for campo in campos:
+        text = textos.get(campo.fonte)
+        if text is None:
+            continue
+        raw = match_campo(campo, text)
+        valores[campo.field] = campo.converter(raw) if raw is not None else None
+    return valores
+
+
+def extract_span(label, value):
+    '''Converte um span de div.content; retorna (field, valor) ou None.'''
+    for rotulo, field, converter in CAMPOS_SPAN:
+        if rotulo in label:
+            return field, converter(value)
+    return None
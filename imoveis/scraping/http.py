@@ -0,0 +1,73 @@
+'''
+Requisições HTTP compartilhadas pelo scraper, pelo import_caixa_csv e pela
+geocodificação: sessão com pool de conexões, a requisição em si e a
+classificação das falhas para as novas tentativas.
+
+O certificado é verificado por padrão. Só o site da Caixa é acessado com
+verify=False; o aviso InsecureRequestWarning é silenciado apenas para os
+hosts acessados assim, e não para o processo inteiro.
+'''
+import re
+import warnings
+from functools import lru_cache
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import InsecureRequestWarning
+
+from .constants import USER_AGENT
+
+
+@lru_cache(maxsize=None)
+def _silenciar_aviso(host):
+    # Um filtro por host: warnings.catch_warnings não é seguro entre threads
+    warnings.filterwarnings(
+        'ignore', message=rf"Unverified HTTPS request is being made to host '{re.escape(host)}'",
+        category=InsecureRequestWarning)
+
+
+def make_request(session, url, method='post', verify=True, **kwargs):
+    '''Make HTTP request. As novas tentativas ficam a cargo de quem chama.'''
+    if not verify:
+        _silenciar_aviso(urlsplit(url).hostname or '')
+    response = session.request(method, url, verify=verify, **kwargs)
+    response.raise_for_status()  # Raise an exception for bad status codes
+    return response
+
+
+def build_session(pool_size):
+    '''Session com pool de conexões do tamanho da concorrência.'''
+    session = requests.Session()
+    session.headers.update({'User-Agent': USER_AGENT})
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+
+def is_retryable(error):
+    '''429, 5xx, timeouts e falhas de conexão merecem nova tentativa.'''
+    if isinstance(error, requests.exceptions.HTTPError):
+        status = error.response.status_code if error.response is not None else None
+        return status == 429 or (status is not None and status >= 500)
+    return isinstance(error, (requests.exceptions.Timeout, requests.exceptions.ConnectionError))
+
+
+def status_label(error):
+    '''Código HTTP de uma falha, ou o nome da exceção quando não há resposta.'''
+    response = getattr(error, 'response', None)
+    if response is not None:
+        return response.status_code
+    return type(error).__name__
+
+
+def retry_after(error):
+    '''Segundos pedidos pelo cabeçalho Retry-After, se houver.'''
+    response = getattr(error, 'response', None)
+    if response is None:
+        return None
+    try:
+        return float(response.headers.get('Retry-After', ''))
+    except ValueError:
+        return None
@@ -0,0 +1,347 @@
+''' Extração dos dados das páginas da Caixa '''
+import hashlib
+import html as html_lib
+import re
+from functools import lru_cache
+from bs4 import BeautifulSoup, Comment, SoupStrainer
+from django.conf import settings
+
+from .constants import BASE_URL, CAIXA_ENCODING, DETAIL_URL
+from .fields import (CAMPOS_DETALHE, FLAGS, extract_campos, extract_span,
+                     match_campo, parse_data_leilao, parse_numero)
+
+# Backends do BeautifulSoup aceitos pelo scraper, do mais rápido ao mais lento
+HTML_PARSERS = ('lxml', 'html.parser')
+
+
+@lru_cache(maxsize=None)
+def _lxml_available():
+    try:
+        import lxml  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def default_parser():
+    '''
+    Backend configurado em settings.SCRAPER_HTML_PARSER; sem configuração,
+    usa lxml quando está instalado e cai para o html.parser da stdlib.
+    '''
+    if configured := getattr(settings, 'SCRAPER_HTML_PARSER', None):
+        return configured
+    return 'lxml' if _lxml_available() else 'html.parser'
+
+
+def decode(markup):
+    '''Bytes -> str com o charset conhecido da Caixa, sem a detecção de encoding do requests/bs4.'''
+    if isinstance(markup, bytes):
+        return markup.decode(CAIXA_ENCODING, errors='replace')
+    return markup
+
+
+def make_soup(markup, parser=None, parse_only=None):
+    '''Monta o BeautifulSoup com o backend escolhido.'''
+    return BeautifulSoup(decode(markup), parser or default_parser(), parse_only=parse_only)
+
+
+class DetalheStrainer(SoupStrainer):
+    '''
+    Monta só as partes da página de detalhe lidas por parse_detail: as divs
+    dadosImovel e galeria-imagens, os links e botões de documentos e do
+    leiloeiro, os links da Venda Direta Online e os comentários com a
+    situação do imóvel. O resto da página (menus, rodapé, scripts) nem vira
+    objeto.
+    '''
+    ids = ('dadosImovel', 'galeria-imagens')
+    onclick = re.compile('ExibeDoc|SiteLeiloeiro')
+    href = re.compile('regrasVendaOnline|formasPagamento')
+
+    def allow_tag_creation(self, nsprefix, name, attrs):
+        if not attrs:
+            return False
+        if attrs.get('id') in self.ids:
+            return True
+        if name in ('a', 'button') and self.onclick.search(attrs.get('onclick') or ''):
+            return True
+        return name == 'a' and bool(self.href.search(attrs.get('href') or ''))
+
+    def allow_string_creation(self, string):
+        # Só chegam aqui textos fora das tags acima, como os comentários
+        return 'Situação:' in string
+
+
+DETALHE_STRAINER = DetalheStrainer()
+
+
+# Versão da extração; incrementar quando parse_detail/CAMPOS_DETALHE mudarem,
+# para que as impressões digitais antigas deixem de valer
+PARSER_VERSION = 3
+
+_DADOS_IMOVEL = re.compile(rb'<div[^>]*\bid=["\']?dadosImovel\b', re.I)
+_FIM_BODY = re.compile(rb'</body', re.I)
+_VOLATIL = re.compile(rb'<script\b.*?</script>|<style\b.*?</style>', re.I | re.S)
+_ESPACOS = re.compile(rb'\s+')
+
+
+def fingerprint_detail(content, *extra):
+    '''
+    sha256 do trecho relevante de uma página detalhe-imovel.asp (da div
+    dadosImovel até o fim do body, o que inclui a galeria de fotos), sem
+    scripts nem estilos e com os espaços normalizados. `extra` entra no hash
+    junto (ex: dados do lote), assim como PARSER_VERSION. Não monta a árvore
+    HTML. Retorna None quando a página não tem a div dadosImovel.
+    '''
+    inicio = _DADOS_IMOVEL.search(content)
+    if inicio is None:
+        return None
+    fim = _FIM_BODY.search(content, inicio.start())
+    bloco = content[inicio.start():fim.start() if fim else len(content)]
+    bloco = _ESPACOS.sub(b' ', _VOLATIL.sub(b'', bloco))
+    digest = hashlib.sha256(b'%d\0' % PARSER_VERSION)
+    digest.update(bloco)
+    for value in extra:
+        digest.update(b'\0' + str(value).encode(CAIXA_ENCODING))
+    return digest.hexdigest()
+
+
+def fingerprint_listing(listing, modalidades):
+    '''
+    sha256 do que carregaListaImoveis.asp mostra de um imóvel (preço,
+    descrição e foto) mais as modalidades em que ele apareceu. Quando muda,
+    a página de detalhe precisa ser baixada de novo.
+    '''
+    partes = (PARSER_VERSION, listing.get('amount'), listing.get('description'),
+              listing.get('image_url'), '|'.join(modalidades))
+    return hashlib.sha256('\0'.join(map(str, partes)).encode(CAIXA_ENCODING)).hexdigest()
+
+
+_TAG = re.compile(r'<[^>]+>')
+_HDN_IMOV = re.compile(r'^hdnImov\d+')
+_NUMERO_IMOVEL = re.compile(r"Número do imóvel: ([\d-]+)", re.I)
+_NAO_DIGITO = re.compile(r'\D')
+
+
+def extract_ids(html, parser=None):
+    '''Etapa 1: extrai os IDs de imóveis da resposta de carregaPesquisaImoveis.asp.'''
+    soup = make_soup(html, parser, parse_only=SoupStrainer('input', id=_HDN_IMOV))
+    all_ids_raw = []
+    for input_tag in soup.find_all('input', id=_HDN_IMOV):
+        if value := input_tag.get('value'):
+            all_ids_raw.extend(value.split('||'))
+    soup.decompose()
+    return sorted(set(filter(None, all_ids_raw)))
+
+
+def parse_list_items(html, parser=None):
+    '''
+    Extrai os dados de cada imóvel de um lote de carregaListaImoveis.asp.
+    O preço do lote só é usado quando a página de detalhe não traz nenhum.
+    '''
+    list_soup = make_soup(html, parser, parse_only=SoupStrainer('li', class_='group-block-item'))
+    items = []
+    for item in list_soup.find_all('li', class_='group-block-item'):
+        rows = item.find_all('li', class_='form-row clearfix')
+        if len(rows) < 2:
+            continue
+        desc_block_raw = rows[1].get_text(strip=False)
+        numero_imovel_match = _NUMERO_IMOVEL.search(desc_block_raw)
+        if not numero_imovel_match:
+            continue
+
+        listing = {
+            'numero_imovel': numero_imovel_match.group(1),
+            'description': desc_block_raw.strip().split('\n')[0].strip(),
+            'amount': parse_numero(item.find_all('li', class_='form-row')[0].get_text(strip=True)),
+            'image_url': None,
+        }
+        foto_col = item.find('div', class_='fotoimovel-col1')
+        if foto_col and (img_tag := foto_col.find('img')):
+            listing['image_url'] = f"{BASE_URL}{img_tag.get('src')}"
+        items.append(listing)
+    list_soup.decompose()
+    return items
+
+
+def imovel_id_numeric(numero_imovel):
+    '''Converte "1444419-7" no formato aceito por detalhe-imovel.asp.'''
+    return _NAO_DIGITO.sub('', numero_imovel)
+
+
+def normalize_id(value):
+    '''
+    Chave de comparação entre os IDs da Etapa 1 e os campos numero_imovel /
+    hdn_imovel_id já gravados: só dígitos, sem zeros à esquerda.
+    '''
+    return imovel_id_numeric(value or '').lstrip('0')
+
+
+_PUBLICACAO_HINT = re.compile('publica', re.I)
+_SITUACAO = re.compile(r"Situação:", re.I)
+_STRONG = re.compile(r"<strong>(.*?)</strong>", re.I)
+_DESCRICAO = re.compile("Descrição:")
+_ENDERECO = re.compile("Endereço:")
+_CEP = re.compile(r"CEP: ([\d-]+)", FLAGS)
+_EXIBE_DOC = re.compile(r"ExibeDoc\('(.*?)'\)", FLAGS)
+_ONCLICK_MATRICULA = re.compile("ExibeDoc.*matricula")
+_ONCLICK_EDITAL = re.compile("ExibeDoc.*PDF")
+_ONCLICK_LEILOEIRO = re.compile("SiteLeiloeiro")
+_SITE_LEILOEIRO = re.compile(r"SiteLeiloeiro\(\"(.*?)\"\)", FLAGS)
+_HREF_VENDA_ONLINE = re.compile("regrasVendaOnline")
+_HREF_FORMAS_PAGAMENTO = re.compile("formasPagamento")
+_PUBLICACAO = next(c for c in CAMPOS_DETALHE if c.field == 'data_publicacao_edital')
+
+
+def _group(pattern, text):
+    if match := pattern.search(text):
+        return match.group(1).strip()
+    return None
+
+
+def _next_text(strong_tag):
+    '''Texto que segue um <strong>Rótulo:</strong><br>.'''
+    if hasattr(strong_tag.next_sibling, 'next_sibling'):
+        return strong_tag.next_sibling.next_sibling.strip()
+    return None
+
+
+def parse_detail(html, parser=None):
+    '''
+    Extrai os campos do Imovel de uma página detalhe-imovel.asp.
+    Retorna None quando a página não tem a div 'dadosImovel'.
+
+    Os campos extraídos por regex vêm da tabela CAMPOS_DETALHE (fields.py);
+    aqui só se monta o texto de cada fonte e se tratam os campos que
+    dependem da estrutura do HTML. Só as partes escolhidas pelo
+    DetalheStrainer viram árvore, e ela é destruída ao final.
+    '''
+    markup = decode(html)
+    detail_soup = make_soup(markup, parser, parse_only=DETALHE_STRAINER)
+    try:
+        return _extract_detail(detail_soup, markup)
+    finally:
+        # Quebra as referências cíclicas da árvore para liberar a memória já
+        detail_soup.decompose()
+
+
+def _extract_detail(detail_soup, markup):
+    dados_imovel_div = detail_soup.find('div', id='dadosImovel')
+    if not dados_imovel_div:
+        return None
+
+    textos = {}
+    if p_prices := dados_imovel_div.find('p', style="font-size:14pt"):
+        textos['precos'] = p_prices.get_text()
+    content_div = dados_imovel_div.find('div', class_='content')
+    if content_div:
+        textos['content'] = content_div.get_text(separator=' ')
+    related_box = dados_imovel_div.find('div', class_='related-box')
+    if related_box:
+        textos['related_linhas'] = related_box.get_text(separator='\n', strip=True)
+        textos['related'] = related_box.get_text(separator=' ', strip=True)
+
+    h5 = dados_imovel_div.find('h5')
+    defaults = {'title': h5.get_text(strip=True) if h5 else 'Título não encontrado'}
+    defaults.update(extract_campos(textos))
+
+    if 'precos' in textos:
+        defaults['amount'] = defaults['valor_venda_leilao_1'] or defaults['valor_venda_leilao_2'] or defaults['valor_venda']
+        del defaults['valor_venda']
+
+    if content_div:
+        for span in content_div.find_all('span'):
+            text = span.get_text(strip=True)
+            key, *value = text.split(':', 1)
+            strong_tag = span.find('strong')
+            strong_value = strong_tag.get_text(strip=True) if strong_tag else (
+                value[0].strip() if value else '')
+            if extracted := extract_span(key, strong_value):
+                defaults[extracted[0]] = extracted[1]
+
+    if situacao_span := dados_imovel_div.find('span', string=_SITUACAO):
+        strong_tag = situacao_span.find('strong')
+        defaults['situacao'] = strong_tag.get_text(
+            strip=True) if strong_tag else None
+    else:
+        # Em algumas páginas a situação só aparece dentro de um comentário HTML
+        for comment in detail_soup.find_all(string=lambda text: isinstance(text, Comment)):
+            if 'Situação:' in comment:
+                if situacao_match := _STRONG.search(comment):
+                    defaults['situacao'] = situacao_match.group(1).strip()
+                    break
+
+    if related_box:
+        # A data pode estar fora das partes montadas: procura no texto do
+        # documento inteiro, tirado do HTML bruto, só quando "publica..."
+        # aparece em algum lugar.
+        if defaults['data_publicacao_edital'] is None and _PUBLICACAO_HINT.search(markup):
+            texto_pagina = html_lib.unescape(' '.join(_TAG.sub(' ', markup).split()))
+            defaults['data_publicacao_edital'] = parse_data_leilao(match_campo(
+                _PUBLICACAO, texto_pagina))
+
+        if desc_tag := related_box.find('strong', string=_DESCRICAO):
+            if desc_text := _next_text(desc_tag):
+                defaults['descricao_detalhada'] = desc_text if desc_text != '.' else None
+
+        if addr_tag := related_box.find('strong', string=_ENDERECO):
+            if full_addr := _next_text(addr_tag):
+                defaults['address'] = full_addr
+                defaults['cep'] = _group(_CEP, full_addr)
+
+    if hdn_imovel := dados_imovel_div.find('input', id='hdnimovel'):
+        defaults['hdn_imovel_id'] = hdn_imovel.get('value')
+
+    if link_matricula_tag := detail_soup.find('a', onclick=_ONCLICK_MATRICULA):
+        path = _group(_EXIBE_DOC, link_matricula_tag['onclick'])
+        defaults['link_matricula'] = f"{BASE_URL}{path}"
+
+    if link_edital_tag := detail_soup.find('a', onclick=_ONCLICK_EDITAL):
+        path = _group(_EXIBE_DOC, link_edital_tag['onclick'])
+        defaults['link_edital'] = f"{BASE_URL}{path}"
+
+    if leiloeiro_button := detail_soup.find('button', onclick=_ONCLICK_LEILOEIRO):
+        if domain := _group(_SITE_LEILOEIRO, leiloeiro_button['onclick']):
+            defaults['site_leiloeiro'] = f"http://{domain}"
+
+    # Links exclusivos da Venda Direta Online
+    if link_venda_online := detail_soup.find('a', href=_HREF_VENDA_ONLINE):
+        defaults['link_venda_online'] = link_venda_online.get('href')
+
+    if link_formas_pagamento := detail_soup.find('a', href=_HREF_FORMAS_PAGAMENTO):
+        defaults['link_formas_pagamento'] = link_formas_pagamento.get('href')
+
+    if galeria := detail_soup.find('div', id='galeria-imagens'):
+        defaults['fotos'] = [f"{BASE_URL}{img.get('src')}" for img in galeria.find_all(
+            'img') if img.get('src')]
+
+    return defaults
+
+
+def build_defaults(listing, detail, modalidades):
+    '''
+    Junta os dados do lote (listing) com os da página de detalhe, no formato
+    usado em Imovel.objects.update_or_create. `modalidades` são os nomes de
+    todas as modalidades em que o imóvel foi encontrado; a primeira vai para
+    Imovel.modalidade.
+    '''
+    defaults = {'numero_imovel': listing['numero_imovel'], **detail}
+    defaults['modalidade'] = modalidades[0]
+    defaults['modalidades'] = modalidades
+    defaults['amount'] = detail.get('amount') or listing.get('amount')
+    defaults['description'] = listing.get('description')
+    defaults['image_url'] = listing.get('image_url')
+    defaults['source_url'] = f"{DETAIL_URL}?hdnImovel={imovel_id_numeric(listing['numero_imovel'])}"
+    # Remove keys with None values before saving
+    return {k: v for k, v in defaults.items() if v is not None}
+
+
+def detail_defaults(content, listing, modalidades, parser=None):
+    '''
+    parse_detail + build_defaults: recebe os bytes da página e devolve o dict
+    de defaults (ou None sem dadosImovel). Só recebe e devolve objetos
+    simples, para poder rodar em um ProcessPoolExecutor.
+    '''
+    detail = parse_detail(content, parser)
+    if detail is None:
+        return None
+    return build_defaults(listing, detail, modalidades)
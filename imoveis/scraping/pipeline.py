@@ -0,0 +1,171 @@
+'''
+Pipeline assíncrono em estágios ligados por filas limitadas.
+
+Cada estágio tem sua própria fila de entrada (asyncio.Queue com maxsize) e
+um número de workers. Um worker que termina um item o coloca na fila do
+estágio seguinte; se ela estiver cheia, o worker espera, e assim a pressão
+se propaga até quem alimenta o pipeline (backpressure). Um handler que
+retorna None encerra o item ali mesmo (ex: página sem mudanças).
+
+Cada item entra acompanhado de um Tracker, que permite esperar até que
+todos os itens de um grupo (ex: um estado) tenham saído do pipeline.
+'''
+import asyncio
+import time
+
+from .telemetry import Histogram
+
+_STOP = object()
+
+
+class Tracker:
+    '''Conta os itens de um grupo que ainda estão no pipeline.'''
+
+    def __init__(self):
+        self.pending = 0
+        self._idle = asyncio.Event()
+        self._idle.set()
+
+    def add(self):
+        self.pending += 1
+        self._idle.clear()
+
+    def done(self):
+        self.pending -= 1
+        if self.pending == 0:
+            self._idle.set()
+
+    async def wait(self):
+        await self._idle.wait()
+
+
+class StageStats:
+    '''Contadores e histograma de latência por item de um estágio.'''
+
+    def __init__(self):
+        self.received = 0
+        self.emitted = 0
+        self.dropped = 0
+        self.errors = 0
+        self.busy = 0.0
+        self.max_queue = 0
+        self.latency = Histogram()
+
+    def as_dict(self):
+        return {'received': self.received, 'emitted': self.emitted,
+                'dropped': self.dropped, 'errors': self.errors,
+                'busy_seconds': round(self.busy, 3), 'max_queue': self.max_queue,
+                'latency': self.latency.as_dict()}
+
+
+class Stage:
+    '''
+    Um estágio do pipeline. `handler` é uma corrotina que recebe o item e
+    retorna o item para o próximo estágio, ou None para encerrá-lo.
+    '''
+
+    def __init__(self, name, handler, workers=1, maxsize=100):
+        self.name = name
+        self.handler = handler
+        self.workers = workers
+        self.maxsize = maxsize
+        self.stats = StageStats()
+        self.queue = None
+
+
+class Pipeline:
+    '''
+    Liga os estágios em sequência. Uso:
+
+        pipeline = Pipeline([Stage('fetch', fetch, workers=8), ...], on_error=log)
+        pipeline.start()
+        await pipeline.submit(item, tracker)
+        ...
+        await pipeline.close()
+
+    Exceções levantadas por um handler encerram o item, contam como erro do
+    estágio e são repassadas a `on_error(stage, item, exc)`.
+    '''
+
+    def __init__(self, stages, on_error=None):
+        self.stages = stages
+        self.on_error = on_error
+        self.tasks = {}
+        self.started_at = None
+
+    def start(self):
+        self.started_at = time.monotonic()
+        for stage in self.stages:
+            stage.queue = asyncio.Queue(maxsize=stage.maxsize)
+        for index, stage in enumerate(self.stages):
+            following = self.stages[index + 1] if index + 1 < len(self.stages) else None
+            self.tasks[stage.name] = [
+                asyncio.create_task(self._worker(stage, following)) for _ in range(stage.workers)]
+
+    async def submit(self, item, tracker):
+        '''Coloca um item no primeiro estágio; espera se a fila estiver cheia.'''
+        tracker.add()
+        await self._put(self.stages[0], (tracker, item))
+
+    async def close(self):
+        '''Espera todos os itens saírem do pipeline e encerra os workers.'''
+        # Um estágio só para depois que o anterior parou: nada mais chega a ele
+        for stage in self.stages:
+            for _ in range(stage.workers):
+                await stage.queue.put(_STOP)
+            await asyncio.gather(*self.tasks[stage.name])
+
+    async def _put(self, stage, envelope):
+        await stage.queue.put(envelope)
+        stage.stats.max_queue = max(stage.stats.max_queue, stage.queue.qsize())
+
+    async def _worker(self, stage, following):
+        while True:
+            envelope = await stage.queue.get()
+            if envelope is _STOP:
+                return
+            tracker, item = envelope
+            stage.stats.received += 1
+            inicio = time.monotonic()
+            try:
+                result = await stage.handler(item)
+            except Exception as e:
+                stage.stats.errors += 1
+                result = None
+                if self.on_error is not None:
+                    self.on_error(stage, item, e)
+            finally:
+                duracao = time.monotonic() - inicio
+                stage.stats.busy += duracao
+                stage.stats.latency.record(duracao)
+            if result is None:
+                stage.stats.dropped += 1
+                tracker.done()
+                continue
+            stage.stats.emitted += 1
+            if following is None:
+                tracker.done()
+            else:
+                await self._put(following, (tracker, result))
+
+    def summary(self):
+        '''Contadores de cada estágio, com a vazão (itens/s) desde o start().'''
+        elapsed = max(time.monotonic() - self.started_at, 1e-9) if self.started_at else 0
+        summary = {}
+        for stage in self.stages:
+            data = stage.stats.as_dict()
+            data['workers'] = stage.workers
+            data['per_second'] = round(stage.stats.received / elapsed, 2) if elapsed else 0.0
+            summary[stage.name] = data
+        return summary
+
+
+def format_summary(summary):
+    '''Uma linha legível por estágio, para a saída dos comandos.'''
+    return [
+        f'{name}: {data["received"]} recebidos, {data["emitted"]} repassados, '
+        f'{data["dropped"]} encerrados, {data["errors"]} erros, {data["per_second"]:g}/s, '
+        f'ocupado {data["busy_seconds"]:g}s com {data["workers"]} worker(s), fila máx. {data["max_queue"]}'
+        + (f', p95 {data["latency"]["p95_ms"]:g}ms' if data['latency']['count'] else '')
+        for name, data in summary.items()
+    ]
@@ -0,0 +1,163 @@
+'''
+Controle de ritmo das requisições do scraper.
+
+AdaptiveRateLimiter é um token bucket por host cuja taxa segue AIMD: sobe
+um pouco a cada resposta rápida e bem-sucedida e cai pela metade a cada 429,
+5xx ou timeout. Falhas seguidas abrem um circuit breaker que pausa o host;
+se ele continuar falhando depois de várias pausas, o circuito abre e as
+requisições falham de imediato com CircuitOpenError. Passado o cooldown,
+uma única requisição de teste é liberada (half-open): se der certo o
+circuito fecha, se falhar ele reabre por mais um cooldown.
+
+AdaptiveChunkSize faz o mesmo para o número de IDs enviados por lote a
+carregaListaImoveis.asp.
+'''
+import asyncio
+import time
+from urllib.parse import urlsplit
+
+import requests
+
+
+class CircuitOpenError(requests.exceptions.RequestException):
+    ''' O host falhou demais e as requisições foram suspensas '''
+
+
+class AdaptiveRateLimiter:
+    '''Token bucket com taxa (req/s) ajustada por AIMD e circuit breaker.'''
+
+    def __init__(self, rate=2.0, min_rate=0.2, max_rate=20.0, increase=0.25,
+                 decrease=0.5, slow_latency=5.0, failure_threshold=5,
+                 cooldown=60.0, max_trips=3):
+        self.rate = rate
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.increase = increase
+        self.decrease = decrease
+        self.slow_latency = slow_latency
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.max_trips = max_trips
+        self.tokens = 1.0
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self.consecutive_failures = 0
+        self.trips = 0
+        self.probe_until = 0.0
+
+    @property
+    def tripped(self):
+        return self.trips >= self.max_trips
+
+    @property
+    def is_open(self):
+        '''Aberto: falha de imediato (durante o cooldown ou com o teste em andamento).'''
+        return self.tripped and time.monotonic() < max(self.paused_until, self.probe_until)
+
+    def _refill(self, now):
+        capacity = max(1.0, self.rate)
+        self.tokens = min(capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self):
+        '''Espera até haver um token disponível para este host.'''
+        while True:
+            if self.is_open:
+                raise CircuitOpenError(
+                    f'Circuit breaker aberto após {self.trips} pausas seguidas.')
+            now = time.monotonic()
+            if self.tripped:
+                # Half-open: só esta requisição passa. Se ela não voltar a
+                # tempo (ex: cancelada), outra é liberada após o cooldown.
+                self.probe_until = now + self.cooldown
+                return
+            if now < self.paused_until:
+                await asyncio.sleep(self.paused_until - now)
+                continue
+            self._refill(now)
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return
+            await asyncio.sleep((1 - self.tokens) / self.rate)
+
+    def pause(self, seconds):
+        '''Suspende o host por `seconds` (ex: Retry-After de um 429).'''
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+    def record_success(self, latency):
+        self.consecutive_failures = 0
+        self.trips = 0
+        self.probe_until = 0.0
+        if latency <= self.slow_latency:
+            self.rate = min(self.max_rate, self.rate + self.increase)
+        else:
+            # Resposta lenta: o servidor está no limite, recua sem pausar
+            self.rate = max(self.min_rate, self.rate * (1 + self.decrease) / 2)
+
+    def record_failure(self, retry_after=None):
+        self.rate = max(self.min_rate, self.rate * self.decrease)
+        self.tokens = min(self.tokens, 0.0)
+        self.consecutive_failures += 1
+        if retry_after:
+            self.pause(retry_after)
+        if self.tripped:
+            # O teste do half-open falhou: reabre por mais um cooldown
+            self.consecutive_failures = 0
+            self.probe_until = 0.0
+            self.pause(self.cooldown)
+        elif self.consecutive_failures >= self.failure_threshold:
+            self.consecutive_failures = 0
+            self.trips += 1
+            self.pause(self.cooldown)
+
+
+class HostRateLimiters:
+    '''Um AdaptiveRateLimiter por host, criado sob demanda.'''
+
+    def __init__(self, **limiter_options):
+        self.limiter_options = limiter_options
+        self.limiters = {}
+
+    def for_url(self, url):
+        host = urlsplit(url).netloc
+        if host not in self.limiters:
+            self.limiters[host] = AdaptiveRateLimiter(**self.limiter_options)
+        return self.limiters[host]
+
+    def set_max_rate(self, max_rate):
+        '''Troca o teto de todos os hosts (ex: a fatia de um worker na taxa total).'''
+        self.limiter_options['max_rate'] = max_rate
+        self.limiter_options['rate'] = min(self.limiter_options.get('rate', max_rate), max_rate)
+        for limiter in self.limiters.values():
+            limiter.max_rate = max_rate
+            limiter.rate = min(limiter.rate, max_rate)
+
+
+class AdaptiveChunkSize:
+    '''
+    Tamanho dos lotes de carregaListaImoveis.asp. Cresce enquanto os lotes
+    voltam completos e rápidos, e diminui quando falham ou demoram. Se um
+    lote maior que o último tamanho que voltou completo vier com menos
+    imóveis do que o pedido, esse tamanho passa a ser o teto.
+    '''
+
+    def __init__(self, size=10, min_size=2, max_size=30, slow_latency=10.0):
+        self.size = size
+        self.min_size = min_size
+        self.max_size = max_size
+        self.slow_latency = slow_latency
+        self.largest_complete = size
+
+    def record(self, requested, returned, latency):
+        if returned >= requested:
+            self.largest_complete = max(self.largest_complete, requested)
+            if latency <= self.slow_latency:
+                self.size = min(self.max_size, self.size + 1)
+            else:
+                self.size = max(self.min_size, self.size // 2)
+        elif requested > self.largest_complete:
+            self.max_size = self.largest_complete
+            self.size = min(self.size, self.max_size)
+
+    def record_failure(self):
+        self.size = max(self.min_size, self.size // 2)
@@ -0,0 +1,87 @@
+'''
+Fila de prioridade para atualizar as páginas de detalhe já conhecidas.
+
+Cada imóvel tem um intervalo de atualização desejado, que depende de quão
+perto está o próximo leilão, de o edital ter sido publicado há pouco e de
+quantos usuários o favoritaram. A prioridade é a idade do último scraping
+dividida por esse intervalo: acima de 1, o imóvel está atrasado.
+'''
+import heapq
+from collections import namedtuple
+from datetime import timedelta
+
+from django.db.models import Count
+from django.utils import timezone
+
+from imoveis.models import Imovel
+from .constants import MODALIDADES
+
+# (antecedência máxima do próximo leilão, intervalo de atualização), em ordem
+INTERVALOS_LEILAO = (
+    (timedelta(days=1), timedelta(hours=1)),
+    (timedelta(days=3), timedelta(hours=3)),
+    (timedelta(days=7), timedelta(hours=6)),
+    (timedelta(days=30), timedelta(hours=24)),
+)
+# Sem leilão à frente (Venda Direta, leilões já realizados)
+INTERVALO_PADRAO = timedelta(days=7)
+# Editais publicados há menos que isso têm o intervalo reduzido à metade
+EDITAL_RECENTE = timedelta(days=7)
+# Idade atribuída aos imóveis que nunca passaram pelo scraper com scraped_at
+IDADE_SEM_SCRAPING = timedelta(days=365)
+
+# Modalidade gravada -> um hdn_tp_venda que a produz
+TP_VENDA = {}
+for _tp_venda, _modalidade in MODALIDADES.items():
+    TP_VENDA.setdefault(_modalidade, _tp_venda)
+
+Atualizacao = namedtuple('Atualizacao', ['prioridade', 'tp_vendas', 'listing'])
+
+
+def intervalo_desejado(data_leilao_1, data_leilao_2, data_publicacao_edital, favoritos, agora):
+    '''Intervalo de atualização desejado para um imóvel.'''
+    proximo = min((d for d in (data_leilao_1, data_leilao_2) if d and d >= agora), default=None)
+    intervalo = INTERVALO_PADRAO
+    if proximo is not None:
+        for antecedencia, alvo in INTERVALOS_LEILAO:
+            if proximo - agora <= antecedencia:
+                intervalo = alvo
+                break
+    if data_publicacao_edital and agora - data_publicacao_edital <= EDITAL_RECENTE:
+        intervalo /= 2
+    # Cada favorito encurta o intervalo, até um quarto do original
+    return intervalo / min(1 + favoritos, 4)
+
+
+def prioridade(scraped_at, intervalo, agora):
+    idade = agora - scraped_at if scraped_at else IDADE_SEM_SCRAPING
+    return idade / intervalo
+
+
+def build_refresh_queue(orcamento, agora=None, apenas_atrasados=True):
+    '''
+    Até `orcamento` imóveis para atualizar, do mais para o menos prioritário.
+    Com `apenas_atrasados`, os que ainda estão dentro do intervalo desejado
+    ficam de fora mesmo que sobre orçamento.
+    '''
+    agora = agora or timezone.now()
+    rows = (Imovel.objects.filter(ativo=True, modalidade__in=TP_VENDA)
+            .annotate(n_favoritos=Count('favoritos'))
+            .values_list('numero_imovel', 'modalidade', 'modalidades', 'description', 'amount',
+                         'image_url', 'data_leilao_1', 'data_leilao_2',
+                         'data_publicacao_edital', 'n_favoritos', 'scraped_at'))
+
+    def candidatos():
+        for (numero_imovel, modalidade, modalidades, description, amount, image_url, leilao_1,
+             leilao_2, publicacao, favoritos, scraped_at) in rows.iterator():
+            intervalo = intervalo_desejado(leilao_1, leilao_2, publicacao, favoritos, agora)
+            valor = prioridade(scraped_at, intervalo, agora)
+            if apenas_atrasados and valor < 1:
+                continue
+            # Os dados do lote vêm do próprio banco: só o detalhe é baixado
+            listing = {'numero_imovel': numero_imovel, 'description': description,
+                       'amount': amount, 'image_url': image_url}
+            tp_vendas = [TP_VENDA[nome] for nome in modalidades or [modalidade] if nome in TP_VENDA]
+            yield Atualizacao(valor, tp_vendas, listing)
+
+    return heapq.nlargest(orcamento, candidatos(), key=lambda item: item.prioridade)
@@ -0,0 +1,370 @@
+'''
+Servidor HTTP local que imita os três endpoints da Caixa usados pelo scraper.
+
+Serve um catálogo sintético e determinístico (a mesma `semente` gera sempre
+os mesmos imóveis) ou, para as páginas de detalhe, páginas gravadas (ex: o
+corpus de imoveis/tests/fixtures). Latência, erros 5xx, 429 aleatórios e um
+limite de requisições por segundo com Retry-After são configuráveis, para
+medir concorrência, rate limit e retomada em escala sem acessar a Caixa.
+
+Uso (ver o comando simular_caixa):
+
+    servidor = SimuladorCaixa(('127.0.0.1', 0), Catalogo(5000), Falhas(latencia=0.05))
+    threading.Thread(target=servidor.serve_forever, daemon=True).start()
+    CaixaScraper(..., base_url=servidor.url).run()
+'''
+import html
+import json
+import random
+import threading
+import time
+from collections import Counter
+from datetime import timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs
+
+from django.utils import timezone
+
+from .constants import (CAIXA_ENCODING, DETAIL_PATH, ESTADOS_BRASIL, LIST_PATH,
+                        SEARCH_PATH)
+
+# hdn_tp_venda sorteados para cada imóvel, com o peso de cada um
+TP_VENDAS = ((34, 5), (21, 2), (14, 2), (2, 1))
+# Fração dos imóveis que aparece também em uma segunda modalidade
+FRACAO_REPETIDOS = 0.1
+# IDs por <input hdnImov> na resposta da busca, como no site
+IDS_POR_GRUPO = 10
+PRIMEIRO_NUMERO = 8555500000000
+
+CIDADES = ('SAO PAULO', 'CAMPINAS', 'SANTOS', 'RIO DE JANEIRO', 'BELO HORIZONTE',
+           'CURITIBA', 'PORTO ALEGRE', 'SALVADOR', 'RECIFE', 'GOIANIA')
+BAIRROS = ('CENTRO', 'JARDIM AMERICA', 'VILA NOVA', 'BOA VISTA', 'SANTA CRUZ', 'PARQUE INDUSTRIAL')
+TIPOS = ('Apartamento', 'Casa', 'Terreno', 'Sobrado', 'Loja')
+SITUACOES = ('Ocupado', 'Desocupado')
+
+
+class Catalogo:
+    '''
+    `tamanho` imóveis sintéticos distribuídos entre `estados`. Os atributos
+    de cada imóvel são derivados da semente e do seu índice, então não
+    precisam ficar em memória.
+    '''
+
+    def __init__(self, tamanho, semente=1, estados=ESTADOS_BRASIL):
+        self.tamanho = tamanho
+        self.semente = semente
+        self.estados = list(estados)
+        # índice -> fator aplicado ao preço (ver reajustar)
+        self.reajustes = {}
+        # (estado, hdn_tp_venda) -> números dos imóveis
+        self.indice = {}
+        for index in range(tamanho):
+            for tp_venda in self._tp_vendas(index):
+                self.indice.setdefault((self._estado(index), tp_venda), []).append(self.numero(index))
+
+    def _rng(self, index):
+        return random.Random(self.semente * 1_000_003 + index)
+
+    def _estado(self, index):
+        return self.estados[index % len(self.estados)]
+
+    def _tp_vendas(self, index):
+        rng = self._rng(index)
+        tp_vendas, pesos = zip(*TP_VENDAS)
+        escolhidas = [rng.choices(tp_vendas, pesos)[0]]
+        if rng.random() < FRACAO_REPETIDOS:
+            extra = rng.choice(tp_vendas)
+            if extra not in escolhidas:
+                escolhidas.append(extra)
+        return escolhidas
+
+    def numero(self, index):
+        return str(PRIMEIRO_NUMERO + index)
+
+    def index(self, numero):
+        '''Índice do imóvel com este número (com ou sem hífen), ou None.'''
+        digitos = ''.join(c for c in str(numero) if c.isdigit())
+        index = int(digitos or 0) - PRIMEIRO_NUMERO
+        return index if 0 <= index < self.tamanho else None
+
+    def ids(self, estado, tp_venda):
+        return self.indice.get((estado, tp_venda), [])
+
+    def reajustar(self, numero, fator):
+        '''Muda o preço de um imóvel, como a Caixa faz entre duas varreduras.'''
+        self.reajustes[self.index(numero)] = fator
+
+    def imovel(self, index):
+        '''Atributos do imóvel, no formato usado pelos templates abaixo.'''
+        rng = self._rng(index)
+        tp_vendas = self._tp_vendas(index)
+        avaliacao = rng.randrange(60, 2000) * 1000.0
+        venda = round(avaliacao * rng.uniform(0.5, 0.95) * self.reajustes.get(index, 1), 2)
+        cidade, bairro = rng.choice(CIDADES), rng.choice(BAIRROS)
+        quartos = rng.randint(0, 4)
+        leilao = tp_vendas[0] in (14, 2)
+        agora = timezone.now().replace(hour=10, minute=0, second=0, microsecond=0)
+        return {
+            'numero': self.numero(index),
+            'estado': self._estado(index),
+            'tp_vendas': tp_vendas,
+            'leilao': leilao,
+            'licitacao': tp_vendas[0] == 21,
+            'cidade': cidade,
+            'bairro': bairro,
+            'tipo': rng.choice(TIPOS),
+            'quartos': quartos,
+            'garagem': rng.randint(0, 2),
+            'matricula': str(rng.randrange(1000, 999999)),
+            'area_total': round(rng.uniform(40, 600), 2),
+            'area_privativa': round(rng.uniform(30, 400), 2),
+            'avaliacao': avaliacao,
+            'venda': venda,
+            'venda_2': round(venda * 0.8, 2),
+            'data_1': agora + timedelta(days=rng.randint(1, 60)),
+            'data_2': agora + timedelta(days=rng.randint(61, 90)),
+            'publicacao': agora - timedelta(days=rng.randint(1, 30)),
+            'situacao': rng.choice(SITUACOES),
+            'fotos': rng.randint(0, 4),
+            'endereco': f'RUA {rng.randint(1, 999)} DE {bairro}, N. {rng.randint(1, 3000)}',
+            'cep': f'{rng.randrange(10000, 99999)}-{rng.randrange(0, 999):03d}',
+        }
+
+
+def _moeda(valor):
+    inteiro, centavos = f'{valor:.2f}'.split('.')
+    return f'{int(inteiro):,}'.replace(',', '.') + f',{centavos}'
+
+
+def render_pesquisa(ids):
+    grupos = [ids[i:i + IDS_POR_GRUPO] for i in range(0, len(ids), IDS_POR_GRUPO)]
+    inputs = '\n'.join(f'<input type="hidden" id="hdnImov{n}" name="hdnImov{n}" value="{"||".join(grupo)}">'
+                       for n, grupo in enumerate(grupos, 1))
+    return (f'<div class="resultado-busca">\n<p class="quantidade">{len(ids)} imóveis encontrados</p>\n'
+            f'{inputs}\n<input type="hidden" id="hdnQtdPag" value="{len(grupos)}">\n</div>\n')
+
+
+def render_lista(imoveis):
+    itens = []
+    for imovel in imoveis:
+        foto = (f'<img src="/fotos/F{imovel["numero"]}21.jpg" alt="Foto do imóvel">'
+                if imovel['fotos'] else '')
+        itens.append(f'''<li class="group-block-item">
+  <div class="fotoimovel-col1">{foto}</div>
+  <div class="dadosimovel-col2">
+    <ul class="form-set inside-set no-bullets">
+      <li class="form-row clearfix"><span><font color="red">Valor mínimo de venda: R$ {_moeda(imovel["venda"])}</font></span></li>
+      <li class="form-row clearfix"><span><strong>{imovel["cidade"]} - {imovel["bairro"]} | {imovel["tipo"]}</strong><br>
+Número do imóvel: {imovel["numero"]}<br>
+</span></li>
+    </ul>
+  </div>
+</li>''')
+    return '<ul class="listagem">\n' + '\n'.join(itens) + '\n</ul>\n'
+
+
+def render_detalhe(imovel):
+    if imovel['leilao']:
+        precos = (f'Valor de avaliação: R$ {_moeda(imovel["avaliacao"])}<br>'
+                  f'Valor mínimo de venda 1º Leilão: R$ {_moeda(imovel["venda"])}<br>'
+                  f'Valor mínimo de venda 2º Leilão: R$ {_moeda(imovel["venda_2"])}<br>')
+        datas = (f'<span>Edital: Leilão SFI {imovel["numero"][-4:]}/2026</span><br>\n'
+                 f'<span>Número do item: {int(imovel["numero"][-2:]) + 1}</span><br>\n'
+                 f'<span>Leiloeiro(a): LEILOEIRO {imovel["estado"]}</span><br>\n'
+                 f'<span>Data do 1º Leilão - {imovel["data_1"]:%d/%m/%Y - %Hh%M}</span><br>\n'
+                 f'<span>Data do 2º Leilão - {imovel["data_2"]:%d/%m/%Y - %Hh%M}</span><br>\n'
+                 f'<span>Edital publicado em: {imovel["publicacao"]:%d/%m/%Y %H:%M:%S}</span><br>\n')
+    else:
+        precos = (f'Valor de avaliação: R$ {_moeda(imovel["avaliacao"])}<br>'
+                  f'Valor mínimo de venda: R$ {_moeda(imovel["venda"])}<br>')
+        datas = (f'<span>Data da Licitação Aberta - {imovel["data_1"]:%d/%m/%Y %H:%M}</span><br>\n'
+                 if imovel['licitacao'] else '')
+    fotos = ''.join(f'<img src="/fotos/F{imovel["numero"]}2{n}.jpg">' for n in range(1, imovel['fotos'] + 1))
+    documentos = (f'<a href="javascript:void(0)" onclick="ExibeDoc(\'/editais/matricula/{imovel["estado"]}/'
+                  f'{imovel["numero"]}.pdf\')">Baixar matrícula do imóvel</a>')
+    return f'''<!DOCTYPE html>
+<html lang="pt-br"><head><meta charset="utf-8"><title>Detalhe do imóvel | CAIXA</title>
+<script type="text/javascript">var dataLayer = window.dataLayer || [];</script></head>
+<body><header id="cabecalho"><nav class="menu-principal"><ul><li><a href="/">Início</a></li></ul></nav></header>
+<main id="conteudo">
+<div id="dadosImovel" class="content-wrapper">
+<h5>{imovel["cidade"]} - {imovel["bairro"]}</h5>
+<p style="font-size:14pt">{precos}</p>
+<div class="content">
+<p><span>Tipo de imóvel: <strong>{imovel["tipo"]}</strong></span><br>
+<span>Quartos: <strong>{imovel["quartos"]}</strong></span><br>
+<span>Garagem: <strong>{imovel["garagem"]}</strong></span><br>
+<span>Matrícula(s): <strong>{imovel["matricula"]}</strong></span><br>
+<span>Comarca: <strong>{imovel["cidade"]}-{imovel["estado"]}</strong></span><br>
+<span>Área total = {_moeda(imovel["area_total"])}m2</span><br>
+<span>Área privativa = {_moeda(imovel["area_privativa"])}m2</span></p>
+</div>
+<!-- <span>Situação: <strong>{imovel["situacao"]}</strong></span> -->
+<input type="hidden" id="hdnimovel" value="{imovel["numero"]}">
+<div class="related-box">
+{datas}<p><strong>Endereço:</strong><br>{html.escape(imovel["endereco"])}, {imovel["bairro"]} - CEP: {imovel["cep"]}, {imovel["cidade"]} - {imovel["estado"]}</p>
+<p><strong>Descrição:</strong><br>{imovel["tipo"]}, {imovel["quartos"]} qto(s).</p>
+<p>FORMAS DE PAGAMENTO ACEITAS: Recursos próprios. REGRAS PARA PAGAMENTO DAS DESPESAS (caso existam): Sob responsabilidade do comprador.</p>
+<p>{documentos}</p>
+</div>
+</div>
+<div id="galeria-imagens">{fotos}</div>
+</main>
+<footer id="rodape"><p>CAIXA</p></footer>
+</body></html>
+'''
+
+
+PAGINA_NAO_ENCONTRADA = '''<!DOCTYPE html>
+<html lang="pt-br"><head><meta charset="utf-8"><title>Imóvel indisponível | CAIXA</title></head>
+<body><div class="mensagem-erro"><h3>Imóvel não encontrado</h3></div></body></html>
+'''
+
+
+class Falhas:
+    '''
+    Comportamento do servidor: `latencia` média em segundos (±`jitter`,
+    fração dela), probabilidade de 5xx (`taxa_erro`) e de 429 aleatório
+    (`taxa_429`), e `limite_rps`, acima do qual toda requisição recebe 429
+    com Retry-After de `retry_after` segundos. `lote_max` limita os imóveis
+    devolvidos por carregaListaImoveis.asp, como o site faz com lotes grandes.
+    '''
+
+    def __init__(self, latencia=0.0, jitter=0.5, taxa_erro=0.0, taxa_429=0.0,
+                 limite_rps=None, retry_after=1, lote_max=None, semente=1):
+        self.latencia = latencia
+        self.jitter = jitter
+        self.taxa_erro = taxa_erro
+        self.taxa_429 = taxa_429
+        self.limite_rps = limite_rps
+        self.retry_after = retry_after
+        self.lote_max = lote_max
+        self.rng = random.Random(semente)
+        self.lock = threading.Lock()
+        self.tokens = limite_rps or 0
+        self.updated = time.monotonic()
+
+    def atraso(self):
+        if not self.latencia:
+            return 0.0
+        with self.lock:
+            fator = self.rng.uniform(1 - self.jitter, 1 + self.jitter)
+        return max(0.0, self.latencia * fator)
+
+    def sortear(self):
+        '''Status a devolver no lugar da página (429, 500, 503), ou None.'''
+        with self.lock:
+            if self.limite_rps:
+                agora = time.monotonic()
+                self.tokens = min(self.limite_rps, self.tokens + (agora - self.updated) * self.limite_rps)
+                self.updated = agora
+                if self.tokens < 1:
+                    return 429
+                self.tokens -= 1
+            sorteio = self.rng.random()
+            if sorteio < self.taxa_429:
+                return 429
+            if sorteio < self.taxa_429 + self.taxa_erro:
+                return self.rng.choice((500, 503))
+        return None
+
+
+class SimuladorHandler(BaseHTTPRequestHandler):
+    server_version = 'SimuladorCaixa/1.0'
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+    def do_GET(self):
+        if self.path == '/__stats':
+            self.responder(200, json.dumps(self.server.resumo()), 'application/json')
+        else:
+            self.responder(404, 'Não encontrado')
+
+    def do_POST(self):
+        tamanho = int(self.headers.get('Content-Length') or 0)
+        form = {k: v[0] for k, v in parse_qs(
+            self.rfile.read(tamanho).decode(CAIXA_ENCODING), keep_blank_values=True).items()}
+        rotas = {SEARCH_PATH: self.pesquisa, LIST_PATH: self.lista, DETAIL_PATH: self.detalhe}
+        rota = rotas.get(self.path.split('?', 1)[0])
+        if rota is None:
+            self.responder(404, 'Não encontrado')
+            return
+        if atraso := self.server.falhas.atraso():
+            time.sleep(atraso)
+        if status := self.server.falhas.sortear():
+            headers = {'Retry-After': str(self.server.falhas.retry_after)} if status == 429 else {}
+            self.responder(status, 'Erro simulado', headers=headers)
+            return
+        self.responder(200, rota(form))
+
+    def pesquisa(self, form):
+        try:
+            tp_venda = int(form.get('hdn_tp_venda', ''))
+        except ValueError:
+            return render_pesquisa([])
+        return render_pesquisa(self.server.catalogo.ids(form.get('hdn_estado', ''), tp_venda))
+
+    def lista(self, form):
+        catalogo = self.server.catalogo
+        indices = [catalogo.index(i) for i in form.get('hdnImov', '').split('||') if i]
+        imoveis = [catalogo.imovel(i) for i in indices if i is not None]
+        if self.server.falhas.lote_max:
+            imoveis = imoveis[:self.server.falhas.lote_max]
+        return render_lista(imoveis)
+
+    def detalhe(self, form):
+        index = self.server.catalogo.index(form.get('hdnImovel', ''))
+        if index is None:
+            return PAGINA_NAO_ENCONTRADA
+        if paginas := self.server.paginas_detalhe:
+            return paginas[index % len(paginas)]
+        return render_detalhe(self.server.catalogo.imovel(index))
+
+    def responder(self, status, corpo, content_type='text/html', headers=None):
+        dados = corpo if isinstance(corpo, bytes) else corpo.encode(CAIXA_ENCODING)
+        self.server.contar(self.path, status, len(dados))
+        self.send_response(status)
+        # Como na Caixa, o Content-Type não informa o charset
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(dados)))
+        for nome, valor in (headers or {}).items():
+            self.send_header(nome, valor)
+        self.end_headers()
+        self.wfile.write(dados)
+
+
+class SimuladorCaixa(ThreadingHTTPServer):
+    '''
+    O servidor. `paginas_detalhe` (lista de bytes) substitui as páginas de
+    detalhe sintéticas por páginas gravadas, servidas em rodízio. Conta as
+    requisições por endpoint e status; GET /__stats devolve os contadores.
+    '''
+    daemon_threads = True
+
+    def __init__(self, address, catalogo, falhas=None, paginas_detalhe=None, verbose=False):
+        super().__init__(address, SimuladorHandler)
+        self.catalogo = catalogo
+        self.falhas = falhas or Falhas()
+        self.paginas_detalhe = paginas_detalhe or []
+        self.verbose = verbose
+        self.contadores = Counter()
+        self.bytes = 0
+        self.lock = threading.Lock()
+
+    @property
+    def url(self):
+        host, porta = self.server_address[:2]
+        return f'http://{host}:{porta}'
+
+    def contar(self, path, status, tamanho):
+        with self.lock:
+            self.contadores[f'{path} {status}'] += 1
+            self.bytes += tamanho
+
+    def resumo(self):
+        with self.lock:
+            return {'requisicoes': dict(self.contadores), 'bytes': self.bytes,
+                    'imoveis': self.catalogo.tamanho}
@@ -0,0 +1,333 @@
+'''
+Arquivos de staging: o scraper grava os imóveis em NDJSON, só acrescentando
+linhas, e o load_imoveis os incorpora ao banco depois, em transações
+grandes. Assim várias execuções do scraper rodam sem disputar o banco com
+o site, e uma carga pode ser repetida.
+
+Layout em disco:
+
+    <raiz>/AAAAMMDD-HHMMSS-<host>-<pid>.ndjson[.gz]          um arquivo por execução
+    <raiz>/AAAAMMDD-HHMMSS-<host>-<pid>.ndjson[.gz].parcial  enquanto o scraper escreve
+    <raiz>/carregados/                                        arquivos já carregados
+
+Um .parcial cujo scraper morreu sem fechar o arquivo (SIGKILL, falta de
+memória) é adotado pelo load_imoveis (adopt_orphans): o checkpoint já conta
+os IDs desse arquivo como processados, então ele precisa ser carregado.
+
+Cada linha é uma operação:
+
+    {"op": "upsert", "defaults": {...}}                   imóvel extraído (inclui scraped_at)
+    {"op": "touch", "numero_imovel": "...", "scraped_at": "..."}
+    {"op": "desativar", "estado": "SP", "ids": [...], "cobertas": [...], "em": "..."}
+
+As operações são aplicadas na ordem do arquivo. Um upsert ou touch mais
+antigo que o scraped_at já gravado é descartado, e uma desativação poupa
+os imóveis baixados depois dela: carregar de novo um arquivo antigo não
+desfaz dados mais novos.
+'''
+import gzip
+import json
+import os
+import socket
+import time
+from collections import Counter
+from datetime import timedelta
+from pathlib import Path
+
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from imoveis.models import Imovel
+from .parsers import normalize_id
+from .writer import BulkImovelWriter, _contar, deactivate_missing
+
+SUFIXO_PARCIAL = '.parcial'
+PASTA_CARREGADOS = 'carregados'
+
+
+def staging_name(comprimir=False):
+    agora = timezone.localtime()
+    return f'{agora:%Y%m%d-%H%M%S}-{socket.gethostname()}-{os.getpid()}.ndjson{".gz" if comprimir else ""}'
+
+
+def open_staging(path, mode='rt'):
+    '''Abre um arquivo de staging, comprimido ou não, pelo nome.'''
+    path = Path(path)
+    if path.name.removesuffix(SUFIXO_PARCIAL).endswith('.gz'):
+        return gzip.open(path, mode, encoding='utf-8')
+    return path.open(mode, encoding='utf-8')
+
+
+def _writer_alive(path):
+    '''
+    Se o processo que escreve o .parcial ainda existe, pelo host e pid do
+    nome; None quando o arquivo é de outro host.
+    '''
+    nome = path.name.split('.ndjson', 1)[0]
+    try:
+        _, _, resto = nome.split('-', 2)
+        host, pid = resto.rsplit('-', 1)
+        pid = int(pid)
+    except ValueError:
+        return None
+    if host != socket.gethostname():
+        return None
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def adopt_orphans(root, idade=timedelta(hours=1)):
+    '''
+    Publica os arquivos .parcial abandonados: os deste host cujo processo
+    não existe mais e os de outros hosts sem alteração há mais de `idade`.
+    A última linha, se ficou pela metade, é descartada. Retorna os arquivos
+    publicados.
+    '''
+    adotados = []
+    limite = time.time() - idade.total_seconds()
+    for partial in sorted(Path(root).glob(f'*.ndjson*{SUFIXO_PARCIAL}')):
+        vivo = _writer_alive(partial)
+        if vivo or (vivo is None and partial.stat().st_mtime > limite):
+            continue
+        path = partial.with_name(partial.name.removesuffix(SUFIXO_PARCIAL))
+        tmp = partial.with_name(partial.name + '.tmp')
+        abrir = gzip.open if path.name.endswith('.gz') else open
+        with open_staging(partial) as src, abrir(tmp, 'wt', encoding='utf-8') as dst:
+            try:
+                for line in src:
+                    if line.endswith('\n'):
+                        dst.write(line)
+            except EOFError:
+                # gzip truncado no meio de um flush
+                pass
+        tmp.replace(path)
+        partial.unlink()
+        adotados.append(path)
+    return adotados
+
+
+def pending_files(root):
+    '''Arquivos completos ainda não carregados, do mais antigo para o mais recente.'''
+    root = Path(root)
+    return sorted([*root.glob('*.ndjson'), *root.glob('*.ndjson.gz')])
+
+
+class StagingWriter:
+    '''
+    Substituto do BulkImovelWriter que grava em um arquivo de staging em vez
+    do banco. Cada flush acrescenta o lote ao arquivo (um novo membro gzip,
+    quando comprimido); close() tira o sufixo .parcial.
+
+    O resultado de um upsert só é conhecido na carga: os imóveis contam como
+    'staged'. O progresso dos ScrapeCheckpoint continua no banco, gravado
+    depois que o lote está no arquivo.
+    '''
+
+    def __init__(self, root, batch_size=200, comprimir=False, telemetry=None):
+        self.path = Path(root) / staging_name(comprimir)
+        self.partial = self.path.with_name(self.path.name + SUFIXO_PARCIAL)
+        self.batch_size = batch_size
+        self.telemetry = telemetry
+        self.lines = []
+        self.progress = {}
+        self.counts = []
+        self.totals = Counter()
+
+    def _append(self, op, counts, result, progress=None, key=None):
+        self.lines.append(json.dumps(op, ensure_ascii=False, cls=DjangoJSONEncoder))
+        self.counts.append((counts, result))
+        if progress is not None:
+            self.progress.setdefault(id(progress), (progress, []))[1].append(key)
+        if len(self.lines) >= self.batch_size:
+            self.flush()
+
+    def add(self, defaults, counts=None, progress=None):
+        key = defaults['numero_imovel']
+        defaults = {'scraped_at': timezone.now(), **defaults}
+        self._append({'op': 'upsert', 'defaults': defaults}, counts, 'staged', progress, key)
+
+    def touch(self, key, counts=None, progress=None, scraped_at=None):
+        self._append({'op': 'touch', 'numero_imovel': key, 'scraped_at': scraped_at or timezone.now()},
+                     counts, 'unchanged', progress, key)
+
+    def deactivate(self, estado, ids, cobertas):
+        '''Registra a desativação para a carga; nada é desativado agora.'''
+        self._append({'op': 'desativar', 'estado': estado, 'ids': sorted(ids),
+                      'cobertas': sorted(cobertas), 'em': timezone.now()}, None, 'deactivations')
+        self.flush()
+        return 0
+
+    def flush(self):
+        if not self.lines:
+            return Counter()
+        inicio = time.monotonic()
+        lines, self.lines = self.lines, []
+        progress, self.progress = self.progress, {}
+        counts, self.counts = self.counts, []
+
+        self.partial.parent.mkdir(parents=True, exist_ok=True)
+        with open_staging(self.partial, 'at') as f:
+            f.write('\n'.join(lines) + '\n')
+        for checkpoint, keys in progress.values():
+            checkpoint.processed_ids.extend(normalize_id(key) for key in keys)
+            checkpoint.save(update_fields=['processed_ids', 'lotes_concluidos', 'updated_at'])
+
+        batch = Counter()
+        for counter, result in counts:
+            batch[result] += 1
+            _contar(counter, result)
+        self.totals.update(batch)
+        if self.telemetry is not None:
+            self.telemetry.record('staging.flush', time.monotonic() - inicio)
+        return batch
+
+    def close(self):
+        '''Grava o que falta e publica o arquivo para o load_imoveis.'''
+        self.flush()
+        if self.partial.exists():
+            self.partial.replace(self.path)
+
+
+class LinhaInvalida(ValueError):
+    ''' Linha de staging que não pode ser aplicada '''
+
+
+def _datetime(value, campo):
+    parsed = parse_datetime(value) if isinstance(value, str) else None
+    if parsed is None:
+        raise LinhaInvalida(f'{campo} inválido: {value!r}')
+    return parsed
+
+
+def validate_defaults(defaults):
+    '''Converte os valores JSON para os tipos dos campos do Imovel.'''
+    if not isinstance(defaults, dict) or not defaults.get('numero_imovel'):
+        raise LinhaInvalida('upsert sem numero_imovel.')
+    validos = {}
+    for name, value in defaults.items():
+        try:
+            field = Imovel._meta.get_field(name)
+        except FieldDoesNotExist:
+            raise LinhaInvalida(f'campo desconhecido: {name}')
+        if not field.concrete or field.primary_key or name == 'slug':
+            raise LinhaInvalida(f'campo não gravável: {name}')
+        try:
+            validos[name] = field.to_python(value)
+        except ValidationError as e:
+            raise LinhaInvalida(f'{name}: {" ".join(e.messages)}')
+    if validos.get('scraped_at') is None:
+        raise LinhaInvalida('upsert sem scraped_at.')
+    return validos
+
+
+def read_staging(path):
+    '''
+    (número da linha, operação validada) de cada linha do arquivo; linhas
+    inválidas vêm como (número, LinhaInvalida). Um arquivo .parcial pode
+    terminar no meio de uma linha.
+    '''
+    with open_staging(path) as f:
+        try:
+            for numero, line in enumerate(f, 1):
+                if not line.strip():
+                    continue
+                try:
+                    yield numero, parse_op(json.loads(line))
+                except (ValueError, TypeError, KeyError, AttributeError) as e:
+                    erro = e if isinstance(e, LinhaInvalida) else LinhaInvalida(str(e))
+                    yield numero, erro
+        except EOFError:
+            # gzip truncado (o scraper morreu no meio de um flush)
+            yield None, LinhaInvalida('arquivo comprimido truncado.')
+
+
+def parse_op(op):
+    tipo = op.get('op')
+    if tipo == 'upsert':
+        return {'op': tipo, 'defaults': validate_defaults(op['defaults'])}
+    if tipo == 'touch':
+        if not op.get('numero_imovel'):
+            raise LinhaInvalida('touch sem numero_imovel.')
+        return {'op': tipo, 'numero_imovel': op['numero_imovel'],
+                'scraped_at': _datetime(op.get('scraped_at'), 'scraped_at')}
+    if tipo == 'desativar':
+        if not op.get('estado') or not op.get('cobertas'):
+            raise LinhaInvalida('desativar sem estado ou modalidades.')
+        return {'op': tipo, 'estado': op['estado'], 'ids': set(op['ids']),
+                'cobertas': set(op['cobertas']), 'em': _datetime(op.get('em'), 'em')}
+    raise LinhaInvalida(f'operação desconhecida: {tipo!r}')
+
+
+class StagingLoader:
+    '''
+    Aplica arquivos de staging ao banco, com um BulkImovelWriter de
+    `batch_size` registros por transação. `counts` acumula created, updated,
+    unchanged, stale (mais antigos que o banco), missing (touch de imóvel
+    que não está no banco), deactivated e invalid;
+    `erros` guarda as primeiras linhas inválidas.
+    '''
+    max_erros = 20
+
+    def __init__(self, batch_size=5000, validar=False):
+        self.batch_size = batch_size
+        self.validar = validar
+        self.writer = BulkImovelWriter(batch_size=batch_size + 1)
+        self.buffer = []
+        self.counts = Counter()
+        self.erros = []
+        self.linhas = 0
+
+    def load(self, path):
+        for numero, op in read_staging(path):
+            self.linhas += 1
+            if isinstance(op, LinhaInvalida):
+                self.counts['invalid'] += 1
+                if len(self.erros) < self.max_erros:
+                    self.erros.append(f'{Path(path).name}:{numero or "fim"}: {op}')
+                continue
+            if self.validar:
+                self.counts[op['op']] += 1
+                continue
+            if op['op'] == 'desativar':
+                self.apply()
+                self.counts['deactivated'] += deactivate_missing(
+                    op['estado'], op['ids'], op['cobertas'], antes=op['em'])
+                continue
+            self.buffer.append(op)
+            if len(self.buffer) >= self.batch_size:
+                self.apply()
+        self.apply()
+
+    def apply(self):
+        '''Grava o buffer, descartando o que for mais antigo que o banco.'''
+        if not self.buffer:
+            return
+        buffer, self.buffer = self.buffer, []
+        keys = {op['defaults']['numero_imovel'] if op['op'] == 'upsert' else op['numero_imovel']
+                for op in buffer}
+        gravados = dict(Imovel.objects.filter(numero_imovel__in=keys).exclude(scraped_at=None)
+                        .values_list('numero_imovel', 'scraped_at'))
+        novos = set()
+        for op in buffer:
+            if op['op'] == 'upsert':
+                key, scraped_at = op['defaults']['numero_imovel'], op['defaults']['scraped_at']
+            else:
+                key, scraped_at = op['numero_imovel'], op['scraped_at']
+            if key in gravados and scraped_at < gravados[key]:
+                self.counts['stale'] += 1
+                continue
+            if op['op'] == 'upsert':
+                self.writer.add(op['defaults'], self.counts)
+                novos.add(key)
+            elif key in gravados or key in novos:
+                self.writer.touch(key, self.counts, scraped_at=scraped_at)
+            else:
+                self.counts['missing'] += 1
+        self.writer.flush()
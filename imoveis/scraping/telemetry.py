@@ -0,0 +1,183 @@
+'''
+Telemetria de uma execução do scraper.
+
+Telemetry junta, ao longo da execução, histogramas de latência (requisições
+por tipo de página, parse da Etapa 1 e dos lotes, gravação no banco), bytes
+baixados, códigos de status HTTP, novas tentativas, campos que o parse não
+conseguiu extrair e o resultado (criados/atualizados/sem mudanças) de cada
+estado e modalidade. as_dict() devolve tudo em um dict serializável em JSON,
+que é gravado no ScrapeRun e pode ser exportado pelos comandos.
+
+Os tempos dos estágios do pipeline de detalhe ficam no próprio Pipeline
+(ver pipeline.py) e entram no relatório como 'pipeline'.
+'''
+import cProfile
+import json
+import time
+from bisect import bisect_left
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+
+from .fields import CAMPOS_DETALHE, CAMPOS_SPAN
+
+# Limites superiores dos buckets, em segundos; o último é aberto
+BUCKETS = (0.001, 0.002, 0.005, 0.01, 0.02, 0.05, 0.1, 0.2, 0.5,
+           1.0, 2.0, 5.0, 10.0, 30.0, 60.0)
+
+# Campos acompanhados em 'falhas_parse': ausentes nos defaults de uma página
+# com dadosImovel. Alguns faltam legitimamente em certas modalidades (ex: o
+# 2º leilão na Venda Direta); o que interessa é a variação entre execuções.
+CAMPOS_MONITORADOS = (
+    tuple(c.field for c in CAMPOS_DETALHE if c.field != 'valor_venda')
+    + tuple(field for _, field, _ in CAMPOS_SPAN)
+    + ('amount', 'situacao', 'address', 'hdn_imovel_id'))
+
+
+class Histogram:
+    '''Histograma de latências com buckets fixos em escala logarítmica.'''
+
+    def __init__(self):
+        self.buckets = [0] * (len(BUCKETS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.min = None
+        self.max = None
+
+    def record(self, seconds):
+        self.buckets[bisect_left(BUCKETS, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+        self.min = seconds if self.min is None else min(self.min, seconds)
+        self.max = seconds if self.max is None else max(self.max, seconds)
+
+    def percentile(self, p):
+        '''Limite superior do bucket que contém o percentil `p` (0-100), limitado ao máximo.'''
+        if not self.count:
+            return None
+        alvo = self.count * p / 100
+        acumulado = 0
+        for index, n in enumerate(self.buckets):
+            acumulado += n
+            if acumulado >= alvo:
+                return min(BUCKETS[index], self.max) if index < len(BUCKETS) else self.max
+        return self.max
+
+    def as_dict(self):
+        rotulos = [f'<={limite:g}s' for limite in BUCKETS] + [f'>{BUCKETS[-1]:g}s']
+        return {
+            'count': self.count,
+            'total_seconds': round(self.total, 3),
+            'mean_ms': round(self.total / self.count * 1000, 2) if self.count else None,
+            'min_ms': round(self.min * 1000, 2) if self.min is not None else None,
+            'max_ms': round(self.max * 1000, 2) if self.max is not None else None,
+            'p50_ms': _ms(self.percentile(50)),
+            'p95_ms': _ms(self.percentile(95)),
+            'p99_ms': _ms(self.percentile(99)),
+            'buckets': {rotulo: n for rotulo, n in zip(rotulos, self.buckets) if n},
+        }
+
+
+def _ms(seconds):
+    return round(seconds * 1000, 2) if seconds is not None else None
+
+
+class Telemetry:
+    '''
+    Contadores e histogramas de uma execução. Todos os métodos são chamados
+    do event loop ou da thread do banco, nunca ao mesmo tempo do mesmo
+    contador, então não há trava.
+    '''
+
+    def __init__(self):
+        self.started_at = time.monotonic()
+        self.latencias = defaultdict(Histogram)
+        self.bytes = Counter()
+        self.http_status = Counter()
+        self.retries = Counter()
+        self.falhas_parse = Counter()
+        # estado -> modalidade -> Counter de created/updated/unchanged
+        self.resultados = defaultdict(lambda: defaultdict(Counter))
+
+    def record(self, nome, seconds):
+        self.latencias[nome].record(seconds)
+
+    @contextmanager
+    def medir(self, nome):
+        '''Registra em `nome` o tempo gasto dentro do bloco.'''
+        inicio = time.monotonic()
+        try:
+            yield
+        finally:
+            self.record(nome, time.monotonic() - inicio)
+
+    def record_response(self, tipo, status, tamanho=0):
+        '''Uma tentativa de requisição: `status` é o código HTTP ou o nome do erro.'''
+        self.http_status[str(status)] += 1
+        self.bytes[tipo] += tamanho
+
+    def resultado(self, estado, modalidade):
+        '''Counter que recebe o resultado da gravação de um imóvel.'''
+        return self.resultados[estado or '-'][modalidade]
+
+    def record_campos(self, defaults):
+        for field in CAMPOS_MONITORADOS:
+            if defaults.get(field) is None:
+                self.falhas_parse[field] += 1
+
+    def as_dict(self, **extra):
+        return {
+            'duracao_segundos': round(time.monotonic() - self.started_at, 3),
+            'latencias': {nome: h.as_dict() for nome, h in sorted(self.latencias.items())},
+            'bytes': dict(self.bytes),
+            'http_status': dict(self.http_status),
+            'retries': dict(self.retries),
+            'falhas_parse': dict(self.falhas_parse.most_common()),
+            'resultados': {estado: {modalidade: dict(counts) for modalidade, counts in por_modalidade.items()}
+                           for estado, por_modalidade in sorted(self.resultados.items())},
+            **extra,
+        }
+
+
+def format_report(report):
+    '''Linhas legíveis com o essencial do relatório, para a saída dos comandos.'''
+    linhas = []
+    for nome, data in report['latencias'].items():
+        if nome.startswith('http.'):
+            tipo = nome.split('.', 1)[1]
+            megas = report['bytes'].get(tipo, 0) / 1_000_000
+            linhas.append(f'{nome}: {data["count"]} tentativas, {megas:.1f} MB, '
+                          f'p50 {data["p50_ms"]:g}ms, p95 {data["p95_ms"]:g}ms, máx. {data["max_ms"]:g}ms')
+        else:
+            linhas.append(f'{nome}: {data["count"]}x, total {data["total_seconds"]:g}s, '
+                          f'p50 {data["p50_ms"]:g}ms, p95 {data["p95_ms"]:g}ms')
+    if report['http_status']:
+        linhas.append('status HTTP: ' + ', '.join(
+            f'{status}: {n}' for status, n in sorted(report['http_status'].items())))
+    if report['falhas_parse']:
+        linhas.append('campos não extraídos: ' + ', '.join(
+            f'{field}: {n}' for field, n in list(report['falhas_parse'].items())[:8]))
+    return linhas
+
+
+def write_report(path, report):
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2, default=str)
+
+
+@contextmanager
+def profile_to(path):
+    '''
+    Roda o bloco sob cProfile e grava as estatísticas em `path` (formato
+    pstats, que snakeviz, flameprof ou gprof2dot transformam em flame graph).
+    Sem `path`, não faz nada. Só a thread que entrou no bloco é medida.
+    '''
+    if not path:
+        yield
+        return
+    profile = cProfile.Profile()
+    profile.enable()
+    try:
+        yield
+    finally:
+        profile.disable()
+        profile.dump_stats(path)
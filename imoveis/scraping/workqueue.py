@@ -0,0 +1,182 @@
+'''
+Fila de trabalho no banco para rodar o scraper em vários processos/máquinas.
+
+scrape_caixa --enfileirar cria um ScrapeRun com uma tarefa 'busca' por
+estado. O worker que pega uma busca faz a Etapa 1 de todas as modalidades
+do estado, desativa os imóveis que sumiram e divide os IDs em tarefas
+'lote'; os lotes são baixados por qualquer worker.
+
+Cada tarefa é pega com um lease: o worker a marca como 'leased' com um
+prazo e renova o prazo no heartbeat enquanto trabalha. Um worker que morre
+deixa o lease expirar e a tarefa volta para a fila (até `max_tentativas`).
+A tomada é um UPDATE condicional (compare-and-set), o que funciona igual no
+SQLite e no PostgreSQL sem SELECT FOR UPDATE.
+
+Os workers se registram em ScrapeWorker; a cada heartbeat, cada um recebe
+uma fatia igual da taxa total de requisições à Caixa.
+'''
+import os
+import socket
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import Count
+from django.utils import timezone
+
+from imoveis.models import ScrapeRun, ScrapeTask, ScrapeWorker
+from .checkpoint import finish_run, start_run
+
+
+class TarefaIncompleta(Exception):
+    ''' A tarefa terminou sem todos os dados (ex: uma modalidade falhou) e deve ser repetida '''
+
+
+def enqueue_run(modalidades, estados):
+    '''Cria o ScrapeRun e uma tarefa 'busca' por estado.'''
+    run = start_run(modalidades, estados)
+    ScrapeTask.objects.bulk_create([
+        ScrapeTask(run=run, tipo='busca', estado=estado, modalidades=modalidades)
+        for estado in estados])
+    return run
+
+
+def requeue_expired(max_tentativas, agora=None):
+    '''
+    Devolve para a fila as tarefas com lease vencido; as que já esgotaram
+    as tentativas são marcadas como 'failed'. Retorna (devolvidas, falhas).
+    '''
+    agora = agora or timezone.now()
+    vencidas = ScrapeTask.objects.filter(status='leased', lease_expires_at__lt=agora)
+    esgotadas = vencidas.filter(tentativas__gte=max_tentativas)
+    runs = set(esgotadas.values_list('run_id', flat=True))
+    falhas = esgotadas.update(
+        status='failed', erro='Lease expirou na última tentativa.', lease_expires_at=None)
+    devolvidas = vencidas.update(status='pending', worker='', lease_expires_at=None)
+    for run in ScrapeRun.objects.filter(pk__in=runs):
+        finish_run_if_done(run)
+    return devolvidas, falhas
+
+
+def finish_run_if_done(run):
+    '''Encerra o ScrapeRun quando não resta tarefa pendente nem em andamento.'''
+    restantes = ScrapeTask.objects.filter(run=run, status__in=('pending', 'leased'))
+    if run.status == 'running' and not restantes.exists():
+        falhas = ScrapeTask.objects.filter(run=run, status='failed').exists()
+        finish_run(run, 'failed' if falhas else 'finished')
+
+
+def default_worker_name():
+    return f'{socket.gethostname()}-{os.getpid()}'
+
+
+class QueueWorker:
+    '''
+    Operações de um worker sobre a fila. Todos os métodos são síncronos e
+    acessam o banco; o CaixaScraper.work() os chama via sync_to_async.
+    '''
+
+    def __init__(self, nome=None, lease=timedelta(minutes=5), slots=2, run=None,
+                 continuo=False, espera=5.0, max_tentativas=3, ids_por_tarefa=100,
+                 taxa_total=None):
+        self.nome = nome or default_worker_name()
+        self.lease = lease
+        self.slots = slots
+        self.run = run
+        self.continuo = continuo
+        self.espera = espera
+        self.max_tentativas = max_tentativas
+        self.ids_por_tarefa = ids_por_tarefa
+        # req/s somados de todos os workers; None deixa cada um com a sua taxa
+        self.taxa_total = taxa_total
+
+    @property
+    def heartbeat_interval(self):
+        return self.lease.total_seconds() / 3
+
+    def _tarefas(self):
+        tarefas = ScrapeTask.objects.all()
+        if self.run is not None:
+            tarefas = tarefas.filter(run=self.run)
+        return tarefas
+
+    def register(self):
+        ScrapeWorker.objects.update_or_create(nome=self.nome, defaults={
+            'host': socket.gethostname(), 'pid': os.getpid(), 'heartbeat_at': timezone.now()})
+
+    def unregister(self):
+        ScrapeWorker.objects.filter(nome=self.nome).delete()
+        # O que ficou com este worker volta para a fila sem esperar o lease
+        ScrapeTask.objects.filter(status='leased', worker=self.nome).update(
+            status='pending', worker='', lease_expires_at=None)
+
+    def claim(self):
+        '''Pega a próxima tarefa da fila, ou None se não houver nenhuma livre.'''
+        requeue_expired(self.max_tentativas)
+        agora = timezone.now()
+        candidatas = self._tarefas().filter(status='pending', tentativas__lt=self.max_tentativas)
+        for pk, tentativas in candidatas.order_by('pk').values_list('pk', 'tentativas')[:10]:
+            # Só um worker consegue trocar 'pending' com este número de tentativas
+            tomada = ScrapeTask.objects.filter(pk=pk, status='pending', tentativas=tentativas).update(
+                status='leased', worker=self.nome, tentativas=tentativas + 1,
+                lease_expires_at=agora + self.lease)
+            if tomada:
+                return ScrapeTask.objects.get(pk=pk)
+        return None
+
+    def idle(self):
+        '''Não há nada na fila nem em execução (em nenhum worker).'''
+        return not self._tarefas().filter(status__in=('pending', 'leased')).exists()
+
+    def heartbeat(self, task_pks):
+        '''
+        Renova o lease das tarefas em andamento e o registro do worker.
+        Retorna quantos workers estão ativos (incluindo este).
+        '''
+        agora = timezone.now()
+        ScrapeTask.objects.filter(pk__in=task_pks, status='leased', worker=self.nome).update(
+            lease_expires_at=agora + self.lease)
+        ScrapeWorker.objects.filter(nome=self.nome).update(heartbeat_at=agora)
+        ativos = ScrapeWorker.objects.filter(heartbeat_at__gte=agora - self.lease).count()
+        return max(ativos, 1)
+
+    def enqueue_lotes(self, task, tp_vendas_por_id):
+        '''Divide os IDs de uma busca em tarefas 'lote' do mesmo run.'''
+        ids = list(tp_vendas_por_id)
+        ScrapeTask.objects.bulk_create([
+            ScrapeTask(run_id=task.run_id, tipo='lote', estado=task.estado, modalidades=task.modalidades,
+                       ids={i: tp_vendas_por_id[i] for i in ids[inicio:inicio + self.ids_por_tarefa]})
+            for inicio in range(0, len(ids), self.ids_por_tarefa)])
+
+    def complete(self, task, resultado, lotes=None):
+        '''
+        Marca a tarefa como concluída e enfileira os `lotes` ({id: hdn_tp_venda})
+        de uma busca, na mesma transação. Retorna False se o lease foi perdido
+        (a tarefa expirou e outro worker a pegou); o trabalho já gravado é
+        idempotente.
+        '''
+        with transaction.atomic():
+            concluida = ScrapeTask.objects.filter(pk=task.pk, status='leased', worker=self.nome).update(
+                status='done', resultado=resultado, lease_expires_at=None, erro='')
+            if concluida and lotes:
+                self.enqueue_lotes(task, lotes)
+        if concluida:
+            finish_run_if_done(task.run)
+        return bool(concluida)
+
+    def fail(self, task, erro):
+        '''Devolve a tarefa para a fila, ou a marca como 'failed' na última tentativa.'''
+        status = 'failed' if task.tentativas >= self.max_tentativas else 'pending'
+        ScrapeTask.objects.filter(pk=task.pk, status='leased', worker=self.nome).update(
+            status=status, worker='', erro=erro, lease_expires_at=None)
+        if status == 'failed':
+            finish_run_if_done(task.run)
+        return status
+
+
+def queue_summary(run=None):
+    '''Tarefas por tipo e status, ex: {('lote', 'done'): 12}.'''
+    tarefas = ScrapeTask.objects.all()
+    if run is not None:
+        tarefas = tarefas.filter(run=run)
+    rows = tarefas.values_list('tipo', 'status').annotate(n=Count('pk')).order_by('tipo', 'status')
+    return {(tipo, status): n for tipo, status, n in rows}
@@ -0,0 +1,164 @@
+''' Gravação em lote dos imóveis extraídos pelo scraper '''
+import time
+from collections import Counter
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from imoveis.models import Imovel
+from .parsers import normalize_id
+
+
+class BulkImovelWriter:
+    '''
+    Acumula os `defaults` extraídos e grava em lotes de `batch_size`, dentro
+    de uma única transação, com bulk_create(update_conflicts=True).
+
+    Cada registro é acompanhado do Counter (ou de uma tupla de Counters) que
+    deve receber o resultado ('created' ou 'updated') quando o lote for
+    gravado e, opcionalmente, do
+    ScrapeCheckpoint que registra o ID como processado na mesma transação.
+    touch() registra um imóvel cuja página não mudou: no flush ele só tem o
+    scraped_at atualizado, em um único UPDATE por valor de scraped_at.
+
+    Não é thread-safe: no motor assíncrono todas as chamadas passam pela
+    mesma thread (sync_to_async com thread_sensitive=True).
+    '''
+    unique_field = 'numero_imovel'
+
+    def __init__(self, batch_size=200, telemetry=None):
+        self.batch_size = batch_size
+        self.telemetry = telemetry
+        self.buffer = {}
+        self.unchanged = {}
+        self.totals = Counter()
+
+    def add(self, defaults, counts=None, progress=None, reativar=True):
+        '''
+        Enfileira um imóvel; grava o lote quando ele enche. Com
+        reativar=False (reparse_imoveis) o ativo/desativado_em gravado é
+        mantido.
+        '''
+        key = defaults[self.unique_field]
+        # scraped_at já vem preenchido quando o registro sai do arquivo local
+        defaults = {'scraped_at': timezone.now(), **defaults, 'slug': Imovel.create_slug(key)}
+        if reativar:
+            # Um imóvel gravado está na Caixa, mesmo que tenha sido desativado antes
+            defaults.update(ativo=True, desativado_em=None)
+        # O mesmo imóvel repetido no lote fica só com a versão mais recente
+        self.buffer.pop(key, None)
+        self.buffer[key] = (defaults, counts, progress)
+        if len(self.buffer) + len(self.unchanged) >= self.batch_size:
+            self.flush()
+
+    def touch(self, key, counts=None, progress=None, scraped_at=None):
+        '''
+        Enfileira um imóvel sem mudanças; só o scraped_at (o do flush, se não
+        for dado) será gravado.
+        '''
+        self.unchanged[key] = (counts, progress, scraped_at)
+        if len(self.buffer) + len(self.unchanged) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        '''Grava tudo o que está no buffer; retorna o Counter do lote.'''
+        if not self.buffer and not self.unchanged:
+            return Counter()
+        inicio = time.monotonic()
+        buffer, self.buffer = self.buffer, {}
+        unchanged, self.unchanged = self.unchanged, {}
+
+        # Registros com campos diferentes vão em bulk_create separados, para que
+        # um campo ausente (None) não sobrescreva o valor já gravado.
+        groups = {}
+        checkpoints = {}
+        for key, (defaults, counts, progress) in buffer.items():
+            groups.setdefault(frozenset(defaults), []).append(
+                (key, defaults, counts))
+            if progress is not None:
+                checkpoints.setdefault(id(progress), (progress, []))[1].append(key)
+        touched = {}
+        for key, (_, progress, scraped_at) in unchanged.items():
+            touched.setdefault(scraped_at, []).append(key)
+            if progress is not None:
+                checkpoints.setdefault(id(progress), (progress, []))[1].append(key)
+
+        batch = Counter()
+        with transaction.atomic():
+            existing = set(Imovel.objects.filter(
+                **{f'{self.unique_field}__in': list(buffer)}).values_list(self.unique_field, flat=True))
+            self._adopt(buffer, existing)
+            for fields, rows in groups.items():
+                Imovel.objects.bulk_create(
+                    [Imovel(**defaults) for _, defaults, _ in rows],
+                    update_conflicts=True,
+                    unique_fields=[self.unique_field],
+                    update_fields=sorted(fields - {self.unique_field}),
+                )
+            for scraped_at, keys in touched.items():
+                Imovel.objects.filter(**{f'{self.unique_field}__in': keys}).update(
+                    scraped_at=scraped_at or timezone.now(), ativo=True, desativado_em=None)
+            for progress, keys in checkpoints.values():
+                progress.processed_ids.extend(normalize_id(key) for key in keys)
+                progress.save(update_fields=[
+                              'processed_ids', 'lotes_concluidos', 'updated_at'])
+
+        for key, _, counts in (row for rows in groups.values() for row in rows):
+            result = 'updated' if key in existing else 'created'
+            batch[result] += 1
+            _contar(counts, result)
+        for counts, _, _ in unchanged.values():
+            batch['unchanged'] += 1
+            _contar(counts, 'unchanged')
+        self.totals.update(batch)
+        if self.telemetry is not None:
+            self.telemetry.record('db.flush', time.monotonic() - inicio)
+        return batch
+
+    def _adopt(self, buffer, existing):
+        '''
+        Imóveis criados pelo import_caixa_csv têm o número só com dígitos:
+        passam a usar o número da página, em vez de virar uma linha nova.
+        '''
+        adotar = {normalize_id(key): key for key in buffer
+                  if key not in existing and normalize_id(key) != key}
+        if not adotar:
+            return
+        rows = Imovel.objects.filter(numero_imovel__in=list(adotar)).values_list('pk', 'numero_imovel')
+        for pk, numero_imovel in rows:
+            key = adotar[numero_imovel]
+            Imovel.objects.filter(pk=pk).update(numero_imovel=key, slug=Imovel.create_slug(key))
+            existing.add(key)
+
+    def deactivate(self, estado, ids, cobertas):
+        '''Ver deactivate_missing; grava o que está no buffer antes.'''
+        self.flush()
+        return deactivate_missing(estado, ids, cobertas)
+
+
+def deactivate_missing(estado, ids, cobertas, antes=None):
+    '''
+    Desativa, em um único UPDATE, os imóveis ativos de `estado` que não estão
+    em `ids` (IDs normalizados da Etapa 1) e cujas modalidades estão todas em
+    `cobertas` (nomes buscados por completo). Com `antes`, poupa os imóveis
+    baixados depois desse momento. Retorna quantos.
+    '''
+    rows = Imovel.objects.filter(ativo=True, estado=estado, modalidade__in=cobertas)
+    if antes is not None:
+        rows = rows.filter(Q(scraped_at__lt=antes) | Q(scraped_at=None))
+    rows = rows.values_list('pk', 'numero_imovel', 'hdn_imovel_id', 'modalidade', 'modalidades')
+    missing = [pk for pk, numero_imovel, hdn_imovel_id, modalidade, modalidades in rows.iterator()
+               if normalize_id(numero_imovel) not in ids
+               and normalize_id(hdn_imovel_id or '') not in ids
+               and cobertas.issuperset(modalidades or [modalidade])]
+    if not missing:
+        return 0
+    return Imovel.objects.filter(pk__in=missing).update(
+        ativo=False, desativado_em=timezone.now())
+
+
+def _contar(counts, result):
+    if counts is None:
+        return
+    for counter in counts if isinstance(counts, tuple) else (counts,):
+        counter[result] += 1
@@ -0,0 +1,68 @@
+import io
+from pathlib import Path
+
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import TestCase
+from django.utils import timezone
+
+from imoveis.models import Imovel
+from imoveis.scraping.caixa_csv import CSV_ENCODING, read_rows, row_defaults
+from imoveis.scraping.writer import BulkImovelWriter
+
+CSV_SP = Path(__file__).parent / 'fixtures' / 'caixa' / 'csv' / 'Lista_imoveis_SP.csv'
+
+
+class CsvTests(TestCase):
+
+    def test_le_as_linhas_depois_do_cabecalho(self):
+        with CSV_SP.open(encoding=CSV_ENCODING, newline='') as f:
+            rows = list(read_rows(f))
+        self.assertEqual(len(rows), 5)
+        defaults = row_defaults(rows[0])
+        self.assertEqual(defaults['numero_imovel'], '8555500012345')
+        self.assertEqual(defaults['amount'], 180000.0)
+        self.assertEqual(defaults['valor_avaliacao'], 240000.0)
+        self.assertEqual(defaults['modalidade'], 'Venda Direta')
+        self.assertEqual((defaults['tipo_imovel'], defaults['quartos'], defaults['garagem']), ('Apartamento', 2, 1))
+        self.assertEqual((defaults['area_total'], defaults['area_privativa']), (None, 62.5))
+        self.assertEqual(defaults['address'], 'RUA DAS FLORES, N. 120, APTO 12, VILA NOVA, SAO PAULO - SP')
+        self.assertIsNone(row_defaults(rows[3]))
+
+    def test_importa_cria_atualiza_e_preserva_o_que_veio_do_html(self):
+        Imovel.objects.create(numero_imovel='8555500012345', title='Apartamento em Vila Nova', slug='8555500012345',
+                              amount=200000.0, address='RUA DAS FLORES, 120 - CEP: 01000-000, SAO PAULO - SAO PAULO',
+                              modalidade='Venda Direta', ativo=False, desativado_em=timezone.now())
+        saida = io.StringIO()
+        call_command('import_caixa_csv', str(CSV_SP), stdout=saida)
+        self.assertIn('Criados: 2. Atualizados: 1. Repetidos: 1.', saida.getvalue())
+
+        conhecido = Imovel.objects.get(numero_imovel='8555500012345')
+        self.assertEqual(conhecido.amount, 180000.0)
+        self.assertEqual(conhecido.valor_avaliacao, 240000.0)
+        self.assertEqual(conhecido.title, 'Apartamento em Vila Nova')
+        self.assertEqual(conhecido.address, 'RUA DAS FLORES, 120 - CEP: 01000-000, SAO PAULO - SAO PAULO')
+        self.assertEqual(conhecido.quartos, 2)
+        self.assertTrue(conhecido.ativo)
+
+        novo = Imovel.objects.get(numero_imovel='14444197')
+        self.assertEqual((novo.modalidade, novo.modalidades, novo.estado), ('Licitação Aberta', ['Licitação Aberta'], 'SP'))
+        self.assertEqual(novo.area_terreno, 250.0)
+        self.assertFalse(Imovel.objects.filter(numero_imovel='8555500099999').exists())
+
+        # Importar de novo não duplica nada
+        call_command('import_caixa_csv', str(CSV_SP), stdout=io.StringIO())
+        self.assertEqual(Imovel.objects.count(), 3)
+
+    def test_scraper_adota_o_imovel_criado_pelo_csv(self):
+        call_command('import_caixa_csv', str(CSV_SP), stdout=io.StringIO())
+        pk = Imovel.objects.get(numero_imovel='14444197').pk
+        writer = BulkImovelWriter()
+        writer.add({'numero_imovel': '1444419-7', 'title': 'Casa em Campinas', 'amount': 95000.0})
+        self.assertEqual(writer.flush()['updated'], 1)
+        imovel = Imovel.objects.get(pk=pk)
+        self.assertEqual((imovel.numero_imovel, imovel.slug, imovel.title), ('1444419-7', '1444419-7', 'Casa em Campinas'))
+
+    def test_arquivo_sem_cabecalho(self):
+        with self.assertRaisesMessage(CommandError, 'Cabeçalho da lista de imóveis não encontrado'):
+            call_command('import_caixa_csv', __file__, stdout=io.StringIO())
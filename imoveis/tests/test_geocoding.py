@@ -0,0 +1,115 @@
+import io
+import json
+from datetime import timedelta
+from unittest import mock
+from urllib.parse import parse_qs, urlsplit
+
+import requests
+from django.core.management import call_command
+from django.test import TransactionTestCase, override_settings
+
+from imoveis.geocoding import cache_lookup, formatar_endereco_para_geocode
+from imoveis.models import GeocodeCache, Imovel
+
+
+def resposta(status, dados):
+    response = requests.Response()
+    response.status_code = status
+    response._content = json.dumps(dados).encode()
+    return response
+
+
+@override_settings(GEOAPIFY_API_KEY='geo', LOCATIONIQ_API_KEY='liq')
+class GeocodeTests(TransactionTestCase):
+
+    def setUp(self):
+        for numero, endereco in (('1-1', 'RUA DAS FLORES, N. 120, APTO 12, SAO PAULO - SAO PAULO'),
+                                 ('2-2', 'RUA DAS FLORES, N. 120, APTO 34, SAO PAULO - SAO PAULO'),
+                                 ('3-3', 'RUA SEM FIM, N. 1, LUGAR NENHUM - SAO PAULO')):
+            Imovel.objects.create(numero_imovel=numero, title=numero, slug=numero, address=endereco)
+        self.urls = []
+
+    def geocodificar(self, geoapify, locationiq=None, comando='geocode_imoveis', **options):
+        '''Roda o comando com respostas falsas; `geoapify`/`locationiq` recebem o endereço.'''
+        def make_request(session, url, method='post', **kwargs):
+            self.urls.append(url)
+            params = parse_qs(urlsplit(url).query)
+            if 'geoapify' in url:
+                response = geoapify(params['text'][0])
+            else:
+                response = locationiq(params['q'][0])
+            response.raise_for_status()
+            return response
+
+        self.urls.clear()
+        saida = io.StringIO()
+        with mock.patch('imoveis.geocoding.make_request', side_effect=make_request):
+            call_command(comando, stdout=saida, **options)
+        return saida.getvalue()
+
+    def test_uma_consulta_por_endereco_distinto_e_cache_negativo(self):
+        def geoapify(endereco):
+            features = [{'properties': {'lat': -23.5, 'lon': -46.6, 'rank': {'confidence': 0.9}}}]
+            return resposta(200, {'features': features if 'FLORES' in endereco else []})
+
+        self.geocodificar(geoapify, comando='geocode_geoapify')
+        self.assertEqual(len(self.urls), 2)
+        self.assertEqual(Imovel.objects.filter(latitude=-23.5, longitude=-46.6).count(), 2)
+        entrada = GeocodeCache.objects.get(provider='geoapify', latitude__isnull=False)
+        self.assertEqual(entrada.endereco, 'RUA DAS FLORES - 120 - SAO PAULO - SAO PAULO')
+        self.assertEqual(entrada.confianca, 0.9)
+
+        # O endereço não encontrado fica no cache negativo até expirar
+        self.geocodificar(geoapify, comando='geocode_geoapify')
+        self.assertEqual(self.urls, [])
+        endereco = formatar_endereco_para_geocode(Imovel.objects.get(numero_imovel='3-3'))
+        self.assertIsNotNone(cache_lookup(endereco, 'geoapify'))
+        GeocodeCache.objects.filter(latitude__isnull=True).update(
+            updated_at=entrada.updated_at - timedelta(days=31))
+        self.assertIsNone(cache_lookup(endereco, 'geoapify'))
+        self.geocodificar(geoapify, comando='geocode_geoapify')
+        self.assertEqual(len(self.urls), 1)
+
+        # Um imóvel novo no mesmo prédio sai do cache, sem consulta
+        Imovel.objects.create(numero_imovel='4-4', title='4-4', slug='4-4',
+                              address='RUA DAS FLORES, N. 120, APTO 56, SAO PAULO - SAO PAULO')
+        self.geocodificar(geoapify, comando='geocode_geoapify')
+        self.assertEqual(self.urls, [])
+        self.assertEqual(Imovel.objects.get(numero_imovel='4-4').latitude, -23.5)
+
+    def test_failover_para_a_locationiq(self):
+        def locationiq(endereco):
+            if 'FLORES' in endereco:
+                return resposta(200, [{'lat': '-23.5', 'lon': '-46.6', 'importance': 0.4}])
+            return resposta(404, {'error': 'Unable to geocode'})
+
+        saida = self.geocodificar(lambda endereco: resposta(401, {'message': 'Invalid apiKey'}), locationiq,
+                                  concorrencia=1)
+        self.assertIn('geoapify desativado (HTTP 401)', saida)
+        self.assertEqual(Imovel.objects.filter(latitude=-23.5).count(), 2)
+        # Depois do 401 a Geoapify não é mais consultada
+        self.assertEqual(sum('geoapify' in url for url in self.urls), 1)
+        self.assertEqual(GeocodeCache.objects.get(provider='locationiq', latitude__isnull=False).confianca, 0.4)
+        self.assertTrue(GeocodeCache.objects.filter(provider='locationiq', latitude__isnull=True).exists())
+        # Erros não vão para o cache
+        self.assertFalse(GeocodeCache.objects.filter(provider='geoapify').exists())
+        self.assertIn('Erros: 0. Imóveis atualizados: 2.', saida)
+
+    def test_enderecos_nao_consultados_contam_como_erro(self):
+        saida = self.geocodificar(lambda endereco: resposta(401, {'message': 'Invalid apiKey'}),
+                                  comando='geocode_geoapify', concorrencia=1)
+        self.assertEqual(len(self.urls), 1)
+        self.assertIn('Não encontrados: 0. Erros: 2.', saida)
+
+    def test_certificado_verificado_nas_consultas(self):
+        # Usa o make_request de verdade: as URLs levam a chave da API
+        chamadas = []
+
+        def request(session, method, url, **kwargs):
+            chamadas.append(kwargs)
+            return resposta(200, {'features': []})
+
+        with mock.patch.object(requests.Session, 'request', autospec=True, side_effect=request):
+            call_command('geocode_geoapify', stdout=io.StringIO())
+        self.assertEqual(len(chamadas), 2)
+        self.assertTrue(all(kwargs.get('verify', True) is not False for kwargs in chamadas))
@@ -0,0 +1,53 @@
+from datetime import timedelta
+
+from django.db import connection
+from django.db.migrations.executor import MigrationExecutor
+from django.test import TransactionTestCase
+from django.utils import timezone
+
+
+class MergeDuplicatesTests(TransactionTestCase):
+    '''0015_merge_duplicate_imoveis sobre dados criados no esquema da 0014.'''
+    antes = [('imoveis', '0014_imovel_scraped_at')]
+    depois = [('imoveis', '0015_merge_duplicate_imoveis')]
+
+    def migrar(self, alvo):
+        executor = MigrationExecutor(connection)
+        executor.loader.build_graph()
+        executor.migrate(alvo)
+        return executor.loader.project_state(alvo).apps
+
+    def tearDown(self):
+        executor = MigrationExecutor(connection)
+        executor.migrate(executor.loader.graph.leaf_nodes())
+
+    def test_junta_duplicados_move_favoritos_e_preserva_coordenadas(self):
+        apps = self.migrar(self.antes)
+        Imovel = apps.get_model('imoveis', 'Imovel')
+        Favorito = apps.get_model('imoveis', 'Favorito')
+        User = apps.get_model('auth', 'User')
+        agora = timezone.now()
+
+        antigo = Imovel.objects.create(numero_imovel='1444419-7', title='Casa', slug='md5-antigo',
+                                       latitude=-23.5, longitude=-46.6,
+                                       scraped_at=agora - timedelta(days=2))
+        recente = Imovel.objects.create(numero_imovel='1444419-7', title='Casa (novo preço)', slug='md5-novo',
+                                        estado='SP', scraped_at=agora)
+        outro = Imovel.objects.create(numero_imovel='2-2', title='Apto', slug='md5-outro')
+        ana, bia = User.objects.create(username='ana'), User.objects.create(username='bia')
+        Favorito.objects.create(usuario=ana, imovel=antigo)
+        Favorito.objects.create(usuario=ana, imovel=recente)
+        Favorito.objects.create(usuario=bia, imovel=antigo)
+
+        apps = self.migrar(self.depois)
+        Imovel = apps.get_model('imoveis', 'Imovel')
+        Favorito = apps.get_model('imoveis', 'Favorito')
+        imovel = Imovel.objects.get(numero_imovel='1444419-7')
+        self.assertEqual(imovel.pk, recente.pk)
+        self.assertEqual((imovel.title, imovel.estado), ('Casa (novo preço)', 'SP'))
+        self.assertEqual((imovel.latitude, imovel.longitude), (-23.5, -46.6))
+        self.assertEqual(imovel.slug, '1444419-7')
+        self.assertEqual(Imovel.objects.get(pk=outro.pk).slug, '2-2')
+        self.assertEqual(sorted(Favorito.objects.filter(imovel=imovel).values_list('usuario__username', flat=True)),
+                         ['ana', 'bia'])
+        self.assertEqual(Favorito.objects.count(), 2)
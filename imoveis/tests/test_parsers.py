@@ -0,0 +1,98 @@
+from django.test import SimpleTestCase
+
+from imoveis.scraping.benchmark import (PARSE_FUNCTIONS, load_corpus, measure,
+                                        to_json)
+from imoveis.scraping.parsers import (HTML_PARSERS, _lxml_available,
+                                      detail_defaults, fingerprint_detail,
+                                      fingerprint_listing, parse_detail,
+                                      parse_list_items)
+
+BACKENDS = [p for p in HTML_PARSERS if p != 'lxml' or _lxml_available()]
+
+
+class CorpusTests(SimpleTestCase):
+    '''
+    Regressão do parse sobre o corpus de páginas gravadas. Depois de uma
+    mudança intencional no parse, regravar os .json com
+    `python manage.py benchmark_parser --gravar` e revisar o diff.
+    '''
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.corpus = load_corpus()
+
+    def test_corpus_tem_todos_os_tipos_e_esperados(self):
+        self.assertEqual({p.tipo for p in self.corpus}, set(PARSE_FUNCTIONS))
+        sem_esperado = [p.path.name for p in self.corpus if not p.gravado]
+        self.assertEqual(sem_esperado, [])
+
+    def test_resultado_igual_ao_esperado(self):
+        for pagina in self.corpus:
+            parse = PARSE_FUNCTIONS[pagina.tipo]
+            for backend in BACKENDS:
+                obtido = to_json(parse(pagina.conteudo, backend))
+                if isinstance(pagina.esperado, dict):
+                    # Detalhe: um subteste por campo, para o erro apontar o campo
+                    self.assertEqual(sorted(obtido), sorted(pagina.esperado),
+                                     f'{pagina.path.name} com {backend}: campos')
+                    for campo, valor in pagina.esperado.items():
+                        with self.subTest(pagina=pagina.path.name, backend=backend, campo=campo):
+                            self.assertEqual(obtido[campo], valor)
+                else:
+                    with self.subTest(pagina=pagina.path.name, backend=backend):
+                        self.assertEqual(obtido, pagina.esperado)
+
+    def test_detail_defaults_junta_lote_e_detalhe(self):
+        pagina = next(p for p in self.corpus if p.path.name == 'leilao_sfi.html')
+        listing = {'numero_imovel': '8555500012346', 'description': 'SAO PAULO - MOEMA | Casa',
+                   'amount': 1.0, 'image_url': None}
+        defaults = detail_defaults(pagina.conteudo, listing, ['Leilão SFI - Edital Único', 'Venda Direta'])
+        self.assertEqual(defaults['modalidade'], 'Leilão SFI - Edital Único')
+        self.assertEqual(defaults['modalidades'], ['Leilão SFI - Edital Único', 'Venda Direta'])
+        # O valor da página de detalhe prevalece sobre o do lote
+        self.assertEqual(defaults['amount'], 1500000.0)
+        self.assertNotIn('image_url', defaults)
+        self.assertTrue(defaults['source_url'].endswith('?hdnImovel=8555500012346'))
+
+    def test_pagina_sem_dados_imovel(self):
+        pagina = next(p for p in self.corpus if p.path.name == 'sem_dados.html')
+        self.assertIsNone(parse_detail(pagina.conteudo))
+        self.assertIsNone(detail_defaults(pagina.conteudo, {'numero_imovel': '1'}, ['Venda Direta']))
+        self.assertIsNone(fingerprint_detail(pagina.conteudo))
+
+
+class FingerprintTests(SimpleTestCase):
+
+    def setUp(self):
+        self.pagina = next(p for p in load_corpus(tipos=['detalhe'])
+                           if p.path.name == 'venda_direta_online.html').conteudo
+
+    def test_ignora_scripts_e_espacos(self):
+        ruido = self.pagina.replace(b'<footer', b'<script>var t = 123;</script>\n\n  <footer')
+        self.assertEqual(fingerprint_detail(self.pagina), fingerprint_detail(ruido))
+
+    def test_muda_com_o_conteudo_e_os_extras(self):
+        alterada = self.pagina.replace(b'R$ 180.000,00', b'R$ 170.000,00')
+        self.assertNotEqual(fingerprint_detail(self.pagina), fingerprint_detail(alterada))
+        self.assertNotEqual(fingerprint_detail(self.pagina, 'Venda Direta'),
+                            fingerprint_detail(self.pagina, 'Licitação Aberta'))
+
+    def test_lote_muda_com_preco_descricao_e_modalidades(self):
+        lote = next(p for p in load_corpus(tipos=['lista'])).conteudo
+        listing = parse_list_items(lote)[0]
+        original = fingerprint_listing(listing, ['Venda Direta Online'])
+        self.assertEqual(original, fingerprint_listing(dict(listing), ['Venda Direta Online']))
+        self.assertNotEqual(original, fingerprint_listing({**listing, 'amount': 1.0}, ['Venda Direta Online']))
+        self.assertNotEqual(original, fingerprint_listing({**listing, 'description': 'X'}, ['Venda Direta Online']))
+        self.assertNotEqual(original, fingerprint_listing(listing, ['Venda Direta Online', 'Leilão SFI']))
+
+
+class MeasureTests(SimpleTestCase):
+
+    def test_mede_tempo_e_memoria(self):
+        paginas = [p.conteudo for p in load_corpus(tipos=['detalhe'])]
+        medida = measure(parse_detail, paginas, BACKENDS[0], repeticoes=1)
+        self.assertEqual(medida['paginas'], len(paginas))
+        self.assertGreater(medida['paginas_por_segundo'], 0)
+        self.assertGreater(medida['pico_kib'], 0)
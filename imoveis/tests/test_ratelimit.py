@@ -0,0 +1,101 @@
+import asyncio
+import time
+
+from django.test import SimpleTestCase
+
+from imoveis.scraping.ratelimit import AdaptiveChunkSize, AdaptiveRateLimiter, CircuitOpenError
+
+
+class AdaptiveRateLimiterTests(SimpleTestCase):
+
+    def test_aimd_sobe_devagar_e_cai_pela_metade(self):
+        limiter = AdaptiveRateLimiter(rate=4.0, max_rate=5.0, increase=0.5)
+        limiter.record_success(0.1)
+        self.assertEqual(limiter.rate, 4.5)
+        limiter.record_success(0.1)
+        limiter.record_success(0.1)
+        self.assertEqual(limiter.rate, 5.0)
+        limiter.record_failure()
+        self.assertEqual(limiter.rate, 2.5)
+        # Resposta lenta recua sem pausar
+        limiter.record_success(10.0)
+        self.assertEqual(limiter.rate, 2.5 * 1.5 / 2)
+        self.assertEqual(limiter.paused_until, 0.0)
+
+    def test_retry_after_pausa_o_host(self):
+        limiter = AdaptiveRateLimiter()
+        limiter.record_failure(retry_after=30)
+        self.assertGreater(limiter.paused_until, time.monotonic() + 29)
+
+    def test_circuit_breaker_abre_depois_de_pausas_seguidas(self):
+        limiter = AdaptiveRateLimiter(failure_threshold=2, cooldown=60.0, max_trips=2)
+        for _ in range(3):
+            limiter.record_failure()
+        self.assertEqual(limiter.trips, 1)
+        self.assertFalse(limiter.is_open)
+        # Um sucesso zera a sequência
+        limiter.record_success(0.1)
+        self.assertEqual((limiter.trips, limiter.consecutive_failures), (0, 0))
+        for _ in range(4):
+            limiter.record_failure()
+        self.assertTrue(limiter.is_open)
+        with self.assertRaises(CircuitOpenError):
+            asyncio.run(limiter.acquire())
+
+    def test_half_open_libera_um_teste_depois_do_cooldown(self):
+        limiter = AdaptiveRateLimiter(failure_threshold=1, cooldown=60.0, max_trips=1)
+        limiter.record_failure()
+        self.assertTrue(limiter.is_open)
+        # Fim do cooldown: uma requisição de teste passa, as outras não
+        limiter.paused_until = time.monotonic()
+        self.assertFalse(limiter.is_open)
+        asyncio.run(limiter.acquire())
+        with self.assertRaises(CircuitOpenError):
+            asyncio.run(limiter.acquire())
+        # O teste falhou: reabre por mais um cooldown
+        limiter.record_failure()
+        self.assertTrue(limiter.is_open)
+        self.assertGreater(limiter.paused_until, time.monotonic() + 59)
+        # O teste seguinte dá certo e fecha o circuito
+        limiter.paused_until = time.monotonic()
+        asyncio.run(limiter.acquire())
+        limiter.record_success(0.1)
+        self.assertFalse(limiter.tripped)
+        self.assertEqual(limiter.trips, 0)
+        asyncio.run(limiter.acquire())
+
+
+class AdaptiveChunkSizeTests(SimpleTestCase):
+
+    def test_cresce_com_lotes_completos_e_rapidos_ate_o_teto(self):
+        chunk = AdaptiveChunkSize(size=10, max_size=12)
+        for _ in range(5):
+            chunk.record(chunk.size, chunk.size, latency=1.0)
+        self.assertEqual(chunk.size, 12)
+
+    def test_lote_truncado_vira_teto(self):
+        chunk = AdaptiveChunkSize(size=10, max_size=30)
+        chunk.record(10, 10, latency=1.0)
+        chunk.record(11, 11, latency=1.0)
+        self.assertEqual(chunk.size, 12)
+        # O lote de 12 voltou com menos imóveis: o teto passa a ser 11
+        chunk.record(12, 9, latency=1.0)
+        self.assertEqual((chunk.size, chunk.max_size), (11, 11))
+        chunk.record(11, 11, latency=1.0)
+        self.assertEqual(chunk.size, 11)
+        # Lote menor que o último completo com menos imóveis não mexe no teto
+        chunk.record(5, 3, latency=1.0)
+        self.assertEqual((chunk.size, chunk.max_size), (11, 11))
+
+    def test_falha_ou_lentidao_diminui_sem_passar_do_minimo(self):
+        chunk = AdaptiveChunkSize(size=10, min_size=2, slow_latency=10.0)
+        chunk.record(10, 10, latency=30.0)
+        self.assertEqual(chunk.size, 5)
+        chunk.record_failure()
+        self.assertEqual(chunk.size, 2)
+        chunk.record_failure()
+        self.assertEqual(chunk.size, 2)
+        # Volta a crescer depois de lotes bons
+        chunk.record(2, 2, latency=1.0)
+        chunk.record(3, 3, latency=1.0)
+        self.assertEqual(chunk.size, 4)
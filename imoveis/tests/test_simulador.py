@@ -0,0 +1,132 @@
+import io
+import tempfile
+import threading
+from datetime import timedelta
+
+from django.core.management import call_command
+from django.test import TransactionTestCase
+from django.utils import timezone
+
+from imoveis.models import Imovel, ScrapeCheckpoint
+from imoveis.scraping.archive import HtmlArchive
+from imoveis.scraping.checkpoint import last_unfinished_run, start_run
+from imoveis.scraping.engine import CaixaScraper
+from imoveis.scraping.ratelimit import HostRateLimiters
+from imoveis.scraping.scheduler import build_refresh_queue
+from imoveis.scraping.simulador import Catalogo, Falhas, SimuladorCaixa
+
+
+class SimuladorTests(TransactionTestCase):
+    '''
+    O CaixaScraper completo contra o simulador local. TransactionTestCase:
+    o motor grava a partir de outra thread, fora da transação do teste.
+    '''
+
+    def iniciar(self, falhas=None, tamanho=270):
+        self.catalogo = Catalogo(tamanho, semente=7)
+        servidor = SimuladorCaixa(('127.0.0.1', 0), self.catalogo, falhas)
+        threading.Thread(target=servidor.serve_forever, daemon=True).start()
+        self.addCleanup(servidor.server_close)
+        self.addCleanup(servidor.shutdown)
+        return servidor
+
+    def scraper(self, servidor, **kwargs):
+        scraper = CaixaScraper([34, 21, 14, 2], ['SP'], concurrency=8, rate=500, max_rate=1000,
+                               base_url=servidor.url, **kwargs)
+        scraper.backoff_base = 0.01
+        return scraper
+
+    def esperados(self):
+        return {numero for tp in (34, 21, 14, 2) for numero in self.catalogo.ids('SP', tp)}
+
+    def test_grava_o_catalogo_e_depois_pula_o_que_nao_mudou(self):
+        servidor = self.iniciar()
+        stats = self.scraper(servidor).run()
+        esperados = self.esperados()
+        self.assertEqual(stats['created'], len(esperados))
+        self.assertEqual(set(Imovel.objects.values_list('numero_imovel', flat=True)), esperados)
+        self.assertEqual(set(Imovel.objects.values_list('estado', flat=True)), {'SP'})
+        repetido = Imovel.objects.filter(modalidades__1__isnull=False).first()
+        if repetido is not None:
+            self.assertEqual(repetido.modalidade, repetido.modalidades[0])
+
+        stats = self.scraper(servidor).run()
+        self.assertEqual(stats['unchanged'], len(esperados))
+        self.assertEqual(stats['created'] + stats['updated'], 0)
+
+    def test_se_recupera_de_429_erros_e_lotes_truncados(self):
+        servidor = self.iniciar(Falhas(taxa_429=0.03, taxa_erro=0.03, retry_after=0, lote_max=12, semente=3),
+                                tamanho=2700)
+        scraper = self.scraper(servidor)
+        stats = scraper.run()
+        self.assertGreater(stats['retries'], 0)
+        self.assertEqual(stats['errors'], 0)
+        self.assertEqual(Imovel.objects.count(), len(self.esperados()))
+        self.assertIn('429', scraper.report()['http_status'])
+
+    def test_resume_baixa_de_novo_os_lotes_e_detalhes_que_falharam(self):
+        servidor = self.iniciar(Falhas(taxa_erro=0.2, semente=5), tamanho=540)
+        run = start_run([34, 21, 14, 2], ['SP'])
+        scraper = self.scraper(servidor, run=run)
+        scraper.max_attempts = 1
+        # Sem circuit breaker: as falhas viram erros na hora, sem pausas
+        scraper.limiters = HostRateLimiters(rate=500, max_rate=1000, min_rate=100, failure_threshold=10 ** 6)
+        stats = scraper.run()
+        self.assertGreater(stats['errors'], 0)
+        self.assertFalse(ScrapeCheckpoint.objects.filter(run=run, concluido=True).exists())
+        self.assertEqual(last_unfinished_run(), run)
+        self.assertLess(Imovel.objects.count(), len(self.esperados()))
+
+        servidor.falhas = Falhas()
+        stats = self.scraper(servidor, run=run).run()
+        self.assertEqual(stats['errors'], 0)
+        self.assertGreater(stats['resumed'], 0)
+        self.assertEqual(set(Imovel.objects.values_list('numero_imovel', flat=True)), self.esperados())
+        self.assertTrue(ScrapeCheckpoint.objects.get(run=run, estado='SP').concluido)
+        self.assertIsNone(last_unfinished_run())
+
+    def test_refresh_nao_passa_do_orcamento_nem_com_novas_tentativas(self):
+        servidor = self.iniciar(tamanho=2700)
+        self.scraper(servidor).run()
+        servidor.falhas = Falhas(taxa_erro=0.3, semente=2)
+        scraper = self.scraper(servidor, force=True)
+        scraper.limiters = HostRateLimiters(rate=500, max_rate=1000, min_rate=100, failure_threshold=10 ** 6)
+        stats = scraper.refresh(build_refresh_queue(500, apenas_atrasados=False), 40)
+        self.assertEqual(stats['requests'], 40)
+        self.assertGreater(stats['retries'], 0)
+        self.assertGreater(stats['pending'], 0)
+
+    def test_varredura_so_baixa_o_detalhe_do_que_mudou(self):
+        servidor = self.iniciar()
+        self.scraper(servidor).run()
+        esperados = self.esperados()
+        reajustados = sorted(esperados)[:3]
+        for numero in reajustados:
+            self.catalogo.reajustar(numero, 0.9)
+        detalhes_antes = servidor.resumo()['requisicoes'].get('/sistema/detalhe-imovel.asp 200', 0)
+
+        stats = self.scraper(servidor, sweep=True).run()
+        self.assertEqual(stats['swept'], len(esperados) - 3)
+        self.assertEqual(stats['updated'], 3)
+        detalhes = servidor.resumo()['requisicoes']['/sistema/detalhe-imovel.asp 200'] - detalhes_antes
+        self.assertEqual(detalhes, 3)
+        imovel = Imovel.objects.get(numero_imovel=reajustados[0])
+        self.assertEqual(imovel.amount, self.catalogo.imovel(self.catalogo.index(reajustados[0]))['venda'])
+
+    def test_reparse_nao_reativa_nem_desfaz_dados_mais_novos(self):
+        servidor = self.iniciar()
+        raiz = self.enterContext(tempfile.TemporaryDirectory())
+        self.scraper(servidor, archive=HtmlArchive(raiz)).run()
+        desativado, apagado, atualizado = sorted(self.esperados())[:3]
+        Imovel.objects.filter(numero_imovel=desativado).update(ativo=False, desativado_em=timezone.now())
+        Imovel.objects.filter(numero_imovel=apagado).delete()
+        Imovel.objects.filter(numero_imovel=atualizado).update(
+            amount=1.0, scraped_at=timezone.now() + timedelta(minutes=1))
+
+        saida = io.StringIO()
+        call_command('reparse_imoveis', arquivo=raiz, workers=1, stdout=saida)
+        self.assertIn('Criados: 1.', saida.getvalue())
+        self.assertIn('Mais antigas que o banco: 1.', saida.getvalue())
+        self.assertFalse(Imovel.objects.get(numero_imovel=desativado).ativo)
+        self.assertEqual(Imovel.objects.get(numero_imovel=apagado).estado, 'SP')
+        self.assertEqual(Imovel.objects.get(numero_imovel=atualizado).amount, 1.0)
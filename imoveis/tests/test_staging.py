@@ -0,0 +1,133 @@
+import gzip
+import io
+import json
+import socket
+import tempfile
+import threading
+from datetime import timedelta
+from pathlib import Path
+
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import TestCase, TransactionTestCase
+from django.utils import timezone
+
+from imoveis.models import Imovel
+from imoveis.scraping.engine import CaixaScraper
+from imoveis.scraping.simulador import Catalogo, SimuladorCaixa
+from imoveis.scraping.staging import StagingLoader, StagingWriter, pending_files
+
+
+class StagingScraperTests(TransactionTestCase):
+    '''O scraper grava em staging e o load_imoveis faz a carga.'''
+
+    def test_scraper_grava_em_arquivo_e_load_imoveis_carrega(self):
+        catalogo = Catalogo(270, semente=7)
+        servidor = SimuladorCaixa(('127.0.0.1', 0), catalogo)
+        threading.Thread(target=servidor.serve_forever, daemon=True).start()
+        self.addCleanup(servidor.server_close)
+        self.addCleanup(servidor.shutdown)
+        raiz = Path(self.enterContext(tempfile.TemporaryDirectory()))
+
+        scraper = CaixaScraper([34, 21, 14, 2], ['SP'], rate=500, max_rate=1000,
+                               base_url=servidor.url, staging=raiz, staging_gzip=True)
+        stats = scraper.run()
+        esperados = {numero for tp in (34, 21, 14, 2) for numero in catalogo.ids('SP', tp)}
+        self.assertEqual(stats['staged'], len(esperados))
+        self.assertFalse(Imovel.objects.exists())
+        self.assertEqual(pending_files(raiz), [scraper.writer.path])
+
+        call_command('load_imoveis', diretorio=str(raiz), stdout=io.StringIO())
+        self.assertEqual(set(Imovel.objects.values_list('numero_imovel', flat=True)), esperados)
+        self.assertEqual(pending_files(raiz), [])
+        self.assertTrue((raiz / 'carregados' / scraper.writer.path.name).exists())
+
+
+class StagingLoaderTests(TestCase):
+
+    def setUp(self):
+        self.raiz = Path(self.enterContext(tempfile.TemporaryDirectory()))
+        self.agora = timezone.now()
+
+    def gravar(self, comprimir=False):
+        writer = StagingWriter(self.raiz, comprimir=comprimir)
+        writer.add({'numero_imovel': '1-1', 'title': 'Casa', 'estado': 'SP', 'modalidade': 'Venda Direta Online',
+                    'amount': 100000.0, 'data_leilao_1': self.agora + timedelta(days=3)})
+        writer.add({'numero_imovel': '2-2', 'title': 'Apto', 'estado': 'SP', 'modalidade': 'Venda Direta Online'})
+        writer.touch('2-2')
+        writer.deactivate('SP', {'11', '22'}, {'Venda Direta Online'})
+        writer.close()
+        return writer.path
+
+    def test_carrega_e_repetir_a_carga_nao_desfaz_dados_mais_novos(self):
+        for comprimir in (False, True):
+            with self.subTest(comprimir=comprimir):
+                Imovel.objects.all().delete()
+                antigo = Imovel.objects.create(numero_imovel='3-3', title='Sumiu', slug='3-3', estado='SP',
+                                               modalidade='Venda Direta Online',
+                                               scraped_at=self.agora - timedelta(days=1))
+                path = self.gravar(comprimir)
+                loader = StagingLoader()
+                loader.load(path)
+                self.assertEqual(loader.counts['created'], 2)
+                self.assertEqual(loader.counts['unchanged'], 1)
+                self.assertEqual(loader.counts['deactivated'], 1)
+                imovel = Imovel.objects.get(numero_imovel='1-1')
+                self.assertEqual(imovel.amount, 100000.0)
+                self.assertEqual(imovel.data_leilao_1.date(), (self.agora + timedelta(days=3)).date())
+                antigo.refresh_from_db()
+                self.assertFalse(antigo.ativo)
+
+                Imovel.objects.filter(numero_imovel='1-1').update(amount=90000.0, scraped_at=timezone.now())
+                loader = StagingLoader()
+                loader.load(path)
+                self.assertEqual(loader.counts['created'], 0)
+                self.assertGreaterEqual(loader.counts['stale'], 1)
+                self.assertEqual(Imovel.objects.get(numero_imovel='1-1').amount, 90000.0)
+                path.unlink()
+
+    def test_linhas_invalidas_sao_contadas_e_o_arquivo_fica(self):
+        path = self.raiz / 'manual.ndjson'
+        linhas = [
+            {'op': 'upsert', 'defaults': {'numero_imovel': '4-4', 'title': 'Ok', 'scraped_at': self.agora.isoformat()}},
+            {'op': 'upsert', 'defaults': {'numero_imovel': '5-5', 'campo_inexistente': 1,
+                                          'scraped_at': self.agora.isoformat()}},
+            {'op': 'upsert', 'defaults': {'numero_imovel': '6-6', 'quartos': 'muitos',
+                                          'scraped_at': self.agora.isoformat()}},
+            {'op': 'apagar'},
+        ]
+        path.write_text('\n'.join(json.dumps(linha) for linha in linhas) + '\n{"op": "ups', encoding='utf-8')
+        saida = io.StringIO()
+        with self.assertRaisesMessage(CommandError, '4 linha(s) inválida(s)'):
+            call_command('load_imoveis', diretorio=str(self.raiz), stdout=saida)
+        self.assertIn('campo desconhecido: campo_inexistente', saida.getvalue())
+        self.assertTrue(Imovel.objects.filter(numero_imovel='4-4').exists())
+        self.assertEqual(pending_files(self.raiz), [path])
+
+    def test_load_imoveis_adota_o_parcial_de_um_scraper_morto(self):
+        for comprimir in (False, True):
+            with self.subTest(comprimir=comprimir):
+                Imovel.objects.all().delete()
+                writer = StagingWriter(self.raiz, comprimir=comprimir)
+                writer.add({'numero_imovel': '7-7', 'title': 'Casa', 'estado': 'SP'})
+                writer.flush()
+                # Morto no meio do próximo flush: a última linha ficou pela metade
+                abrir = gzip.open if comprimir else open
+                with abrir(writer.partial, 'at', encoding='utf-8') as f:
+                    f.write('{"op": "ups')
+                extensao = '.ndjson.gz' if comprimir else '.ndjson'
+                morto = writer.partial.with_name(
+                    f'20260101-000000-{socket.gethostname()}-999999999{extensao}.parcial')
+                writer.partial.rename(morto)
+                vivo = StagingWriter(self.raiz, comprimir=comprimir)
+                vivo.add({'numero_imovel': '8-8', 'title': 'Apto'})
+                vivo.flush()
+
+                saida = io.StringIO()
+                call_command('load_imoveis', diretorio=str(self.raiz), stdout=saida)
+                self.assertIn('.parcial abandonado, publicado', saida.getvalue())
+                self.assertTrue(Imovel.objects.filter(numero_imovel='7-7').exists())
+                # O arquivo do processo vivo continua sendo escrito
+                self.assertFalse(Imovel.objects.filter(numero_imovel='8-8').exists())
+                self.assertTrue(vivo.partial.exists())
+                vivo.partial.unlink()
@@ -0,0 +1,124 @@
+import asyncio
+import threading
+from datetime import timedelta
+from unittest import mock
+
+from django.db import OperationalError
+from django.test import TestCase, TransactionTestCase
+from django.utils import timezone
+
+from imoveis.models import Imovel, ScrapeTask
+from imoveis.scraping.engine import CaixaScraper
+from imoveis.scraping.ratelimit import HostRateLimiters
+from imoveis.scraping.simulador import Catalogo, Falhas, SimuladorCaixa
+from imoveis.scraping.workqueue import QueueWorker, enqueue_run, queue_summary
+
+
+class FilaTests(TestCase):
+    '''Lease, devolução e encerramento das tarefas, sem acessar a rede.'''
+
+    def setUp(self):
+        self.run = enqueue_run([34], ['SP'])
+        self.task = ScrapeTask.objects.get(run=self.run)
+
+    def test_lease_vencido_volta_para_a_fila_e_o_antigo_dono_perde_a_tarefa(self):
+        a = QueueWorker('a', max_tentativas=2)
+        b = QueueWorker('b', max_tentativas=2)
+        self.assertEqual(a.claim().pk, self.task.pk)
+        self.assertIsNone(b.claim())
+
+        ScrapeTask.objects.filter(pk=self.task.pk).update(lease_expires_at=timezone.now() - timedelta(seconds=1))
+        tarefa = b.claim()
+        self.assertEqual((tarefa.pk, tarefa.worker, tarefa.tentativas), (self.task.pk, 'b', 2))
+        self.assertFalse(a.complete(self.task, {}))
+
+        self.assertTrue(b.complete(tarefa, {'created': 1}, lotes={'1': [34], '2': [34]}))
+        self.assertEqual(queue_summary(self.run), {('busca', 'done'): 1, ('lote', 'pending'): 1})
+        self.run.refresh_from_db()
+        self.assertEqual(self.run.status, 'running')
+
+    def test_ultima_tentativa_vencida_encerra_o_run_como_falha(self):
+        worker = QueueWorker('a', max_tentativas=1)
+        worker.claim()
+        ScrapeTask.objects.filter(pk=self.task.pk).update(lease_expires_at=timezone.now() - timedelta(seconds=1))
+        self.assertIsNone(worker.claim())
+        self.assertTrue(worker.idle())
+        self.run.refresh_from_db()
+        self.assertEqual(self.run.status, 'failed')
+
+    def test_unregister_devolve_as_tarefas_do_worker(self):
+        worker = QueueWorker('a')
+        worker.register()
+        worker.claim()
+        worker.unregister()
+        self.task.refresh_from_db()
+        self.assertEqual((self.task.status, self.task.worker), ('pending', ''))
+
+    def test_heartbeat_continua_depois_de_um_erro_do_banco(self):
+        worker = QueueWorker('a', lease=timedelta(seconds=0.03))
+        scraper = CaixaScraper([], [])
+
+        async def renovar():
+            heartbeat = asyncio.create_task(scraper.heartbeat(worker, {}))
+            await asyncio.sleep(0.1)
+            heartbeat.cancel()
+            await asyncio.gather(heartbeat, return_exceptions=True)
+
+        with mock.patch.object(worker, 'heartbeat',
+                               side_effect=[OperationalError('database is locked')] + [1] * 50) as heartbeat:
+            asyncio.run(renovar())
+        self.assertGreater(heartbeat.call_count, 2)
+
+
+class WorkerTests(TransactionTestCase):
+    '''Dois workers dividindo uma execução contra o simulador local.'''
+
+    def iniciar(self, catalogo, falhas=None):
+        servidor = SimuladorCaixa(('127.0.0.1', 0), catalogo, falhas)
+        threading.Thread(target=servidor.serve_forever, daemon=True).start()
+        self.addCleanup(servidor.server_close)
+        self.addCleanup(servidor.shutdown)
+        return servidor
+
+    def test_dois_workers_processam_a_execucao_inteira(self):
+        catalogo = Catalogo(2700, semente=7)
+        servidor = self.iniciar(catalogo)
+
+        modalidades = [34, 21, 14, 2]
+        run = enqueue_run(modalidades, ['SP', 'RJ'])
+        totais = {}
+
+        def trabalhar(nome):
+            scraper = CaixaScraper([], [], concurrency=4, rate=500, max_rate=1000, base_url=servidor.url)
+            worker = QueueWorker(nome, run=run, espera=0.05, ids_por_tarefa=25, taxa_total=1000)
+            totais[nome] = scraper.work(worker)
+
+        threads = [threading.Thread(target=trabalhar, args=(nome,)) for nome in ('a', 'b')]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(timeout=60)
+
+        esperados = {numero for estado in ('SP', 'RJ') for tp in modalidades
+                     for numero in catalogo.ids(estado, tp)}
+        self.assertEqual(set(Imovel.objects.values_list('numero_imovel', flat=True)), esperados)
+        self.assertEqual(sum(stats['created'] for stats in totais.values()), len(esperados))
+        self.assertEqual({status for _, status in queue_summary(run)}, {'done'})
+        self.assertGreater(ScrapeTask.objects.filter(run=run, tipo='lote').count(), 2)
+        run.refresh_from_db()
+        self.assertEqual(run.status, 'finished')
+
+    def test_lote_com_erro_volta_para_a_fila(self):
+        catalogo = Catalogo(270, semente=7)
+        servidor = self.iniciar(catalogo, Falhas(taxa_erro=0.1, semente=5))
+        run = enqueue_run([34, 21, 14, 2], ['SP'])
+        scraper = CaixaScraper([], [], concurrency=4, rate=500, max_rate=1000, base_url=servidor.url)
+        scraper.max_attempts = 1
+        scraper.limiters = HostRateLimiters(rate=500, max_rate=1000, min_rate=100, failure_threshold=10 ** 6)
+        stats = scraper.work(QueueWorker('a', run=run, espera=0.05, ids_por_tarefa=25, max_tentativas=50))
+
+        self.assertGreater(stats['errors'], 0)
+        esperados = {numero for tp in (34, 21, 14, 2) for numero in catalogo.ids('SP', tp)}
+        self.assertEqual(set(Imovel.objects.values_list('numero_imovel', flat=True)), esperados)
+        self.assertEqual({status for _, status in queue_summary(run)}, {'done'})
+        self.assertTrue(ScrapeTask.objects.filter(run=run, tipo='lote', tentativas__gt=1).exists())
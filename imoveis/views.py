@@ -19,6 +19,7 @@ def lista_imoveis_partial(request):
     Retorna a lista de imóveis em HTML para a barra lateral,
     incluindo o status de favorito de cada um.
     """
+    # ImovelFilter traz só os imóveis ativos, a menos que incluir_inativos seja enviado
     imovel_filter = ImovelFilter(request.GET, queryset=Imovel.objects.all())
     imoveis_filtrados = imovel_filter.qs[:100]
 